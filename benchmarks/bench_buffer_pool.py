@@ -0,0 +1,77 @@
+"""
+Check that steady-state pipeline runs on same-sized frames make no large allocations.
+
+Runs a pipeline repeatedly on one frame, with and without the buffer pool, and reports
+the peak memory traced by tracemalloc (NumPy, and so cv2 outputs, report their
+buffers to it) above the level before the timed runs. Exits with status 1 when the
+pooled peak exceeds --max-fraction of one frame.
+
+Usage:
+    python benchmarks/bench_buffer_pool.py --size 4000 3000 --runs 10
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from buffer_pool import default_pool
+from pipeline import Pipeline
+
+STEPS = [("gamma", {"gamma": 0.8}), ("brightness", {"factor": 1.1}), ("unsharp_mask", {}),
+         ("gaussian_blur", {"ksize": 5}), ("median_filter", {"ksize": 5})]
+
+
+def measure(pipeline, frame, runs, pool):
+    def run():
+        result = pipeline.run(frame, pool=pool)
+        if pool is not None:
+            pool.put(result)
+
+    # Warm-up: the first frame teaches the pipeline its buffer layout and fills the pool.
+    for _ in range(2):
+        run()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    for _ in range(runs):
+        run()
+    seconds = (time.perf_counter() - start) / runs
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak - baseline, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, nargs=2, default=(4000, 3000), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--max-fraction", type=float, default=0.01,
+                        help="Allowed pooled peak as a fraction of one frame's bytes.")
+    args = parser.parse_args()
+
+    width, height = args.size
+    frame = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    pipeline = Pipeline(STEPS)
+
+    unpooled_peak, unpooled_seconds = measure(pipeline, frame, args.runs, None)
+    pooled_peak, pooled_seconds = measure(pipeline, frame, args.runs, default_pool)
+
+    mb = 1024 * 1024
+    print(f"{width}x{height} RGB, frame {frame.nbytes / mb:.1f} MB, {args.runs} runs, steps: "
+          f"{', '.join(name for name, _ in STEPS)}")
+    print(f"  without pool  peak {unpooled_peak / mb:9.2f} MB  {unpooled_seconds * 1000:8.1f} ms/frame")
+    print(f"  with pool     peak {pooled_peak / mb:9.2f} MB  {pooled_seconds * 1000:8.1f} ms/frame")
+    print(f"  pool: {default_pool.stats()}")
+    if pooled_peak > args.max_fraction * frame.nbytes:
+        print(f"FAIL: pooled peak above {args.max_fraction:.1%} of a frame")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Speed and peak memory of the CNN enhancer: the full-frame path against tiled inference.
+
+Cases:
+    full-frame      model.predict on the whole frame, TensorFlow's default threading (the previous path)
+    tiled-keras     TiledEnhancer on a traced graph, cnn_inference.configure_cpu threading
+    tiled-float16   TiledEnhancer on a TFLite export with float16 weights
+    tiled-int8      TiledEnhancer on a TFLite export quantized to int8
+
+Each case runs in its own interpreter, so thread settings and peak RSS are isolated.
+Models are untrained (random weights): speed does not depend on the weights.
+
+Usage:
+    python benchmarks/bench_cnn.py --size 2000 1500 --repeat 3
+    python benchmarks/bench_cnn.py --cases full-frame tiled-int8 --tile-size 384
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+CASES = ("full-frame", "tiled-keras", "tiled-float16", "tiled-int8")
+
+
+def run_case(case, size, repeat, tile_size, tmp):
+    import numpy as np
+    from run_benchmarks import synthetic_image
+
+    image = synthetic_image(tuple(size), "rgb")
+    frame = np.asarray(image)
+    if case == "full-frame":
+        os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+        # Unlike load_model, building the model directly skips configure_cpu, so TensorFlow
+        # and OpenMP keep their default threading.
+        from cnn_inference import build_denoising_cnn
+        model = build_denoising_cnn()
+
+        def enhance():
+            return model.predict(frame[None].astype(np.float32) / 255.0, verbose=0)[0]
+    else:
+        from cnn_inference import TiledEnhancer, export_tflite, load_model
+        model = load_model()
+        tflite = None
+        if case != "tiled-keras":
+            calibration = os.path.join(tmp, "calibration.png")
+            synthetic_image((tile_size * 2, tile_size * 2), "rgb", seed=1).save(calibration)
+            tflite = export_tflite(model, os.path.join(tmp, case + ".tflite"), tile_size, case.split("-")[1],
+                                   [calibration])
+        enhancer = TiledEnhancer(None if tflite else model, tflite, tile_size)
+        enhance = lambda: enhancer.enhance(frame)
+
+    enhance()  # Warm-up: tracing, allocation, oneDNN primitive creation.
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        enhance()
+        timings.append(time.perf_counter() - start)
+    # ru_maxrss is in KB on Linux.
+    return {"seconds": min(timings), "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, nargs=2, default=(2000, 1500), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tile-size", type=int, default=256)
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=list(CASES))
+    parser.add_argument("--case", choices=CASES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        with tempfile.TemporaryDirectory() as tmp:
+            print(json.dumps(run_case(args.case, args.size, args.repeat, args.tile_size, tmp)))
+        return
+
+    print(f"{args.size[0]}x{args.size[1]} RGB -> 2x, tile {args.tile_size}, best of {args.repeat}, "
+          f"{os.cpu_count()} CPUs")
+    baseline = None
+    for case in args.cases:
+        command = [sys.executable, os.path.abspath(__file__), "--case", case, "--size", *map(str, args.size),
+                   "--repeat", str(args.repeat), "--tile-size", str(args.tile_size)]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            reason = (completed.stderr.strip().splitlines() or ["failed"])[-1]
+            print(f"  {case:<15} failed: {reason}")
+            continue
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        if case == "full-frame":
+            baseline = result["seconds"]
+        speedup = f"{baseline / result['seconds']:6.2f}x" if baseline else "      -"
+        print(f"  {case:<15} {result['seconds'] * 1000:9.1f} ms  {speedup}  peak RSS {result['peak_rss_mb']:8.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Compare apply_edge_detection_multi against three separate apply_edge_detection calls.
+
+Usage:
+    python benchmarks/bench_edge_detection.py --size 4000 3000 --repeat 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from edge_detection import EDGE_METHODS, apply_edge_detection, apply_edge_detection_multi
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, nargs=2, default=(4000, 3000), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--blur", action="store_true", help="Enable the Gaussian pre-blur.")
+    args = parser.parse_args()
+
+    width, height = args.size
+    rng = np.random.default_rng(0)
+    image = cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (7, 7), 0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.png")
+        cv2.imwrite(path, image)
+
+        separate = best_of(args.repeat, lambda: [apply_edge_detection(path, method, apply_blur=args.blur)
+                                                 for method in EDGE_METHODS])
+        combined = best_of(args.repeat, lambda: apply_edge_detection_multi(path, EDGE_METHODS, apply_blur=args.blur))
+
+    megapixels = width * height / 1e6
+    print(f"{width}x{height} ({megapixels:.1f} MP), best of {args.repeat}")
+    print(f"  3 x apply_edge_detection     {separate * 1000:8.1f} ms")
+    print(f"  apply_edge_detection_multi   {combined * 1000:8.1f} ms  ({separate / combined:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
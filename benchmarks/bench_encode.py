@@ -0,0 +1,72 @@
+"""
+Encode time against output size for every export format and preset.
+
+Each setting encodes the same synthetic frame (best of --repeat); the table lists
+milliseconds, output size, megapixels per second and the size relative to PIL's
+default settings for that format. The last lines show the throughput of the
+export thread pool writing --batch frames with 1 and with --threads encoders.
+
+Usage:
+    python benchmarks/bench_encode.py --size 4000 3000 --formats png jpg webp tif
+    python benchmarks/bench_encode.py --batch 16 --threads 4
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from bench_edge_detection import best_of
+from export import PRESETS, Exporter, encode_options
+from run_benchmarks import synthetic_image
+
+
+def encode(image, image_format, options):
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.tell()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, nargs=2, default=(4000, 3000), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--mode", choices=("gray", "rgb"), default="rgb")
+    parser.add_argument("--formats", nargs="+", default=["png", "jpg", "webp", "tif"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--batch", type=int, default=8, help="Frames written in the thread-pool test.")
+    parser.add_argument("--threads", type=int, default=4, help="Encoder threads in the thread-pool test.")
+    args = parser.parse_args()
+
+    image = synthetic_image(tuple(args.size), args.mode)
+    megapixels = args.size[0] * args.size[1] / 1e6
+    print(f"{args.size[0]}x{args.size[1]} {args.mode}, best of {args.repeat}")
+    print(f"{'format':<7}{'preset':<10}{'ms':>9}{'KB':>10}{'MP/s':>8}{'size vs PIL default':>22}")
+    for extension in args.formats:
+        image_format, _ = encode_options("x." + extension)
+        default_bytes = encode(image, image_format, {})
+        rows = [("default", {})] + [(preset, encode_options("x." + extension, preset)[1]) for preset in PRESETS]
+        for preset, options in rows:
+            seconds = best_of(args.repeat, lambda: encode(image, image_format, options))
+            nbytes = encode(image, image_format, options)
+            print(f"{extension:<7}{preset:<10}{seconds * 1000:9.1f}{nbytes / 1024:10.0f}{megapixels / seconds:8.1f}"
+                  f"{nbytes / default_bytes:21.0%}")
+
+    extension = args.formats[0]
+    with tempfile.TemporaryDirectory() as tmp:
+        for threads in sorted({1, args.threads}):
+            with Exporter(threads=threads) as exporter:
+                start = time.perf_counter()
+                futures = [exporter.submit(image, os.path.join(tmp, f"{i}.{extension}")) for i in range(args.batch)]
+                for future in futures:
+                    future.result()
+                seconds = time.perf_counter() - start
+            print(f"Exporter, {threads} thread(s): {args.batch} {extension} frames in {seconds:.2f} s "
+                  f"({args.batch / seconds:.1f} frames/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Measure cold import time of each entry point and which heavy backends it pulls in.
+
+Every import runs in a fresh interpreter so nothing is cached between measurements.
+
+Usage:
+    python benchmarks/bench_startup.py --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SRC_DIR = os.path.join(REPO_ROOT, "src")
+
+ENTRY_POINTS = ["main", "batch_processing", "pipeline", "edge_detection", "gui", "cnn", "cnn_service"]
+HEAVY_MODULES = ["tensorflow", "cv2", "tkinter"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module, repeat):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([SRC_DIR, REPO_ROOT]))
+    timings, loaded = [], []
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                                   env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            return {"error": completed.stderr.strip().splitlines()[-1]}
+        result = json.loads(completed.stdout)
+        timings.append(result["seconds"])
+        loaded = result["loaded"]
+    return {"median_ms": statistics.median(timings) * 1000, "min_ms": min(timings) * 1000, "loaded": loaded}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    results = {}
+    for module in ENTRY_POINTS:
+        results[module] = result = measure(module, args.repeat)
+        if "error" in result:
+            print(f"{module:18s} failed: {result['error']}")
+        else:
+            heavy = ", ".join(result["loaded"]) or "-"
+            print(f"{module:18s} {result['median_ms']:8.1f} ms (min {result['min_ms']:.1f})  heavy: {heavy}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
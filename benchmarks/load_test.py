@@ -0,0 +1,131 @@
+"""
+Load-test the upload-and-enhance service: end-to-end latency percentiles and throughput.
+
+Each simulated client uploads a synthetic image, waits for the result and downloads
+it; latency covers that whole round trip. Refused uploads (503) are retried after
+their Retry-After delay and counted.
+
+Usage:
+    python benchmarks/load_test.py --start-server --requests 200 --concurrency 16
+    python benchmarks/load_test.py --url http://127.0.0.1:8080 --requests 500 --steps '[["gamma", {"gamma": 0.8}]]'
+"""
+import argparse
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run_benchmarks import REPO_ROOT, SIZES, synthetic_image
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def one_request(url, payload, steps, timeout):
+    query = urllib.parse.urlencode({"filename": "load.png", "steps": steps})
+    start = time.perf_counter()
+    retries = 0
+    while True:
+        try:
+            request = urllib.request.Request(f"{url}/jobs?{query}", data=payload, method="POST")
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                job = json.load(response)
+            break
+        except urllib.error.HTTPError as e:
+            if e.code != 503:
+                raise
+            retries += 1
+            time.sleep(float(e.headers.get("Retry-After", 1)))
+    with urllib.request.urlopen(f"{url}/jobs/{job['id']}/result?wait={timeout}", timeout=timeout + 5) as response:
+        response.read()
+    return time.perf_counter() - start, retries
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, workers, max_queue, tmp):
+    process = subprocess.Popen([sys.executable, os.path.join(REPO_ROOT, "src", "service.py"), "--port", str(port),
+                                "--max-queue", str(max_queue), "--upload-dir", os.path.join(tmp, "uploads"),
+                                "--output-dir", os.path.join(tmp, "processed")]
+                               + (["--workers", str(workers)] if workers else []))
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f"{url}/health", timeout=1).read()
+            return process, url
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Service did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--start-server", action="store_true", help="Start a local instance on a free port.")
+    parser.add_argument("--workers", type=int, help="Worker processes of the started instance.")
+    parser.add_argument("--max-queue", type=int, default=64, help="Queue limit of the started instance.")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--size", choices=sorted(SIZES), default="1MP")
+    parser.add_argument("--steps", default='[["gamma", {"gamma": 0.8}], "unsharp_mask"]')
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    buffer = io.BytesIO()
+    synthetic_image(SIZES[args.size], "rgb").save(buffer, "PNG", compress_level=1)
+    payload = buffer.getvalue()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        process = None
+        url = args.url
+        if args.start_server:
+            process, url = start_server(free_port(), args.workers, args.max_queue, tmp)
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(args.concurrency) as executor:
+                futures = [executor.submit(one_request, url, payload, args.steps, args.timeout)
+                           for _ in range(args.requests)]
+                results, errors = [], []
+                for future in futures:
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        errors.append(e)
+            elapsed = time.perf_counter() - start
+            health = json.load(urllib.request.urlopen(f"{url}/health"))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    latencies = [latency for latency, _ in results]
+    print(f"{len(results)} ok, {len(errors)} failed, {sum(r for _, r in results)} retries after 503, "
+          f"{args.concurrency} concurrent clients, {len(payload) / 1024:.0f} KB uploads")
+    if latencies:
+        print(f"  p50 {percentile(latencies, 0.5) * 1000:8.1f} ms   p99 {percentile(latencies, 0.99) * 1000:8.1f} ms   "
+              f"max {max(latencies) * 1000:8.1f} ms")
+    print(f"  throughput {len(results) / elapsed:.2f} jobs/s over {elapsed:.1f} s")
+    print(f"  server: {health}")
+    if errors:
+        print(f"  first error: {errors[0]!r}")
+
+
+if __name__ == "__main__":
+    main()
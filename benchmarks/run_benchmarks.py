@@ -0,0 +1,250 @@
+"""
+Benchmark every processing operation on synthetic images and flag regressions.
+
+Each case runs in its own interpreter so its peak RSS is measured in isolation.
+
+Usage:
+    python benchmarks/run_benchmarks.py --sizes 1MP 12MP --output results.json
+    python benchmarks/run_benchmarks.py --output new.json --compare baseline.json --threshold 0.10
+    python benchmarks/run_benchmarks.py --list
+"""
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SRC_DIR = os.path.join(REPO_ROOT, "src")
+
+SIZES = {"1MP": (1152, 864), "12MP": (4000, 3000), "50MP": (8192, 6144)}
+MODES = ("gray", "rgb")
+BATCH_SIZE = 4
+
+
+def synthetic_image(size, mode, seed=0):
+    import numpy as np
+    from PIL import Image
+
+    width, height = size
+    rng = np.random.default_rng(seed)
+    y = np.arange(height, dtype=np.float32)[:, None]
+    x = np.arange(width, dtype=np.float32)[None, :]
+    # Smooth shading plus craters and sensor noise, loosely like a lunar frame.
+    base = 128 + 60 * np.sin(x / 97.0) * np.cos(y / 71.0)
+    for cx, cy, r in rng.integers(0, max(width, height), size=(12, 3)):
+        base -= 40 * np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / (2.0 * (r % 200 + 20) ** 2))
+    channels = 1 if mode == "gray" else 3
+    pixels = np.empty((height, width, channels), dtype=np.uint8)
+    for c in range(channels):
+        noisy = base + 12 * rng.standard_normal((height, width), dtype=np.float32)
+        pixels[..., c] = np.clip(noisy, 0, 255)
+    if channels == 1:
+        return Image.fromarray(pixels[..., 0], "L")
+    return Image.fromarray(pixels, "RGB")
+
+
+def synthetic_path(cache_dir, size_name, mode):
+    # Generated once per run by the parent; children only decode it, so their peak
+    # RSS reflects the input image plus the operation, not the generator.
+    path = os.path.join(cache_dir, f"synthetic_{size_name}_{mode}.png")
+    if not os.path.exists(path):
+        synthetic_image(SIZES[size_name], mode).save(path, compress_level=1)
+    return path
+
+
+def _main_op(method, *args):
+    def setup(image, path, tmp):
+        from main import ImageProcessor
+        processor = ImageProcessor()
+
+        def run():
+            processor.image = image
+            getattr(processor, method)(*args)
+        return run
+    return setup
+
+
+def _gui_op(method, *args):
+    def setup(image, path, tmp):
+        from gui import ImageProcessor
+        processor = ImageProcessor()
+        processor.original_image = image
+        return lambda: getattr(processor, method)(*args)
+    return setup
+
+
+def _edge_op(method):
+    def setup(image, path, tmp):
+        from edge_detection import apply_edge_detection
+        return lambda: apply_edge_detection(path, method)
+    return setup
+
+
+def _process_batch(image, path, tmp):
+    from batch_processing import process_batch
+    from pipeline import Pipeline
+
+    paths = [path] * BATCH_SIZE
+    pipeline = Pipeline([("gamma", {"gamma": 0.8}), ("unsharp_mask", {})])
+    output_dir = os.path.join(tmp, "batch")
+    return lambda: process_batch(paths, pipeline, output_dir)
+
+
+# name -> (setup, frames processed per run). setup(image, path, tmp) returns the timed callable.
+CASES = {
+    "main.denoise": (_main_op("denoise"), 1),
+    "main.histogram_equalization": (_main_op("histogram_equalization"), 1),
+    "main.gamma_correction": (_main_op("gamma_correction", 0.8), 1),
+    "main.unsharp_mask": (_main_op("unsharp_mask"), 1),
+    "main.edge_detection": (_main_op("edge_detection"), 1),
+    "main.gaussian_blur": (_main_op("gaussian_blur"), 1),
+    "main.median_filter": (_main_op("median_filter"), 1),
+    "main.adjust_white_balance": (_main_op("adjust_white_balance"), 1),
+    "gui.denoise": (_gui_op("denoise"), 1),
+    "gui.histogram_equalization": (_gui_op("histogram_equalization"), 1),
+    "gui.gamma_correction": (_gui_op("gamma_correction", 0.8), 1),
+    "gui.unsharp_mask": (_gui_op("unsharp_mask"), 1),
+    "gui.edge_detection": (_gui_op("edge_detection"), 1),
+    "edge.Canny": (_edge_op("Canny"), 1),
+    "edge.Sobel": (_edge_op("Sobel"), 1),
+    "edge.Laplacian": (_edge_op("Laplacian"), 1),
+    "process_batch": (_process_batch, BATCH_SIZE),
+}
+
+
+def peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_case(name, size_name, mode, path, repeat):
+    import io
+    import contextlib
+    from PIL import Image
+
+    setup, frames = CASES[name]
+    size = SIZES[size_name]
+    image = Image.open(path)
+    image.load()
+    with tempfile.TemporaryDirectory() as tmp:
+        run = setup(image, path, tmp)
+        baseline_rss = peak_rss_mb()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                run()
+            timings.append(time.perf_counter() - start)
+
+    seconds = min(timings)
+    megapixels = size[0] * size[1] / 1e6 * frames
+    return {
+        "case": name,
+        "size": size_name,
+        "mode": mode,
+        "megapixels": megapixels,
+        "seconds": seconds,
+        "mp_per_s": megapixels / seconds if seconds else float("inf"),
+        "peak_rss_mb": peak_rss_mb(),
+        "setup_rss_mb": baseline_rss,
+    }
+
+
+def run_in_child(name, size_name, mode, path, repeat):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([SRC_DIR, REPO_ROOT]))
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", name, size_name, mode,
+                                path, str(repeat)], env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        lines = completed.stderr.strip().splitlines() or ["unknown error"]
+        return {"case": name, "size": size_name, "mode": mode, "error": lines[-1]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results with a baseline run.
+
+    Parameters:
+    - results (list): Case results of this run.
+    - baseline (list): Case results of the stored baseline.
+    - threshold (float): Relative slowdown that counts as a regression, e.g. 0.1 for 10%.
+
+    Returns:
+    - list: (key, baseline_seconds, seconds, change) for every regressed case.
+    """
+    previous = {(r["case"], r["size"], r["mode"]): r for r in baseline if "error" not in r}
+    regressions = []
+    for result in results:
+        key = (result["case"], result["size"], result["mode"])
+        if "error" in result or key not in previous:
+            continue
+        change = result["seconds"] / previous[key]["seconds"] - 1.0
+        marker = "REGRESSION" if change > threshold else ""
+        print(f"{'/'.join(key):45s} {previous[key]['seconds']:9.4f}s -> {result['seconds']:9.4f}s "
+              f"{change:+7.1%} {marker}")
+        if change > threshold:
+            regressions.append((key, previous[key]["seconds"], result["seconds"], change))
+    return regressions
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        name, size_name, mode, path, repeat = sys.argv[2:7]
+        sys.path.insert(0, SRC_DIR)
+        print(json.dumps(run_case(name, size_name, mode, path, int(repeat))))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", nargs="+", default=["*"], help="Case names or glob patterns.")
+    parser.add_argument("--sizes", nargs="+", choices=sorted(SIZES), default=["1MP", "12MP"])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the fastest is reported.")
+    parser.add_argument("--output", help="Write results to this JSON file.")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Slowdown that counts as a regression.")
+    parser.add_argument("--list", action="store_true", help="List the available cases and exit.")
+    args = parser.parse_args()
+
+    if args.list:
+        print("\n".join(CASES))
+        return
+
+    names = [name for name in CASES if any(fnmatch.fnmatch(name, pattern) for pattern in args.cases)]
+    results = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for size_name in args.sizes:
+            for mode in args.modes:
+                path = synthetic_path(cache_dir, size_name, mode)
+                for name in names:
+                    result = run_in_child(name, size_name, mode, path, args.repeat)
+                    results.append(result)
+                    if "error" in result:
+                        print(f"{name:30s} {size_name:5s} {mode:4s} failed: {result['error']}")
+                    else:
+                        print(f"{name:30s} {size_name:5s} {mode:4s} {result['seconds']:9.4f}s "
+                              f"{result['mp_per_s']:9.1f} MP/s {result['peak_rss_mb']:9.1f} MB peak")
+
+    if args.output:
+        meta = {"python": platform.python_version(), "platform": platform.platform(),
+                "cpu_count": os.cpu_count(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        with open(args.output, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,41 +4,80 @@ import cv2
 from PIL import Image, ImageTk
 import numpy as np
 import os
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Conv2D, UpSampling2D
-setTF_ENABLE_ONEDNN_OPTS=0
+import sys
+from collections import OrderedDict
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+from analysis import analyze_array
+from cnn_inference import configure_cpu
+from denoise import denoise, plan
+from export import Exporter, poll_future
 
-def build_denoising_cnn():
-    model = Sequential()
-    model.add(Conv2D(64, (3, 3), activation='relu', padding='same', input_shape=(None, None, 3)))
-    model.add(Conv2D(64, (3, 3), activation='relu', padding='same'))
-    model.add(UpSampling2D((2, 2)))
-    model.add(Conv2D(3, (3, 3), activation='sigmoid', padding='same'))
-    return model
+# oneDNN and thread-pool settings only take effect if set before TensorFlow is imported.
+configure_cpu()
 
 
 def analyze_image(image):
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    
-    noise_level = cv2.Laplacian(gray, cv2.CV_64F).var()
-    
-    
-    blurriness = cv2.Laplacian(gray, cv2.CV_64F).var()
-    
-    
-    contrast = np.std(gray)
-    
-    return noise_level, blurriness, contrast
+    # One pass over a downsampled float32 view instead of two full-frame float64 Laplacians.
+    metrics = analyze_array(image)
+    return metrics["noise_sigma"], metrics["sharpness"], metrics["rms_contrast"]
+
+class ImagePyramid:
+    def __init__(self, image, min_size=128):
+        # Level 0 is the full-resolution image; each further level halves both sides.
+        self.levels = [image]
+        while min(self.levels[-1].shape[:2]) // 2 >= min_size:
+            self.levels.append(cv2.pyrDown(self.levels[-1]))
+
+    def level_for(self, max_width, max_height):
+        # Coarsest level that is still at least as large as the display area.
+        for index in range(len(self.levels) - 1, 0, -1):
+            height, width = self.levels[index].shape[:2]
+            if width >= max_width or height >= max_height:
+                return index
+        return 0
+
+
+class StageCache:
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        # Bounded by the bytes of the cached frames rather than their count: one
+        # full-resolution stage of a 50 MP photo is 150 MB, a preview level a few MB.
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.entries = OrderedDict()
+
+    def get(self, key, compute):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        value = compute()
+        if value.nbytes > self.max_bytes:
+            # Larger than the whole budget; caching it would only evict everything else.
+            return value
+        self.entries[key] = value
+        self.nbytes += value.nbytes
+        while self.nbytes > self.max_bytes:
+            self.nbytes -= self.entries.popitem(last=False)[1].nbytes
+        return value
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
 
 class ImageEnhancementApp:
+    DISPLAY_SIZE = (800, 600)
+    DENOISE_BUDGET_S = 2.0
+
     def __init__(self, master):
         self.master = master
         self.master.title("Image Denoising and Enhancement")
 
         self.image = None
         self.processed_image = None
+        self.pyramid = None
+        self.stage_cache = StageCache()
+        self.exporter = Exporter(threads=1)
 
         self.image_label = tk.Label(master)
         self.image_label.pack()
@@ -63,24 +102,45 @@ class ImageEnhancementApp:
         if filepath:
             self.image = cv2.imread(filepath)
             self.processed_image = self.image.copy()
-            self.show_image(self.image)
+            self.pyramid = ImagePyramid(self.image)
+            self.stage_cache.clear()
+            self.show_image(self.pyramid.levels[self.pyramid.level_for(*self.DISPLAY_SIZE)])
             self.analyze_and_suggest(self.image)
 
     def analyze_and_suggest(self, image):
-        noise, blur, contrast = analyze_image(image)
-        message = f"Noise Level: {noise:.2f}\nBlurriness: {blur:.2f}\nContrast: {contrast:.2f}"
+        noise, sharpness, contrast = analyze_image(image)
+        message = f"Noise Sigma: {noise:.2f}\nSharpness: {sharpness:.2f}\nRMS Contrast: {contrast:.3f}"
         messagebox.showinfo("Image Analysis", message)
     
     def update_image(self):
-        denoised_image = self.apply_denoising(self.image, self.noise_slider.get())
-        sharpened_image = self.apply_sharpening(denoised_image, self.sharpness_slider.get())
-        contrasted_image = self.apply_contrast(sharpened_image, self.contrast_slider.get())
-        self.processed_image = contrasted_image
-        self.show_image(self.processed_image)
+        # Preview at the pyramid level matching the display; full resolution is only
+        # rendered on save.
+        if self.pyramid is None:
+            return
+        self.processed_image = None
+        self.show_image(self.render(self.pyramid.level_for(*self.DISPLAY_SIZE)))
+
+    def render(self, level):
+        # Every stage is cached on the settings of the stages up to it, so moving
+        # only the contrast slider reuses the denoised and sharpened results.
+        noise = self.noise_slider.get()
+        sharpness = self.sharpness_slider.get()
+        contrast = self.contrast_slider.get()
+        denoised_image = self.stage_cache.get(
+            (level, noise),
+            lambda: self.apply_denoising(self.pyramid.levels[level], noise))
+        sharpened_image = self.stage_cache.get(
+            (level, noise, sharpness),
+            lambda: self.apply_sharpening(denoised_image, sharpness))
+        return self.stage_cache.get(
+            (level, noise, sharpness, contrast),
+            lambda: self.apply_contrast(sharpened_image, contrast))
 
     def apply_denoising(self, image, intensity):
-
-        return cv2.fastNlMeansDenoisingColored(image, None, intensity, intensity, 7, 21)
+        # The backend is planned for the full-resolution image so previews at any
+        # pyramid level use the same method as the saved result.
+        backend = plan(self.image.shape, intensity, self.DENOISE_BUDGET_S)
+        return denoise(image, backend, sigma=intensity, color_order="BGR")
 
     def apply_sharpening(self, image, intensity):
         kernel = np.array([[0, -1, 0], [-1, 5 + intensity * 0.1, -1], [0, -1, 0]])
@@ -88,8 +148,9 @@ class ImageEnhancementApp:
 
     def apply_contrast(self, image, intensity):
         alpha = 1.0 + intensity / 100.0 
-        adjusted = cv2.convertScaleAbs(image, alpha=alpha, beta=0) 
-        return adjusted
+        # Build the 256-entry table once and map the frame with a single LUT pass.
+        table = cv2.convertScaleAbs(np.arange(256, dtype=np.uint8), alpha=alpha, beta=0)
+        return cv2.LUT(image, table)
 
     def show_image(self, image):
         image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
@@ -99,13 +160,24 @@ class ImageEnhancementApp:
         self.image_label.image = image_tk
 
     def save_image(self):
+        if self.processed_image is None and self.pyramid is not None:
+            self.processed_image = self.render(0)
         if self.processed_image is not None:
             save_path = filedialog.asksaveasfilename(defaultextension=".png",
-                                                     filetypes=[("PNG files", "*.png"), ("JPEG files", "*.jpg")])
+                                                     filetypes=[("PNG files", "*.png"), ("JPEG files", "*.jpg"),
+                                                                ("WebP files", "*.webp"), ("TIFF files", "*.tif")])
             if save_path:
-                cv2.imwrite(save_path, self.processed_image)
-                messagebox.showinfo("Save Image", f"Image saved at {save_path}")
-
-root = tk.Tk()
-app = ImageEnhancementApp(root)
-root.mainloop()
+                rgb = cv2.cvtColor(self.processed_image, cv2.COLOR_BGR2RGB)
+                poll_future(self.master, self.exporter.submit(rgb, save_path),
+                            lambda future: self.export_done(future, save_path))
+
+    def export_done(self, future, save_path):
+        if future.exception() is not None:
+            messagebox.showerror("Save Image", f"Could not save {save_path}: {future.exception()}")
+        else:
+            messagebox.showinfo("Save Image", f"Image saved at {save_path}")
+
+if __name__ == "__main__":
+    root = tk.Tk()
+    app = ImageEnhancementApp(root)
+    root.mainloop()
@@ -0,0 +1,186 @@
+import csv
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from lazy_import import lazy_module
+
+cv2 = lazy_module("cv2")
+
+# Scalar metrics in output column order; "histogram" (256 bins) is stored
+# separately because it only fits columnar output.
+METRIC_COLUMNS = ["width", "height", "mean", "noise_sigma", "sharpness", "rms_contrast",
+                  "clipped_low", "clipped_high", "clipped_fraction"]
+
+# Immerkaer's noise estimation mask: it cancels image structure up to second order,
+# so what remains is dominated by the noise.
+_NOISE_KERNEL = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+
+
+def _strided_gray(image, max_side, color_order):
+    height, width = image.shape[:2]
+    step = max(1, math.ceil(max(height, width) / max_side))
+    view = image[::step, ::step]
+    if view.ndim == 3:
+        code = cv2.COLOR_BGR2GRAY if color_order == "BGR" else cv2.COLOR_RGB2GRAY
+        view = cv2.cvtColor(np.ascontiguousarray(view), code)
+    return np.ascontiguousarray(view)
+
+
+def analyze_array(image, max_side=1024, color_order="BGR"):
+    """
+    Compute quality metrics on a strided, at most max_side pixels wide view of an image.
+
+    Parameters:
+    - image (numpy.ndarray): uint8 grayscale or 3-channel image.
+    - max_side (int): Longest side of the analysed view. Metrics describe that resolution.
+    - color_order (str): 'BGR' (cv2) or 'RGB' (PIL) channel order of 3-channel input.
+
+    Returns:
+    - dict: width and height of the input, mean level, noise_sigma (Immerkaer estimate),
+      sharpness (Laplacian variance), rms_contrast (std / 255), clipped_low / clipped_high /
+      clipped_fraction (share of pixels at 0 or 255) and histogram (256 counts).
+    """
+    gray = _strided_gray(image, max_side, color_order)
+    samples = gray.astype(np.float32)
+
+    laplacian = cv2.Laplacian(samples, cv2.CV_32F)
+    residual = cv2.filter2D(samples, cv2.CV_32F, _NOISE_KERNEL)[1:-1, 1:-1]
+    interior = max(residual.size, 1)
+    noise_sigma = math.sqrt(math.pi / 2.0) * float(np.abs(residual).sum()) / (6.0 * interior)
+
+    histogram = np.bincount(gray.ravel(), minlength=256)
+    mean, std = cv2.meanStdDev(samples)
+    clipped_low = histogram[0] / gray.size
+    clipped_high = histogram[255] / gray.size
+
+    return {
+        "width": image.shape[1],
+        "height": image.shape[0],
+        "mean": float(mean[0, 0]),
+        "noise_sigma": noise_sigma,
+        "sharpness": float(laplacian.var()),
+        "rms_contrast": float(std[0, 0]) / 255.0,
+        "clipped_low": float(clipped_low),
+        "clipped_high": float(clipped_high),
+        "clipped_fraction": float(clipped_low + clipped_high),
+        "histogram": histogram,
+    }
+
+
+_REDUCED_READ_FLAGS = {1: "IMREAD_GRAYSCALE", 2: "IMREAD_REDUCED_GRAYSCALE_2",
+                       4: "IMREAD_REDUCED_GRAYSCALE_4", 8: "IMREAD_REDUCED_GRAYSCALE_8"}
+
+
+def analyze_file(path, max_side=1024, reduce=1):
+    """
+    Decode an image (grayscale only) and analyse it.
+
+    Parameters:
+    - path (str): Image file path.
+    - max_side (int): Longest side of the analysed view.
+    - reduce (int): 1, 2, 4 or 8. Lets the decoder downscale (much faster for JPEG); noise
+      and sharpness are then measured at the reduced scale.
+
+    Returns:
+    - dict: Metrics as returned by analyze_array, plus 'path'.
+    """
+    image = cv2.imread(path, getattr(cv2, _REDUCED_READ_FLAGS[reduce]))
+    if image is None:
+        raise ValueError(f"Error loading image: {path}")
+    metrics = analyze_array(image, max_side)
+    metrics["path"] = path
+    return metrics
+
+
+def _analyze_or_none(path, max_side, reduce):
+    try:
+        return analyze_file(path, max_side, reduce)
+    except Exception:
+        return None
+
+
+def analyze_files(image_paths, output_path=None, max_side=1024, reduce=1, workers=None, chunksize=16):
+    """
+    Score many images for triage, in parallel, and optionally write the results column by column.
+
+    Parameters:
+    - image_paths (list): Image file paths.
+    - output_path (str): Optional output file. '.csv' writes one row per image (no histogram);
+      '.npz' writes one array per column including an N x 256 'histogram'; '.parquet'
+      needs pyarrow.
+    - max_side (int): Longest side of the analysed view.
+    - reduce (int): Decoder downscale factor, see analyze_file.
+    - workers (int): Worker processes. Defaults to os.cpu_count().
+    - chunksize (int): Paths handed to a worker at a time.
+
+    Returns:
+    - dict: Column name -> numpy array, with 'path' and 'histogram' columns. Unreadable
+      files are skipped.
+    """
+    image_paths = list(image_paths)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        count = len(image_paths)
+        results = [r for r in executor.map(_analyze_or_none, image_paths, [max_side] * count, [reduce] * count,
+                                           chunksize=chunksize) if r is not None]
+
+    columns = {"path": np.array([r["path"] for r in results], dtype=str)}
+    for name in METRIC_COLUMNS:
+        columns[name] = np.array([r[name] for r in results], dtype=np.float32)
+    columns["histogram"] = np.array([r["histogram"] for r in results], dtype=np.int64).reshape(-1, 256)
+
+    if output_path is not None:
+        write_columns(columns, output_path)
+    return columns
+
+
+def write_columns(columns, output_path):
+    """
+    Write analysis columns to CSV, NPZ or Parquet, chosen by the file extension.
+
+    Parameters:
+    - columns (dict): Column name -> numpy array, as returned by analyze_files.
+    - output_path (str): Destination path ending in .csv, .npz or .parquet.
+    """
+    extension = os.path.splitext(output_path)[1].lower()
+    if extension == ".csv":
+        names = ["path"] + METRIC_COLUMNS
+        with open(output_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(names)
+            writer.writerows(zip(*(columns[name] for name in names)))
+    elif extension == ".npz":
+        np.savez(output_path, **columns)
+    elif extension == ".parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Writing .parquet requires pyarrow; use .npz or .csv instead.")
+        table = {name: values for name, values in columns.items() if name != "histogram"}
+        table["histogram"] = list(columns["histogram"])
+        pq.write_table(pa.table(table), output_path)
+    else:
+        raise ValueError(f"Unsupported output format: {extension}. Choose '.csv', '.npz' or '.parquet'.")
+
+
+def main():
+    import argparse
+    from batch_processing import load_images_from_directory
+
+    parser = argparse.ArgumentParser(description="Score every image in a directory for triage.")
+    parser.add_argument("directory")
+    parser.add_argument("-o", "--output", default="metrics.csv", help="Output .csv, .npz or .parquet file.")
+    parser.add_argument("--max-side", type=int, default=1024)
+    parser.add_argument("--reduce", type=int, choices=sorted(_REDUCED_READ_FLAGS), default=1)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+
+    columns = analyze_files(load_images_from_directory(args.directory), args.output,
+                            args.max_side, args.reduce, args.workers)
+    print(f"Analysed {len(columns['path'])} images -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,52 +1,342 @@
+import functools
 import os
+import shutil
+import traceback
+from collections import deque, namedtuple
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from PIL import Image
 
+from export import DEFAULT_PRESET, Exporter, save_image
+from instrumentation import DISABLED, add_stage
+from manifest import iter_image_files
+from result_cache import hash_file, make_key
+from storage import is_raw
+
+BatchError = namedtuple("BatchError", ["type", "message", "traceback"])
+BatchResult = namedtuple("BatchResult", ["image_path", "save_path", "image", "error", "cached", "profile"],
+                         defaults=(False, None))
+
+
+def _error_result(image_path, exc):
+    error = BatchError(type(exc).__name__, str(exc), traceback.format_exc())
+    return BatchResult(image_path, None, None, error)
+
+
+def _save_path(image_path, output_dir, output_format):
+    image_name = os.path.basename(image_path)
+    if output_format is not None:
+        image_name = os.path.splitext(image_name)[0] + "." + output_format.lstrip(".").lower()
+    return os.path.join(output_dir, image_name)
+
+
+def _save_stage(save_path):
+    return "write" if is_raw(save_path) else "encode"
+
+
+def _save_result(processed_image, save_path, profiler=DISABLED, export_preset=DEFAULT_PRESET):
+    with profiler.stage(_save_stage(save_path)) as stage:
+        save_image(processed_image, save_path, export_preset)
+        stage.add_bytes(os.path.getsize(save_path))
+
+
+def _function_token(process_function):
+    # Identifies the work for the result cache: the function's qualified name plus,
+    # for objects such as Pipeline (or their bound methods), their cache_token().
+    # A partial is its function plus its bound arguments. Lambdas and local functions
+    # share qualified names ('<lambda>', 'f.<locals>.g'), so they cannot be told apart.
+    if isinstance(process_function, functools.partial):
+        return [_function_token(process_function.func), list(process_function.args), process_function.keywords]
+    owner = getattr(process_function, "__self__", process_function)
+    cache_token = getattr(owner, "cache_token", None)
+    name = getattr(process_function, "__qualname__", type(process_function).__qualname__)
+    if "<" in name:
+        raise ValueError(f"Cannot cache or deduplicate results of {name}: use a module-level function "
+                         "or a functools.partial of one.")
+    return [f"{getattr(process_function, '__module__', '')}.{name}", cache_token() if cache_token else None]
+
+
+def _process_one(image_path, process_function, output_dir, args, kwargs, return_image, output_format=None,
+                 cache=None, profiler=DISABLED, export_preset=DEFAULT_PRESET, exporter=None):
+    # Runs inside the worker: the image is processed and saved there so only
+    # the small BatchResult (with its profile record) has to travel back to the parent process.
+    # With an exporter the save is only queued; the result is final after _finish.
+    cached = False
+    pending = None
+    save_path = _save_path(image_path, output_dir, output_format)
+    with profiler.image(image_path) as record:
+        try:
+            key = None
+            if cache is not None:
+                with profiler.stage("cache"):
+                    key = make_key(hash_file(image_path), "process_batch",
+                                   [_function_token(process_function), args, kwargs])
+                    processed_image = cache.get(key)
+                cached = processed_image is not None
+                if cached and not is_raw(save_path):
+                    processed_image = Image.fromarray(processed_image)
+            if not cached:
+                processed_image = process_function(image_path, *args, **kwargs)
+                if key is not None:
+                    with profiler.stage("cache"):
+                        cache.put(key, processed_image)
+            if exporter is None:
+                _save_result(processed_image, save_path, profiler, export_preset)
+            else:
+                pending = exporter.submit(processed_image, save_path, export_preset)
+        except Exception as e:
+            result = _error_result(image_path, e)
+        else:
+            result = BatchResult(image_path, save_path, processed_image if return_image else None, None, cached)
+    return result._replace(profile=record), pending
+
+
+def _finish(result, pending):
+    if pending is None:
+        return result
+    try:
+        seconds, nbytes = pending.result()
+    except Exception as e:
+        return _error_result(result.image_path, e)._replace(profile=result.profile)
+    add_stage(result.profile, _save_stage(result.save_path), seconds, nbytes)
+    return result
+
+
+def _process_chunk(image_paths, *args):
+    # Each image is encoded on a background thread while the next one is computed.
+    with Exporter(threads=1, max_pending=1) as exporter:
+        processed = [_process_one(image_path, *args, exporter=exporter) for image_path in image_paths]
+        return [_finish(result, pending) for result, pending in processed]
+
+
+def iter_process_batch(image_paths, process_function, output_dir="processed_images", *args,
+                       workers=None, chunksize=1, max_in_flight=None, return_images=False, output_format=None,
+                       cache=None, profiler=None, dedup=None, export_preset=DEFAULT_PRESET, overlap_export=False,
+                       function_kwargs=None):
+    """
+    Process a list of image files and yield one result per image as soon as it is done.
+
+    Parameters:
+    - image_paths (iterable): Image file paths to process. Consumed lazily.
+    - process_function (function): Function to apply to each image. Must be picklable
+      (a module-level function) when workers > 1.
+    - output_dir (str): Directory where processed images will be saved. Defaults to 'processed_images'.
+    - workers (int): Number of worker processes. 1 runs in the calling process; None uses os.cpu_count().
+    - chunksize (int): Images sent to a worker per task. Larger chunks cut inter-process overhead
+      for many small images; results of a chunk are yielded together.
+    - max_in_flight (int): Maximum number of chunks submitted but not yet yielded. Defaults to 2 * workers.
+    - return_images (bool): Include the processed image in each result. Off by default so memory
+      stays bounded by max_in_flight instead of growing with the batch.
+    - output_format (str): None keeps the source file's extension. 'npy' writes the raw array
+      (no encode; read back zero-copy with storage.open_array) for intermediate stages; any
+      other extension such as 'png' re-encodes, e.g. as the final export of raw stages.
+    - export_preset (str or dict): Encoder settings, see export.encode_options: 'fast', 'balanced'
+      or 'small', or per-format options. None (default) saves with PIL's defaults. With
+      workers > 1, each worker encodes on a thread beside the compute of its next image.
+    - overlap_export (bool): Do the same with workers=1. Results are then yielded after the next
+      image has been computed (sooner if its encode has already finished), so leave it off when
+      inputs arrive slowly (Manifest.watch) and each result should be recorded at once.
+    - cache (ResultCache): Optional result cache. Results are keyed on the input file's bytes,
+      the process function and its arguments, and reused across runs. The function must be
+      module-level (or a functools.partial of one); lambdas and local functions raise ValueError.
+      Hits and misses in worker processes are added to this instance's counters.
+    - profiler (instrumentation.Profiler): Optional profiler. Decode, convert, every pipeline stage
+      and encode are timed per image (in the worker) and merged into it as results arrive.
+    - dedup (dedup.DedupIndex): Optional perceptual-hash index, consulted in this process. An
+      image that looks like one already processed the same way (same function and arguments)
+      gets a copy of that output instead of being processed, with cached=True. New outputs are
+      recorded in the index as they arrive. Two limits: images are hashed one at a time in
+      this process before they are dispatched, which caps throughput at the parent's hashing
+      rate; and an output is only matched once it has arrived, so near-duplicates within the
+      images in flight are all processed. The process function must be one the cache accepts.
+    - *args: Additional positional arguments to pass to the process function.
+    - function_kwargs (dict): Keyword arguments to pass to the process function. They are kept
+      apart from the options above, so the function may take a `workers` or `cache` of its own.
+
+    Yields:
+    - BatchResult: (image_path, save_path, image, error, cached, profile). Results arrive in completion
+      order; error is None on success or a BatchError(type, message, traceback) on failure; cached
+      is True when the result came from the cache; profile is the per-image timing record when
+      profiling is enabled.
+    """
+
+    kwargs = dict(function_kwargs or {})
+    if cache is not None or dedup is not None:
+        _function_token(process_function)
+    os.makedirs(output_dir, exist_ok=True)
+    if profiler is None:
+        profiler = DISABLED
+    if dedup is not None:
+        yield from _iter_deduplicated(image_paths, process_function, output_dir, args, kwargs, workers, chunksize,
+                                      max_in_flight, return_images, output_format, cache, profiler, export_preset,
+                                      overlap_export, dedup)
+        return
+    for result in _iter_results(image_paths, process_function, output_dir, args, kwargs, workers, chunksize,
+                                max_in_flight, return_images, output_format, cache, profiler, export_preset,
+                                overlap_export):
+        profiler.add_record(result.profile)
+        yield result
+
+
+def _iter_deduplicated(image_paths, process_function, output_dir, args, kwargs, workers, chunksize, max_in_flight,
+                       return_images, output_format, cache, profiler, export_preset, overlap_export, dedup):
+    from dedup import compute_hashes
+
+    # Lossy encoder settings change the output, so they are part of the processing identity.
+    token = make_key("", "process_batch", [_function_token(process_function), args, kwargs, export_preset])
+    hashes = {}
+    reused = deque()
+
+    def to_process():
+        # Near-duplicates are answered here, in the parent, and never reach a worker.
+        for image_path in image_paths:
+            save_path = _save_path(image_path, output_dir, output_format)
+            try:
+                image_hashes = compute_hashes(image_path)
+            except Exception:
+                # Unreadable here means unreadable in the worker too; let it report the error.
+                yield image_path
+                continue
+            match = dedup.find_output(image_hashes, token, os.path.splitext(save_path)[1])
+            if match is None:
+                hashes[image_path] = image_hashes
+                yield image_path
+                continue
+            try:
+                if os.path.abspath(match[1]) != os.path.abspath(save_path):
+                    shutil.copyfile(match[1], save_path)
+                dedup.record_output(image_path, token, save_path, image_hashes)
+            except OSError as e:
+                reused.append(_error_result(image_path, e))
+            else:
+                reused.append(BatchResult(image_path, save_path, None, None, True))
+
+    try:
+        for result in _iter_results(to_process(), process_function, output_dir, args, kwargs, workers, chunksize,
+                                    max_in_flight, return_images, output_format, cache, profiler, export_preset,
+                                    overlap_export):
+            while reused:
+                yield reused.popleft()
+            profiler.add_record(result.profile)
+            image_hashes = hashes.pop(result.image_path, None)
+            if result.error is None and image_hashes is not None:
+                dedup.record_output(result.image_path, token, result.save_path, image_hashes)
+            yield result
+        while reused:
+            yield reused.popleft()
+    finally:
+        dedup.commit()
+
+
+def _iter_results(image_paths, process_function, output_dir, args, kwargs, workers, chunksize, max_in_flight,
+                  return_images, output_format, cache, profiler, export_preset, overlap_export=False):
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers == 1 and not overlap_export:
+        for image_path in image_paths:
+            yield _process_one(image_path, process_function, output_dir, args, kwargs, return_images,
+                               output_format, cache, profiler, export_preset)[0]
+        return
+
+    if workers == 1:
+        with Exporter(threads=1, max_pending=1) as exporter:
+            previous = None
+            for image_path in image_paths:
+                current = _process_one(image_path, process_function, output_dir, args, kwargs, return_images,
+                                       output_format, cache, profiler, export_preset, exporter)
+                if previous is not None:
+                    yield _finish(*previous)
+                previous = current
+                if previous[1] is None or previous[1].done():
+                    # Already written (or failed): no reason to wait for the next image.
+                    yield _finish(*previous)
+                    previous = None
+            if previous is not None:
+                yield _finish(*previous)
+        return
+
+    if max_in_flight is None:
+        max_in_flight = 2 * workers
+
+    image_paths = iter(image_paths)
+    executor = ProcessPoolExecutor(max_workers=workers)
+    pending = {}
+    try:
+        for chunk in iter(lambda: list(islice(image_paths, chunksize)), []):
+            while len(pending) >= max_in_flight:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from _future_results(future, pending.pop(future), cache)
+            future = executor.submit(_process_chunk, chunk, process_function, output_dir,
+                                     args, kwargs, return_images, output_format, cache, profiler, export_preset)
+            pending[future] = chunk
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from _future_results(future, pending.pop(future), cache)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _future_results(future, image_paths, cache=None):
+    # Failures inside process_function are already captured by _process_one;
+    # this catches the rest (pickling errors, a worker dying) for the whole chunk.
+    try:
+        results = future.result()
+    except Exception as e:
+        return [_error_result(image_path, e) for image_path in image_paths]
+    if cache is not None:
+        # Workers looked up their own copy of the cache; count the lookups here too.
+        for result in results:
+            if result.error is None:
+                if result.cached:
+                    cache.hits += 1
+                else:
+                    cache.misses += 1
+    return results
+
+
 def process_batch(image_paths, process_function, output_dir="processed_images", *args, **kwargs):
     """
     Batch processes a list of image files using the specified process function and saves the results.
-    
+
     Parameters:
     - image_paths (list): List of image file paths to process.
     - process_function (function): Function to apply to each image.
     - output_dir (str): Directory where processed images will be saved. Defaults to 'processed_images'.
-    - *args, **kwargs: Additional arguments to pass to the process function.
-    
+    - *args, **kwargs: Additional arguments to pass to the process function, all of them: none
+      are taken as batch options.
+
     Returns:
     - list: A list of processed image objects.
     """
 
-    os.makedirs(output_dir, exist_ok=True)
-
     processed_images = []
-    for image_path in image_paths:
-        try:
-            processed_image = process_function(image_path, *args, **kwargs)
-            processed_images.append(processed_image)
-
-            image_name = os.path.basename(image_path)
-            save_path = os.path.join(output_dir, image_name)
-            processed_image.save(save_path)
-            print(f"Processed and saved: {save_path}")
-
-        except Exception as e:
-            print(f"Error processing {image_path}: {e}")
+    for result in iter_process_batch(image_paths, process_function, output_dir, *args,
+                                     workers=1, return_images=True, function_kwargs=kwargs):
+        if result.error is None:
+            processed_images.append(result.image)
+            print(f"Processed and saved: {result.save_path}")
+        else:
+            print(f"Error processing {result.image_path}: {result.error.message}")
 
     return processed_images
 
-def load_images_from_directory(directory, extensions=('jpg', 'jpeg', 'png')):
+def load_images_from_directory(directory, extensions=('jpg', 'jpeg', 'png'), manifest=None):
     """
     Load image file paths from a directory.
 
     Parameters:
     - directory (str): Path to the directory containing images.
     - extensions (tuple): Allowed file extensions. Defaults to ('jpg', 'jpeg', 'png').
+    - manifest (Manifest): Optional manifest.Manifest. Only files that are new or changed since
+      they were last listed are returned, and they are recorded as listed.
 
     Returns:
     - list: List of image file paths.
     """
-    image_paths = []
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if file.lower().endswith(extensions):
-                image_paths.append(os.path.join(root, file))
-    return image_paths
+    if manifest is not None:
+        return [entry.path for entry in manifest.scan(directory, extensions)]
+    return list(iter_image_files(directory, extensions))
@@ -0,0 +1,107 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+import numpy as np
+
+
+class BufferPool:
+    def __init__(self, max_bytes=1024 ** 3):
+        """
+        Free list of arrays keyed by shape and dtype, so same-sized frames reuse memory.
+
+        Buffers come back uninitialised; operations write into them with cv2's `dst=`
+        or NumPy's `out=`. Only returned (free) buffers are held, up to `max_bytes`;
+        anything beyond that is left to the garbage collector. Thread-safe.
+
+        Parameters:
+        - max_bytes (int): Limit on the bytes held in free buffers.
+        """
+        self.max_bytes = max_bytes
+        self.allocations = 0
+        self.reuses = 0
+        self._free = defaultdict(list)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, shape, dtype=np.uint8):
+        """
+        Take a buffer from the pool, allocating one if none is free.
+
+        Parameters:
+        - shape (tuple): Array shape.
+        - dtype: NumPy dtype.
+
+        Returns:
+        - numpy.ndarray: Uninitialised, C-contiguous array.
+        """
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                array = free.pop()
+                self._bytes -= array.nbytes
+                self.reuses += 1
+                return array
+            self.allocations += 1
+        return np.empty(shape, dtype)
+
+    def put(self, array):
+        """
+        Return a buffer to the pool. The caller must not use it afterwards.
+
+        Parameters:
+        - array (numpy.ndarray): A buffer from get(), or any array the caller owns outright
+          (not a view, memmap or array shared with someone else).
+        """
+        if type(array) is not np.ndarray or array.base is not None or not array.flags.c_contiguous:
+            return
+        with self._lock:
+            if self._bytes + array.nbytes > self.max_bytes:
+                return
+            self._free[(array.shape, array.dtype.str)].append(array)
+            self._bytes += array.nbytes
+
+    @contextmanager
+    def borrow(self, shape, dtype=np.uint8):
+        """
+        Scratch buffer for the duration of a with block.
+
+        Parameters:
+        - shape (tuple): Array shape.
+        - dtype: NumPy dtype.
+
+        Yields:
+        - numpy.ndarray: Uninitialised buffer, returned to the pool on exit.
+        """
+        array = self.get(shape, dtype)
+        try:
+            yield array
+        finally:
+            self.put(array)
+
+    def clear(self):
+        with self._lock:
+            self._free.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Pool counters.
+
+        Returns:
+        - dict: allocations, reuses, free_buffers and free_bytes.
+        """
+        with self._lock:
+            return {"allocations": self.allocations, "reuses": self.reuses,
+                    "free_buffers": sum(len(free) for free in self._free.values()), "free_bytes": self._bytes}
+
+
+# Shared by the operations (for scratch space) and pipelines (for stage outputs) of a process.
+default_pool = BufferPool()
+
+
+def borrow(shape, dtype=np.uint8):
+    """
+    Scratch buffer from the default pool; see BufferPool.borrow.
+    """
+    return default_pool.borrow(shape, dtype)
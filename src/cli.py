@@ -0,0 +1,256 @@
+"""
+Run a recipe of operations over every image in a directory, without a GUI.
+
+A recipe is a JSON (or, with PyYAML installed, YAML) file holding an ordered list of
+steps; each step is an operation name or a mapping with an 'op' key plus its
+parameters. Optional top-level keys set defaults for the command-line options.
+
+    {
+        "steps": [
+            {"op": "denoise", "h": 8},
+            {"op": "gamma", "gamma": 0.8},
+            "unsharp_mask",
+            {"op": "edge_detection", "method": "Sobel"}
+        ],
+        "output_format": "png",
+        "export": "fast"
+    }
+
+'export' picks the encoder settings: a preset ('fast', 'balanced', 'small') or
+per-format options such as {"PNG": {"compress_level": 6}} (see export.PRESETS).
+Without it, images are saved with PIL's defaults.
+
+Usage:
+    python src/cli.py recipe.json images/ -o output/ --workers 8 --chunk-size 4
+    python src/cli.py recipe.json images/ -o output/ --resume
+    python src/cli.py recipe.json uploads/ -o output/ --manifest uploads.sqlite --watch
+    python src/cli.py recipe.json uploads/ -o output/ --dedup-index uploads.dedup.sqlite
+    python src/cli.py --list-ops
+"""
+import argparse
+import json
+import os
+import sys
+
+from batch_processing import iter_process_batch, load_images_from_directory
+from export import DEFAULT_PRESET, PRESETS
+from operations import OPERATIONS
+from pipeline import Pipeline
+
+
+def _parse_step(step):
+    if isinstance(step, str):
+        return step, {}
+    if isinstance(step, dict):
+        params = dict(step)
+        try:
+            name = params.pop("op")
+        except KeyError:
+            raise ValueError(f"Recipe step without an 'op' key: {step}")
+        return name, params
+    name, params = step
+    return name, dict(params or {})
+
+
+def load_recipe(path):
+    """
+    Read a recipe file.
+
+    Parameters:
+    - path (str): .json, .yaml or .yml file. A bare list is taken as the steps.
+
+    Returns:
+    - dict: The recipe, with 'steps' normalized to (name, params) pairs.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path) as f:
+        if extension in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("Reading YAML recipes requires PyYAML; use a .json recipe instead.")
+            recipe = yaml.safe_load(f)
+        else:
+            recipe = json.load(f)
+    if isinstance(recipe, list):
+        recipe = {"steps": recipe}
+    recipe["steps"] = [_parse_step(step) for step in recipe.get("steps", [])]
+    if not recipe["steps"]:
+        raise ValueError(f"Recipe has no steps: {path}")
+    return recipe
+
+
+def read_checkpoint(path):
+    """
+    Input paths already completed by an earlier run.
+
+    Parameters:
+    - path (str): Checkpoint file, one completed input path per line.
+
+    Returns:
+    - set: Completed paths; empty if the file does not exist.
+    """
+    try:
+        with open(path) as f:
+            return {line.rstrip("\n") for line in f if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+
+def run_recipe(recipe, image_paths, output_dir, workers=None, chunksize=1, checkpoint=None, resume=False,
+               cache=None, profiler=None, manifest=None, dedup=None, overlap_export=False,
+               stop_on_interrupt=False):
+    """
+    Run a recipe over images, recording every finished image in a checkpoint file.
+
+    Parameters:
+    - recipe (dict): As returned by load_recipe.
+    - image_paths (iterable): Input image paths, or ManifestEntry items from a manifest scan or watch.
+    - output_dir (str): Destination directory.
+    - workers (int): Worker processes; None uses os.cpu_count().
+    - chunksize (int): Images sent to a worker per task.
+    - checkpoint (str): Checkpoint file. Successful images are appended as they finish, so an
+      interrupted run loses at most the images still in flight.
+    - resume (bool): Skip images already listed in the checkpoint instead of starting over.
+    - cache (ResultCache): Optional result cache.
+    - profiler (instrumentation.Profiler): Optional profiler.
+    - manifest (Manifest): Records each ManifestEntry once its image has been processed.
+    - dedup (dedup.DedupIndex): Copies the output of a near-duplicate instead of processing again.
+    - overlap_export (bool): With one worker, encode each image while the next is computed;
+      results are then recorded one image late. See iter_process_batch.
+    - stop_on_interrupt (bool): On KeyboardInterrupt, return the counts so far instead of
+      raising, e.g. to end a watch.
+
+    Returns:
+    - tuple: (processed, skipped, failed) counts.
+    """
+    done = read_checkpoint(checkpoint) if checkpoint and resume else set()
+    entries = {}
+    skipped = 0
+
+    def pending():
+        nonlocal skipped
+        for item in image_paths:
+            image_path = getattr(item, "path", item)
+            if image_path in done:
+                skipped += 1
+            else:
+                entries[image_path] = item
+                yield image_path
+
+    processed = failed = 0
+    log = open(checkpoint, "a" if resume else "w") if checkpoint else None
+    try:
+        for result in iter_process_batch(pending(), Pipeline(recipe["steps"]), output_dir, workers=workers,
+                                         chunksize=chunksize, output_format=recipe.get("output_format"),
+                                         cache=cache, profiler=profiler, dedup=dedup,
+                                         export_preset=recipe.get("export", DEFAULT_PRESET),
+                                         overlap_export=overlap_export):
+            item = entries.pop(result.image_path, None)
+            if result.error is None:
+                processed += 1
+                if manifest is not None and item is not result.image_path:
+                    manifest.record(item)
+                if log is not None:
+                    log.write(result.image_path + "\n")
+                    log.flush()
+            else:
+                failed += 1
+                print(f"Error processing {result.image_path}: {result.error.message}", file=sys.stderr)
+    except KeyboardInterrupt:
+        if not stop_on_interrupt:
+            raise
+    finally:
+        if log is not None:
+            log.close()
+    return processed, skipped, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("recipe", nargs="?", help="Recipe file (.json, .yaml or .yml).")
+    parser.add_argument("input_dir", nargs="?", help="Directory of input images (searched recursively).")
+    parser.add_argument("-o", "--output", default="processed_images", help="Output directory.")
+    parser.add_argument("--workers", type=int, help="Worker processes. Defaults to the CPU count.")
+    parser.add_argument("--chunk-size", type=int, help="Images sent to a worker per task.")
+    parser.add_argument("--extensions", nargs="+", help="Input file extensions, e.g. jpg png npy.")
+    parser.add_argument("--output-format", help="Output extension, e.g. png or npy. Defaults to the input's.")
+    parser.add_argument("--export-preset", choices=sorted(PRESETS), help="Encoder settings: speed against size.")
+    parser.add_argument("--checkpoint", help="Checkpoint file. Defaults to <output>/.checkpoint.")
+    parser.add_argument("--resume", action="store_true", help="Skip images completed by an earlier run.")
+    parser.add_argument("--manifest", help="SQLite manifest; only images new or changed since they were "
+                                           "last processed are run.")
+    parser.add_argument("--watch", action="store_true", help="Keep running and process new uploads as they "
+                                                             "arrive (needs --manifest).")
+    parser.add_argument("--cache-dir", help="Reuse results from a result cache in this directory.")
+    parser.add_argument("--dedup-index", help="SQLite perceptual-hash index; near-duplicates of images already "
+                                              "processed with this recipe reuse their output.")
+    parser.add_argument("--profile-log", help="Write per-image stage timings (JSON lines) to this file.")
+    parser.add_argument("--metrics", help="Write aggregated stage timings (JSON) to this file.")
+    parser.add_argument("--list-ops", action="store_true", help="List the operations a recipe can use and exit.")
+    args = parser.parse_args(argv)
+
+    if args.list_ops:
+        print("\n".join(sorted(OPERATIONS)))
+        return 0
+    if args.recipe is None or args.input_dir is None:
+        parser.error("recipe and input_dir are required")
+    if args.watch and not args.manifest:
+        parser.error("--watch needs --manifest")
+
+    recipe = load_recipe(args.recipe)
+    workers = args.workers if args.workers is not None else recipe.get("workers")
+    chunksize = args.chunk_size or recipe.get("chunk_size", 1)
+    if args.output_format:
+        recipe["output_format"] = args.output_format
+    if args.export_preset:
+        recipe["export"] = args.export_preset
+    extensions = tuple(args.extensions or recipe.get("extensions", ("jpg", "jpeg", "png")))
+    checkpoint = args.checkpoint or os.path.join(args.output, ".checkpoint")
+
+    cache = None
+    if args.cache_dir:
+        from result_cache import ResultCache
+        cache = ResultCache(args.cache_dir)
+    dedup = None
+    if args.dedup_index:
+        from dedup import DedupIndex
+        dedup = DedupIndex(args.dedup_index)
+    profiler = None
+    if args.profile_log or args.metrics:
+        from instrumentation import Profiler
+        profiler = Profiler(log_path=args.profile_log)
+
+    os.makedirs(args.output, exist_ok=True)
+    manifest = None
+    if args.manifest:
+        from manifest import Manifest
+        manifest = Manifest(args.manifest)
+        if args.watch:
+            # Chunks would wait for several uploads before starting; watch sends them one by one.
+            chunksize = 1
+            image_paths = manifest.watch(args.input_dir, extensions, record=False)
+        else:
+            image_paths = manifest.scan(args.input_dir, extensions, record=False)
+    else:
+        image_paths = load_images_from_directory(args.input_dir, extensions)
+    try:
+        processed, skipped, failed = run_recipe(recipe, image_paths, args.output, workers, chunksize, checkpoint,
+                                                args.resume, cache, profiler, manifest, dedup,
+                                                # A watch records each upload as soon as it is written.
+                                                overlap_export=not args.watch, stop_on_interrupt=args.watch)
+    finally:
+        if manifest is not None:
+            manifest.close()
+        if dedup is not None:
+            dedup.close()
+    if profiler is not None:
+        profiler.close()
+        if args.metrics:
+            profiler.write_metrics(args.metrics)
+    print(f"Processed {processed}, skipped {skipped} already done, {failed} failed -> {args.output}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
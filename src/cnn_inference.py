@@ -0,0 +1,397 @@
+"""
+The denoising CNN and its CPU inference: overlapping tiles with seam blending,
+fixed-shape graphs, and TFLite export with float16 or int8 weights.
+
+Nothing here imports Tk or cv2, so the headless worker (cnn_service.py) builds the
+model without loading the GUI stack.
+
+The model upsamples 2x, so a full-resolution frame needs several GB of activations
+(two 64-channel float32 maps at input size, one at four times that size). Tiling
+keeps activations at tile size; the output is stitched one tile row at a time, so
+beyond the uint8 result only one row band of float32 is held.
+
+Usage:
+    python src/cnn_inference.py export model.tflite --quantize int8 --calibrate frames/
+    python src/cnn_inference.py enhance moon.png moon_2x.png --tflite model.tflite
+"""
+import math
+import os
+
+import numpy as np
+
+UPSCALE = 2
+# Receptive field of build_denoising_cnn in input pixels: two 3x3 convolutions at input
+# resolution, one at output resolution. Tile outputs this close to an interior tile
+# edge see zero padding instead of neighbours and are never used.
+RECEPTIVE_RADIUS = 3
+DEFAULT_TILE_SIZE = 256
+DEFAULT_OVERLAP = 16
+
+
+def available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def configure_cpu(threads=None):
+    """
+    Set TensorFlow's CPU threading for throughput. Must run before TensorFlow is imported.
+
+    oneDNN stays enabled (its fused convolutions are the fast path on x86). Every
+    available core goes to the intra-op pool, and a single inter-op thread suffices
+    because the graph is one chain of convolutions. OpenMP workers stop spinning after
+    1 ms instead of 200 ms, so idle threads don't compete with decode and encode threads
+    between batches. Variables the user already set are left alone.
+
+    Parameters:
+    - threads (int): Intra-op threads. Defaults to the CPUs available to this process.
+    """
+    threads = str(threads or available_cpus())
+    for name, value in (("TF_ENABLE_ONEDNN_OPTS", "1"), ("TF_CPP_MIN_LOG_LEVEL", "1"),
+                        ("TF_NUM_INTRAOP_THREADS", threads), ("TF_NUM_INTEROP_THREADS", "1"),
+                        ("OMP_NUM_THREADS", threads), ("KMP_BLOCKTIME", "1"),
+                        ("KMP_AFFINITY", "granularity=fine,compact,1,0")):
+        os.environ.setdefault(name, value)
+
+
+def build_denoising_cnn():
+    # TensorFlow takes seconds to import, so it is only loaded when a model is built.
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Conv2D, UpSampling2D
+
+    model = Sequential()
+    model.add(Conv2D(64, (3, 3), activation='relu', padding='same', input_shape=(None, None, 3)))
+    model.add(Conv2D(64, (3, 3), activation='relu', padding='same'))
+    model.add(UpSampling2D((2, 2)))
+    model.add(Conv2D(3, (3, 3), activation='sigmoid', padding='same'))
+    return model
+
+
+def _tile_starts(length, tile, overlap):
+    # Evenly spread tiles: every pair overlaps by at least `overlap`.
+    if length <= tile:
+        return [0]
+    count = math.ceil((length - overlap) / (tile - overlap))
+    return [round(i * (length - tile) / (count - 1)) for i in range(count)]
+
+
+def _weights(starts, tile, blend, margin):
+    """
+    Per-tile blending weights along one axis, in output pixels.
+
+    Where two tiles overlap, the weight moves from one to the other across a band of
+    `blend` pixels in the middle of the overlap. The band starts and ends `margin` pixels
+    inside it, so pixels near an interior tile edge get zero weight. The weights of
+    neighbouring tiles add up to one everywhere, so stitching is a plain weighted sum.
+    """
+    weights = []
+    for i, start in enumerate(starts):
+        weight = np.ones(tile, np.float32)
+        for neighbour, rising in ((i - 1, True), (i + 1, False)):
+            if not 0 <= neighbour < len(starts):
+                continue
+            overlap = tile - abs(starts[neighbour] - start)
+            offset = (overlap - blend) / 2 + margin
+            ramp = np.clip((np.arange(overlap, dtype=np.float32) - offset + 0.5) / (blend - 2 * margin), 0, 1)
+            if rising:
+                weight[:overlap] *= ramp
+            else:
+                weight[tile - overlap:] *= 1 - ramp
+        weights.append(weight)
+    return weights
+
+
+def _to_uint8(samples):
+    return np.clip(samples * 255.0 + 0.5, 0, 255).astype(np.uint8)
+
+
+class KerasRunner:
+    def __init__(self, model, tile_size):
+        """
+        Runs a Keras model as a graph traced once for (batch, tile, tile, 3) float32 input.
+
+        Parameters:
+        - model (keras.Model): The model, e.g. from build_denoising_cnn.
+        - tile_size (int): Tile edge length in input pixels.
+        """
+        import tensorflow as tf
+
+        self._tf = tf
+        spec = tf.TensorSpec([None, tile_size, tile_size, 3], tf.float32)
+        self._predict = tf.function(lambda batch: model(batch, training=False), input_signature=[spec])
+
+    def __call__(self, batch):
+        return self._predict(self._tf.constant(batch)).numpy()
+
+
+class TFLiteRunner:
+    def __init__(self, path, tile_size, batch_size, threads=None):
+        """
+        Runs an exported TFLite model (see export_tflite) with the XNNPACK CPU delegate.
+
+        int8 models with quantized input or output are fed and read through their
+        quantization parameters, so callers always pass and get float32 in [0, 1].
+
+        Parameters:
+        - path (str): .tflite file.
+        - tile_size (int): Tile edge length in input pixels.
+        - batch_size (int): Tiles per invocation; the input is resized to this batch once.
+        - threads (int): Interpreter threads. Defaults to the CPUs available to this process.
+        """
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tensorflow.lite import Interpreter
+            except ImportError:
+                raise ImportError("TFLite inference requires tflite-runtime or TensorFlow.")
+        self.batch_size = batch_size
+        self.interpreter = Interpreter(model_path=path, num_threads=threads or available_cpus())
+        self._input = self.interpreter.get_input_details()[0]
+        self.interpreter.resize_tensor_input(self._input["index"], [batch_size, tile_size, tile_size, 3])
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+
+    def __call__(self, batch):
+        count = len(batch)
+        if count < self.batch_size:
+            batch = np.concatenate([batch, np.repeat(batch[-1:], self.batch_size - count, axis=0)])
+        scale, zero_point = self._input["quantization"]
+        if scale:
+            batch = np.round(batch / scale + zero_point).astype(self._input["dtype"])
+        self.interpreter.set_tensor(self._input["index"], batch)
+        self.interpreter.invoke()
+        output = self.interpreter.get_tensor(self._output["index"])[:count]
+        scale, zero_point = self._output["quantization"]
+        if scale:
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+
+class TiledEnhancer:
+    def __init__(self, model=None, tflite=None, tile_size=DEFAULT_TILE_SIZE, overlap=DEFAULT_OVERLAP,
+                 batch_size=8, threads=None, margin=RECEPTIVE_RADIUS):
+        """
+        Runs the enhancement CNN over overlapping tiles and blends the seams.
+
+        Away from the seams' blend bands every output pixel comes from a tile that fully
+        covers its receptive field, so the result matches a full-frame run up to float
+        rounding. The exception is a frame smaller than a tile in either dimension: it is
+        edge-padded to tile size, so within RECEPTIVE_RADIUS input pixels of its right and
+        bottom edges the model sees replicated pixels instead of its own zero padding.
+
+        Parameters:
+        - model (keras.Model): Keras model. Ignored when `tflite` is given.
+        - tflite (str): Exported .tflite model to run instead.
+        - tile_size (int): Tile edge length in input pixels. All tiles have this size, so
+          the graph is traced, and the TFLite tensors allocated, only once.
+        - overlap (int): Minimum overlap of neighbouring tiles in input pixels.
+        - batch_size (int): Tiles per inference call.
+        - threads (int): TFLite interpreter threads.
+        - margin (int): Input pixels at interior tile edges that are discarded, at least the
+          model's receptive radius.
+        """
+        if overlap <= 2 * margin:
+            raise ValueError(f"overlap must be larger than 2 * margin ({2 * margin}), got {overlap}")
+        if tile_size < 4 * overlap:
+            raise ValueError(f"tile_size must be at least 4 * overlap ({4 * overlap}), got {tile_size}")
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.batch_size = batch_size
+        self.margin = margin
+        if tflite is not None:
+            self.run = TFLiteRunner(tflite, tile_size, batch_size, threads)
+        else:
+            self.run = KerasRunner(model, tile_size)
+
+    def _predict(self, tiles):
+        outputs = []
+        for start in range(0, len(tiles), self.batch_size):
+            batch = np.stack(tiles[start:start + self.batch_size]).astype(np.float32)
+            batch *= 1.0 / 255.0
+            outputs.extend(self.run(batch))
+        return outputs
+
+    def _pad(self, frame):
+        height, width = frame.shape[:2]
+        if height >= self.tile_size and width >= self.tile_size:
+            return frame
+        pad = ((0, max(self.tile_size - height, 0)), (0, max(self.tile_size - width, 0)), (0, 0))
+        return np.pad(frame, pad, mode="edge")
+
+    def enhance(self, frame):
+        """
+        Enhance one frame.
+
+        Parameters:
+        - frame (numpy.ndarray): H x W x 3 uint8 RGB frame.
+
+        Returns:
+        - numpy.ndarray: 2H x 2W x 3 uint8 RGB frame.
+        """
+        height, width = frame.shape[:2]
+        # Frames smaller than a tile are edge-padded to one tile and cropped afterwards; their
+        # right and bottom borders then differ slightly from a full-frame run (see __init__).
+        source = self._pad(frame)
+        tile, scale = self.tile_size, UPSCALE
+        ys = _tile_starts(source.shape[0], tile, self.overlap)
+        xs = _tile_starts(source.shape[1], tile, self.overlap)
+        weights_y = _weights([y * scale for y in ys], tile * scale, self.overlap * scale, self.margin * scale)
+        weights_x = _weights([x * scale for x in xs], tile * scale, self.overlap * scale, self.margin * scale)
+
+        out = np.empty((source.shape[0] * scale, source.shape[1] * scale, 3), np.uint8)
+        carry = None
+        for row, y in enumerate(ys):
+            tiles = self._predict([source[y:y + tile, x:x + tile] for x in xs])
+            band = np.zeros((tile * scale, out.shape[1], 3), np.float32)
+            if carry is not None:
+                band[:len(carry)] = carry
+            for x, weight_x, output in zip(xs, weights_x, tiles):
+                band[:, x * scale:(x + tile) * scale] += output * (weights_y[row][:, None, None] * weight_x[:, None])
+            # Rows above the next tile row are final; the rest is shared with it.
+            done = (ys[row + 1] - y) * scale if row + 1 < len(ys) else len(band)
+            out[y * scale:y * scale + done] = _to_uint8(band[:done])
+            carry = band[done:]
+        return out[:height * scale, :width * scale]
+
+    def enhance_many(self, frames):
+        """
+        Enhance several frames; frames that fit in one tile share inference batches.
+
+        Parameters:
+        - frames (list): H x W x 3 uint8 RGB frames.
+
+        Returns:
+        - list: The enhanced frames, in order.
+        """
+        results = [None] * len(frames)
+        small = [i for i, frame in enumerate(frames) if max(frame.shape[:2]) <= self.tile_size]
+        outputs = self._predict([self._pad(frames[i]) for i in small])
+        for i, output in zip(small, outputs):
+            height, width = frames[i].shape[:2]
+            results[i] = _to_uint8(output[:height * UPSCALE, :width * UPSCALE])
+        return [result if result is not None else self.enhance(frame) for result, frame in zip(results, frames)]
+
+
+def load_model(weights=None):
+    """
+    Build the enhancement CNN for CPU inference.
+
+    Parameters:
+    - weights (str): Optional Keras weights file.
+
+    Returns:
+    - keras.Model: The model from build_denoising_cnn.
+    """
+    # CPU only; must be set before TensorFlow is imported.
+    os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+    configure_cpu()
+    model = build_denoising_cnn()
+    if weights:
+        model.load_weights(weights)
+    return model
+
+
+def _calibration_tiles(image_paths, tile_size, samples, seed=0):
+    from storage import read_image_array
+
+    rng = np.random.default_rng(seed)
+    for _ in range(samples):
+        frame = read_image_array(image_paths[rng.integers(len(image_paths))])
+        if frame.ndim == 2:
+            frame = np.repeat(frame[..., None], 3, axis=2)
+        height, width = frame.shape[:2]
+        frame = np.pad(frame, ((0, max(tile_size - height, 0)), (0, max(tile_size - width, 0)), (0, 0)), mode="edge")
+        y = rng.integers(frame.shape[0] - tile_size + 1)
+        x = rng.integers(frame.shape[1] - tile_size + 1)
+        yield frame[None, y:y + tile_size, x:x + tile_size].astype(np.float32) / 255.0
+
+
+def export_tflite(model, path, tile_size=DEFAULT_TILE_SIZE, quantize="float16", calibration=None, samples=64):
+    """
+    Export the model as a TFLite graph for fixed-size tiles.
+
+    float16 halves the file and the weight reads; on x86 the weights are expanded to
+    float32 at load time, so the gain there is mostly memory. int8 quantizes weights and
+    activations, calibrated on tiles cropped from real frames, and runs on the integer
+    kernels (VNNI where available). Input and output stay float32 in [0, 1].
+
+    Parameters:
+    - model (keras.Model): Model to export.
+    - path (str): Destination .tflite file.
+    - tile_size (int): Tile edge length the graph is exported for.
+    - quantize (str): None (float32), 'float16' or 'int8'.
+    - calibration (list): Image paths to calibrate int8 activation ranges on; required for 'int8'.
+    - samples (int): Calibration tiles.
+
+    Returns:
+    - str: The destination path.
+    """
+    import tensorflow as tf
+
+    spec = tf.TensorSpec([None, tile_size, tile_size, 3], tf.float32)
+    concrete = tf.function(model, input_signature=[spec]).get_concrete_function()
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete], model)
+    if quantize == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantize == "int8":
+        if not calibration:
+            raise ValueError("int8 export needs calibration images")
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([tile] for tile in _calibration_tiles(calibration, tile_size,
+                                                                                          samples))
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    elif quantize is not None:
+        raise ValueError(f"Unsupported quantization: {quantize}. Choose None, 'float16' or 'int8'.")
+    with open(path, "wb") as f:
+        f.write(converter.convert())
+    return path
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Write a TFLite model for tiled inference.")
+    export_parser.add_argument("output", help="Destination .tflite file.")
+    export_parser.add_argument("--quantize", choices=("none", "float16", "int8"), default="float16")
+    export_parser.add_argument("--calibrate", help="Directory of images to calibrate int8 on.")
+    enhance_parser = subparsers.add_parser("enhance", help="Enhance one image.")
+    enhance_parser.add_argument("input")
+    enhance_parser.add_argument("output")
+    enhance_parser.add_argument("--tflite", help="Run an exported .tflite model instead of the Keras model.")
+    enhance_parser.add_argument("--overlap", type=int, default=DEFAULT_OVERLAP)
+    enhance_parser.add_argument("--batch-size", type=int, default=8)
+    for subparser in (export_parser, enhance_parser):
+        subparser.add_argument("--weights", help="Keras weights file.")
+        subparser.add_argument("--tile-size", type=int, default=DEFAULT_TILE_SIZE)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        calibration = None
+        if args.calibrate:
+            from manifest import iter_image_files
+            calibration = list(iter_image_files(args.calibrate))
+        quantize = None if args.quantize == "none" else args.quantize
+        export_tflite(load_model(args.weights), args.output, args.tile_size, quantize, calibration)
+        print(f"Wrote {args.output} ({os.path.getsize(args.output) / 1024:.0f} KB)")
+    else:
+        from export import save_image
+        from storage import read_image_array
+
+        configure_cpu()
+        model = None if args.tflite else load_model(args.weights)
+        enhancer = TiledEnhancer(model, args.tflite, args.tile_size, args.overlap, args.batch_size)
+        frame = read_image_array(args.input)
+        if frame.ndim == 2:
+            frame = np.repeat(frame[..., None], 3, axis=2)
+        save_image(enhancer.enhance(np.ascontiguousarray(frame)), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Long-lived CPU inference worker for the denoising CNN (cnn_inference.build_denoising_cnn).
+
+The model is built once and served over a local authenticated socket. Frames are
+run as overlapping fixed-size tiles with blended seams (cnn_inference.TiledEnhancer),
+so memory no longer grows with the frame; small frames from concurrent requests
+share inference batches. `--tflite` serves an exported float16 or int8 model instead.
+
+Start it explicitly with `python cnn_service.py serve`, or let `ensure_server`
+spawn it on first use.
+
+Connections carry pickled objects, so the socket is authenticated with a random
+per-user key (see authkey()) rather than a fixed one: anyone holding the key can
+run code in the worker.
+"""
+import argparse
+import os
+import queue
+import secrets
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener, answer_challenge, deliver_challenge
+
+import numpy as np
+from PIL import Image
+
+from cnn_inference import DEFAULT_OVERLAP, DEFAULT_TILE_SIZE, TiledEnhancer, configure_cpu, load_model
+
+DEFAULT_ADDRESS = ("127.0.0.1", 6010)
+# Seconds a new connection has to complete authentication.
+HANDSHAKE_TIMEOUT = 10
+AUTHKEY_FILE = os.path.join(os.path.expanduser("~"), ".lunarz", "cnn_authkey")
+
+
+def authkey(path=AUTHKEY_FILE):
+    """
+    The shared key authenticating clients of the inference worker.
+
+    LUNARZ_CNN_AUTHKEY wins if set (ensure_server passes the key to the worker that way).
+    Otherwise the key is read from a file only the current user can read; it is created
+    with a random key on first use.
+
+    Parameters:
+    - path (str): Key file. Defaults to ~/.lunarz/cnn_authkey.
+
+    Returns:
+    - bytes: The key.
+    """
+    key = os.environ.get("LUNARZ_CNN_AUTHKEY")
+    if key:
+        return key.encode()
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    if not os.path.exists(path):
+        # Written privately, then linked into place: concurrent first uses agree on one
+        # key and never read a half-written file.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+    with open(path) as f:
+        return f.read().strip().encode()
+
+
+def _disconnect(conn):
+    # Shutting the socket down (unlike closing it) wakes a thread blocked reading from it.
+    try:
+        with socket.fromfd(conn.fileno(), socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class InferenceServer:
+    def __init__(self, address=DEFAULT_ADDRESS, key=None, max_batch=8, max_wait=0.01, weights=None,
+                 tflite=None, tile_size=DEFAULT_TILE_SIZE, overlap=DEFAULT_OVERLAP):
+        self.address = address
+        self.authkey = key or authkey()
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        configure_cpu()
+        model = None if tflite else load_model(weights)
+        self.enhancer = TiledEnhancer(model, tflite, tile_size, overlap, batch_size=max_batch)
+        self.requests = queue.Queue()
+
+    def serve_forever(self):
+        threading.Thread(target=self._batch_loop, daemon=True).start()
+        # The listener itself has no key: it would authenticate inside accept(), where a
+        # client with the wrong key ends the loop and one that stalls blocks everyone.
+        # Each connection is authenticated on its own thread instead (see _handle).
+        with Listener(self.address) as listener:
+            while True:
+                try:
+                    conn = listener.accept()
+                except OSError:
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _authenticate(self, conn):
+        # The same two-way challenge as Listener(authkey=...). A client that has not
+        # finished it after HANDSHAKE_TIMEOUT seconds is disconnected.
+        timer = threading.Timer(HANDSHAKE_TIMEOUT, _disconnect, (conn,))
+        timer.start()
+        try:
+            deliver_challenge(conn, self.authkey)
+            answer_challenge(conn, self.authkey)
+        except (AuthenticationError, EOFError, OSError):
+            return False
+        finally:
+            timer.cancel()
+        return True
+
+    def _handle(self, conn):
+        with conn:
+            if not self._authenticate(conn):
+                return
+            while True:
+                try:
+                    command, frame = conn.recv()
+                except (EOFError, OSError):
+                    return
+                if command != "enhance":
+                    conn.send(("error", f"Unknown command: {command}"))
+                    continue
+                future = Future()
+                self.requests.put((np.asarray(frame, dtype=np.uint8), future))
+                try:
+                    conn.send(("ok", future.result()))
+                except Exception as e:
+                    conn.send(("error", f"{type(e).__name__}: {e}"))
+
+    def _collect(self):
+        # Block for the first request, then gather whatever else arrives within
+        # max_wait so concurrent callers share one predict call.
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _batch_loop(self):
+        while True:
+            items = self._collect()
+            try:
+                outputs = self.enhancer.enhance_many([frame for frame, _ in items])
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+            for output, (_, future) in zip(outputs, items):
+                future.set_result(output)
+
+
+class InferenceClient:
+    def __init__(self, address=DEFAULT_ADDRESS, key=None):
+        self.conn = Client(address, authkey=key or authkey())
+
+    def enhance(self, frame):
+        """
+        Run one RGB frame through the served model.
+
+        Parameters:
+        - frame (numpy.ndarray): H x W x 3 uint8 RGB frame.
+
+        Returns:
+        - numpy.ndarray: 2H x 2W x 3 uint8 RGB frame.
+        """
+        self.conn.send(("enhance", frame))
+        status, payload = self.conn.recv()
+        if status != "ok":
+            raise RuntimeError(payload)
+        return payload
+
+    def close(self):
+        self.conn.close()
+
+
+def ensure_server(address=DEFAULT_ADDRESS, key=None, timeout=120):
+    """
+    Connect to the inference worker, starting it in the background if it is not running.
+
+    Parameters:
+    - address (tuple): (host, port) of the worker.
+    - key (bytes): Shared authentication key. Defaults to authkey().
+    - timeout (float): Seconds to wait for a freshly started worker to load the model.
+
+    Returns:
+    - InferenceClient: A connected client.
+    """
+    key = key or authkey()
+    try:
+        return InferenceClient(address, key)
+    except ConnectionRefusedError:
+        pass
+
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve",
+                      "--host", address[0], "--port", str(address[1])],
+                     env=dict(os.environ, LUNARZ_CNN_AUTHKEY=key.decode()))
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return InferenceClient(address, key)
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.25)
+
+
+_client = None
+
+
+def enhance_image(image):
+    """
+    Enhance a PIL image with the shared inference worker.
+
+    Parameters:
+    - image (PIL.Image): Input image.
+
+    Returns:
+    - PIL.Image: The enhanced RGB image.
+    """
+    global _client
+    if _client is None:
+        _client = ensure_server()
+    return Image.fromarray(_client.enhance(np.asarray(image.convert("RGB"))))
+
+
+def cnn_enhance(image_path):
+    # Module-level so it can be used as process_function in process_batch, with
+    # every worker process holding its own connection to the one model server.
+    return enhance_image(Image.open(image_path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local CNN inference worker.")
+    parser.add_argument("command", choices=["serve"])
+    parser.add_argument("--host", default=DEFAULT_ADDRESS[0])
+    parser.add_argument("--port", type=int, default=DEFAULT_ADDRESS[1])
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--max-wait", type=float, default=0.01, help="Seconds to wait for a batch to fill.")
+    parser.add_argument("--weights", help="Optional Keras weights file for the model.")
+    parser.add_argument("--tflite", help="Serve an exported .tflite model (see cnn_inference.py export).")
+    parser.add_argument("--tile-size", type=int, default=DEFAULT_TILE_SIZE)
+    parser.add_argument("--overlap", type=int, default=DEFAULT_OVERLAP)
+    args = parser.parse_args()
+
+    server = InferenceServer((args.host, args.port), authkey(), args.max_batch, args.max_wait, args.weights,
+                             args.tflite, args.tile_size, args.overlap)
+    print(f"CNN inference worker listening on {args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
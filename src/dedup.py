@@ -0,0 +1,308 @@
+"""
+Perceptual-hash index for finding near-duplicate images.
+
+Usage:
+    python src/dedup.py update uploads/ --index uploads.dedup.sqlite
+    python src/dedup.py query frame.png --index uploads.dedup.sqlite --max-distance 6
+"""
+import os
+import sqlite3
+from collections import namedtuple
+from itertools import combinations
+import numpy as np
+
+from lazy_import import lazy_module
+from manifest import DEFAULT_EXTENSIONS, iter_image_files
+from storage import is_raw, read_image_array
+
+cv2 = lazy_module("cv2")
+
+Hashes = namedtuple("Hashes", ["phash", "dhash"])
+
+# Hamming distance thresholds (of 64 bits). pHash is the primary key; dHash has to
+# agree as well, which weeds out pHash collisions between unrelated images.
+DEFAULT_MAX_DISTANCE = 6
+DEFAULT_DHASH_DISTANCE = 12
+
+_popcount = getattr(int, "bit_count", None) or (lambda x: bin(x).count("1"))
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    matrix = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def _bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def _read_gray(image_path):
+    if is_raw(image_path):
+        frame = read_image_array(image_path)
+        return frame if frame.ndim == 2 else cv2.cvtColor(np.ascontiguousarray(frame), cv2.COLOR_RGB2GRAY)
+    # The decoder downscales JPEGs while decoding; hashes only need 32 x 32 pixels.
+    gray = cv2.imread(image_path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if gray is None:
+        raise ValueError(f"Error loading image: {image_path}")
+    return gray
+
+
+def compute_hashes(image):
+    """
+    pHash and dHash of an image.
+
+    Parameters:
+    - image (str or numpy.ndarray): Image path, or a uint8 grayscale frame.
+
+    Returns:
+    - Hashes: (phash, dhash) as 64-bit integers.
+    """
+    gray = _read_gray(image) if isinstance(image, str) else image
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = (_DCT_32 @ small @ _DCT_32.T)[:8, :8]
+    # The DC term only encodes mean brightness; leave it out of the median.
+    phash = _bits_to_int(low > np.median(low.ravel()[1:]))
+    tiny = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    dhash = _bits_to_int(tiny[:, 1:] > tiny[:, :-1])
+    return Hashes(phash, dhash)
+
+
+def hamming(a, b):
+    return _popcount(a ^ b)
+
+
+class MultiIndexHash:
+    def __init__(self, chunks=4, bits=64):
+        """
+        Multi-index hashing (Norouzi et al.) over fixed-width hashes under the Hamming distance.
+
+        Each hash is split into `chunks` substrings, each indexed in its own table. Two
+        hashes within distance r agree to within r // chunks bits on at least one
+        substring, so a search probes every substring value that close and verifies the
+        few candidates found, instead of comparing against every stored hash.
+
+        Parameters:
+        - chunks (int): Number of substrings.
+        - bits (int): Hash width.
+        """
+        self.chunks = chunks
+        self.width = bits // chunks
+        self.tables = [{} for _ in range(chunks)]
+        self.size = 0
+
+    def _substrings(self, key):
+        mask = (1 << self.width) - 1
+        return [(key >> (i * self.width)) & mask for i in range(self.chunks)]
+
+    def add(self, key, value):
+        for table, substring in zip(self.tables, self._substrings(key)):
+            table.setdefault(substring, []).append((key, value))
+        self.size += 1
+
+    def _probes(self, substring, radius):
+        yield substring
+        for flips in range(1, radius + 1):
+            for bits in combinations(range(self.width), flips):
+                yield substring ^ sum(1 << bit for bit in bits)
+
+    def search(self, key, max_distance):
+        """
+        Values whose key is within max_distance of key.
+
+        Returns:
+        - list: (distance, value) pairs, nearest first.
+        """
+        radius = max_distance // self.chunks
+        found = {}
+        for table, substring in zip(self.tables, self._substrings(key)):
+            for probe in self._probes(substring, radius):
+                for candidate, value in table.get(probe, ()):
+                    distance = hamming(key, candidate)
+                    if distance <= max_distance:
+                        found[(candidate, value)] = distance
+        return sorted(((distance, value) for (_, value), distance in found.items()), key=lambda item: item[0])
+
+
+def _signed(value):
+    # SQLite integers are signed 64-bit.
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+class DedupIndex:
+    def __init__(self, path, max_distance=DEFAULT_MAX_DISTANCE, dhash_distance=DEFAULT_DHASH_DISTANCE):
+        """
+        Persistent near-duplicate index: image hashes plus the outputs produced from each image.
+
+        Hashes and outputs live in SQLite; the multi-index tables are rebuilt in memory on open and
+        extended as images are added, so lookups never touch the disk. Outputs are
+        recorded per `token` (the pipeline and its parameters), so a duplicate only reuses
+        an output made by the same processing.
+
+        Parameters:
+        - path (str): SQLite database file.
+        - max_distance (int): Largest pHash Hamming distance that counts as a duplicate.
+        - dhash_distance (int): Largest dHash distance that counts as a duplicate.
+        """
+        self.path = path
+        self.max_distance = max_distance
+        self.dhash_distance = dhash_distance
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS images (path TEXT PRIMARY KEY, phash INTEGER NOT NULL, "
+                         "dhash INTEGER NOT NULL, size INTEGER, mtime_ns INTEGER)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS outputs (path TEXT NOT NULL, token TEXT NOT NULL, "
+                         "output_path TEXT NOT NULL, PRIMARY KEY (path, token))")
+        self.lookup = MultiIndexHash()
+        self.images = {}
+        for path, phash, dhash, size, mtime_ns in self._db.execute("SELECT * FROM images"):
+            self.images[path] = (Hashes(_unsigned(phash), _unsigned(dhash)), size, mtime_ns)
+            self.lookup.add(_unsigned(phash), path)
+        self.outputs = {}
+        for path, token, output_path in self._db.execute("SELECT * FROM outputs"):
+            self.outputs[(path, token)] = output_path
+
+    def __len__(self):
+        return len(self.images)
+
+    def add(self, image_path, hashes=None):
+        """
+        Index an image, or refresh it if it changed on disk.
+
+        Parameters:
+        - image_path (str): Image file.
+        - hashes (Hashes): Precomputed hashes, if already known.
+
+        Returns:
+        - Hashes: The image's hashes.
+        """
+        stat = os.stat(image_path)
+        known = self.images.get(image_path)
+        if known is not None and known[1:] == (stat.st_size, stat.st_mtime_ns):
+            return known[0]
+        hashes = hashes or compute_hashes(image_path)
+        if known is None or known[0] != hashes:
+            # A changed image's old lookup entry stays behind; lookups check self.images.
+            self.lookup.add(hashes.phash, image_path)
+            self._db.execute("DELETE FROM outputs WHERE path = ?", (image_path,))
+            for key in [key for key in self.outputs if key[0] == image_path]:
+                del self.outputs[key]
+        self.images[image_path] = (hashes, stat.st_size, stat.st_mtime_ns)
+        self._db.execute("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?)",
+                         (image_path, _signed(hashes.phash), _signed(hashes.dhash), stat.st_size, stat.st_mtime_ns))
+        return hashes
+
+    def update(self, directory, extensions=DEFAULT_EXTENSIONS):
+        """
+        Index every new or changed image under a directory.
+
+        Returns:
+        - int: Number of images (re)hashed.
+        """
+        count = 0
+        for image_path in iter_image_files(directory, extensions):
+            before = self.images.get(image_path)
+            try:
+                if self.add(image_path) is not (before[0] if before else None):
+                    count += 1
+            except (OSError, ValueError):
+                continue
+        self.commit()
+        return count
+
+    def record_output(self, image_path, token, output_path, hashes=None):
+        """
+        Remember the output produced from an image, indexing the image if needed.
+
+        Parameters:
+        - image_path (str): Input image.
+        - token (str): Identifies the processing, e.g. a result_cache.make_key of the pipeline.
+        - output_path (str): The processed file.
+        - hashes (Hashes): The input's hashes, if already known.
+        """
+        self.add(image_path, hashes)
+        self.outputs[(image_path, token)] = output_path
+        self._db.execute("INSERT OR REPLACE INTO outputs VALUES (?, ?, ?)", (image_path, token, output_path))
+
+    def nearest(self, hashes, max_distance=None):
+        """
+        Indexed images that look like the given hashes.
+
+        Returns:
+        - list: (distance, image_path) pairs by pHash distance, nearest first.
+        """
+        max_distance = self.max_distance if max_distance is None else max_distance
+        matches = []
+        seen = set()
+        for distance, image_path in self.lookup.search(hashes.phash, max_distance):
+            known = self.images.get(image_path)
+            # Skip lookup entries left behind by images that have since changed.
+            if image_path in seen or known is None or hamming(known[0].phash, hashes.phash) != distance:
+                continue
+            seen.add(image_path)
+            if hamming(known[0].dhash, hashes.dhash) <= self.dhash_distance:
+                matches.append((distance, image_path))
+        return matches
+
+    def find_output(self, hashes, token, extension=None):
+        """
+        An existing output of a near-duplicate image, for the same processing.
+
+        Parameters:
+        - hashes (Hashes): Hashes of the new image.
+        - token (str): Processing identity, as passed to record_output.
+        - extension (str): Only accept outputs with this file extension.
+
+        Returns:
+        - tuple or None: (image_path, output_path) of the nearest duplicate with an output
+          that still exists.
+        """
+        for _, image_path in self.nearest(hashes):
+            output_path = self.outputs.get((image_path, token))
+            if output_path is None or not os.path.exists(output_path):
+                continue
+            if extension is not None and os.path.splitext(output_path)[1].lower() != extension.lower():
+                continue
+            return image_path, output_path
+        return None
+
+    def commit(self):
+        self._db.commit()
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("command", choices=("update", "query"))
+    parser.add_argument("target", help="Directory to index (update) or image to look up (query).")
+    parser.add_argument("--index", default="dedup.sqlite")
+    parser.add_argument("--max-distance", type=int, default=DEFAULT_MAX_DISTANCE)
+    args = parser.parse_args()
+
+    index = DedupIndex(args.index, args.max_distance)
+    try:
+        if args.command == "update":
+            count = index.update(args.target)
+            print(f"Indexed {count} new or changed images; {len(index)} in total")
+        else:
+            for distance, image_path in index.nearest(compute_hashes(args.target)):
+                print(f"{distance:3d}  {image_path}")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
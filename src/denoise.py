@@ -0,0 +1,289 @@
+import functools
+import inspect
+import math
+import time
+from collections import namedtuple
+import numpy as np
+
+from lazy_import import lazy_module
+
+cv2 = lazy_module("cv2")
+
+# A backend takes a uint8 frame (H x W or H x W x 3), the noise level `sigma` in grey
+# levels and its own tuning parameters, and returns a uint8 frame. `quality` orders
+# backends from best (highest) to worst at moderate noise. Their costs are not fixed
+# here: the planner times every backend once per process (see measured_costs), and
+# benchmarks/bench_denoise.py writes costs measured on full-size frames that can be
+# passed to plan() as `costs`.
+Backend = namedtuple("Backend", ["func", "quality", "radius"])
+
+BACKENDS = {}
+
+DEFAULT_SIGMA = 10.0
+DEFAULT_BUDGET_S = 1.0
+# Below this noise level every backend looks the same, so the cheapest one wins;
+# above HIGH_NOISE_SIGMA the local filters smear texture and are only a last resort.
+LOW_NOISE_SIGMA = 3.0
+HIGH_NOISE_SIGMA = 25.0
+_LOCAL_FILTERS = ("bilateral", "guided")
+# Frame timed by measured_costs. Per-sample costs on a frame this small overstate
+# those of multi-threaded OpenCV on large frames, so plans err towards the budget.
+CALIBRATION_SHAPE = (128, 128, 3)
+
+
+def register_backend(name, quality, radius):
+    def decorator(func):
+        BACKENDS[name] = Backend(func, quality, radius)
+        return func
+    return decorator
+
+
+def _to_uint8(samples, dst=None):
+    # Rounds in place: samples must be a temporary.
+    samples += 0.5
+    np.clip(samples, 0, 255, out=samples)
+    if dst is None or dst.shape != samples.shape:
+        return samples.astype(np.uint8)
+    np.copyto(dst, samples, casting="unsafe")
+    return dst
+
+
+def _soft_threshold(values, threshold):
+    return np.sign(values) * np.maximum(np.abs(values) - threshold, 0)
+
+
+@register_backend("nlm", quality=5,
+                  radius=lambda template_window=7, search_window=21, **_: template_window // 2 + search_window // 2)
+def nlm(frame, sigma, h_color=None, template_window=7, search_window=21, dst=None):
+    if frame.ndim == 2:
+        return cv2.fastNlMeansDenoising(frame, dst, sigma, template_window, search_window)
+    h_color = sigma if h_color is None else h_color
+    return cv2.fastNlMeansDenoisingColored(frame, dst, sigma, h_color, template_window, search_window)
+
+
+@register_backend("nlm_downscaled", quality=4,
+                  radius=lambda factor=2, template_window=7, search_window=21, **_:
+                  factor * (template_window // 2 + search_window // 2 + 1))
+def nlm_downscaled(frame, sigma, factor=2, template_window=7, search_window=21, detail_threshold=1.0, dst=None):
+    # NLM runs on a factor-times smaller frame, where averaging has already cut the
+    # noise by `factor`. The full-resolution detail the downscale removed is added
+    # back after soft thresholding, which drops the noise but keeps strong edges.
+    height, width = frame.shape[:2]
+    small = cv2.resize(frame, (max(width // factor, 1), max(height // factor, 1)), interpolation=cv2.INTER_AREA)
+    denoised_small = nlm(small, sigma / factor, None, template_window, search_window)
+    upsampled = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR).astype(np.float32)
+    base = cv2.resize(denoised_small, (width, height), interpolation=cv2.INTER_LINEAR).astype(np.float32)
+    detail = frame.astype(np.float32) - upsampled
+    return _to_uint8(base + _soft_threshold(detail, detail_threshold * sigma), dst)
+
+
+@register_backend("bilateral", quality=2,
+                  radius=lambda diameter=None, **_: (diameter or 9) // 2)
+def bilateral(frame, sigma, diameter=None, space_sigma=None, dst=None):
+    diameter = diameter or (5 if sigma < 10 else 9)
+    space_sigma = space_sigma or diameter / 2.0
+    return cv2.bilateralFilter(frame, diameter, 2.0 * sigma, space_sigma, dst=dst)
+
+
+@register_backend("guided", quality=1, radius=lambda radius=4, **_: 2 * radius)
+def guided(frame, sigma, radius=4, eps_scale=1.0, dst=None):
+    # Self-guided filter (He et al.): a per-window linear fit of the image to itself,
+    # flattening windows whose variance is at the noise level and keeping edges.
+    ksize = (2 * radius + 1, 2 * radius + 1)
+    samples = frame.astype(np.float32)
+    mean = cv2.boxFilter(samples, -1, ksize)
+    variance = cv2.boxFilter(samples * samples, -1, ksize) - mean * mean
+    a = variance / (variance + (eps_scale * sigma) ** 2 + 1e-6)
+    b = mean - a * mean
+    return _to_uint8(cv2.boxFilter(a, -1, ksize) * samples + cv2.boxFilter(b, -1, ksize), dst)
+
+
+def _haar_forward(x):
+    s = np.float32(1 / math.sqrt(2))
+    lo, hi = (x[0::2] + x[1::2]) * s, (x[0::2] - x[1::2]) * s
+    return ((lo[:, 0::2] + lo[:, 1::2]) * s,
+            ((lo[:, 0::2] - lo[:, 1::2]) * s, (hi[:, 0::2] + hi[:, 1::2]) * s, (hi[:, 0::2] - hi[:, 1::2]) * s))
+
+
+def _haar_inverse(ll, details):
+    s = np.float32(1 / math.sqrt(2))
+    lh, hl, hh = details
+    lo = np.empty((ll.shape[0], ll.shape[1] * 2) + ll.shape[2:], np.float32)
+    hi = np.empty_like(lo)
+    lo[:, 0::2], lo[:, 1::2] = (ll + lh) * s, (ll - lh) * s
+    hi[:, 0::2], hi[:, 1::2] = (hl + hh) * s, (hl - hh) * s
+    x = np.empty((lo.shape[0] * 2,) + lo.shape[1:], np.float32)
+    x[0::2], x[1::2] = (lo + hi) * s, (lo - hi) * s
+    return x
+
+
+def _bayes_shrink(band, sigma):
+    # BayesShrink: threshold sigma^2 / sigma_signal per subband and channel.
+    signal_var = np.maximum((band * band).mean(axis=(0, 1), keepdims=True) - sigma * sigma, 1e-6)
+    return _soft_threshold(band, sigma * sigma / np.sqrt(signal_var))
+
+
+def _wavelet_once(samples, sigma, levels):
+    ll, stack = samples, []
+    for _ in range(levels):
+        ll, details = _haar_forward(ll)
+        stack.append(tuple(_bayes_shrink(band, sigma) for band in details))
+    for details in reversed(stack):
+        ll = _haar_inverse(ll, details)
+    return ll
+
+
+@register_backend("wavelet", quality=3, radius=lambda levels=3, **_: 2 ** (levels + 1))
+def wavelet(frame, sigma, levels=3, shifts=2, dst=None):
+    # Orthonormal Haar transform, so the noise has the same sigma in every subband.
+    # Averaging over `shifts` diagonal offsets (cycle spinning) hides the Haar block edges.
+    height, width = frame.shape[:2]
+    block = 2 ** levels
+    pad = ((0, -height % block), (0, -width % block)) + ((0, 0),) * (frame.ndim - 2)
+    samples = np.pad(frame.astype(np.float32), pad, mode="reflect")
+    result = np.zeros_like(samples)
+    for shift in range(shifts):
+        shifted = np.roll(samples, (shift, shift), axis=(0, 1))
+        result += np.roll(_wavelet_once(shifted, sigma, levels), (-shift, -shift), axis=(0, 1))
+    return _to_uint8(result[:height, :width] / shifts, dst)
+
+
+def estimate_noise(frame, color_order="RGB"):
+    """
+    Estimate the noise standard deviation of a frame.
+
+    Parameters:
+    - frame (numpy.ndarray): uint8 grayscale or 3-channel frame.
+    - color_order (str): 'RGB' or 'BGR' channel order of 3-channel input.
+
+    Returns:
+    - float: Noise sigma in grey levels (Immerkaer estimate, see analysis.analyze_array).
+    """
+    from analysis import analyze_array
+    return analyze_array(frame, color_order=color_order)["noise_sigma"]
+
+
+@functools.lru_cache(maxsize=1)
+def measured_costs():
+    """
+    Time every backend on this machine, once per process.
+
+    Each backend is timed on a noisy CALIBRATION_SHAPE frame after a run on a small
+    corner of it, so one-off initialization is not counted. The first call takes
+    about 150 ms.
+
+    Returns:
+    - dict: Backend name -> ns per pixel and channel.
+    """
+    rng = np.random.default_rng(0)
+    ramp = np.linspace(0, 255, CALIBRATION_SHAPE[1], dtype=np.float32)[None, :, None]
+    frame = np.clip(ramp + DEFAULT_SIGMA * rng.standard_normal(CALIBRATION_SHAPE, dtype=np.float32), 0, 255)
+    frame = frame.astype(np.uint8)
+    costs = {}
+    for name, backend in BACKENDS.items():
+        backend.func(frame[:32, :32], DEFAULT_SIGMA)
+        start = time.perf_counter()
+        backend.func(frame, DEFAULT_SIGMA)
+        costs[name] = (time.perf_counter() - start) / frame.size * 1e9
+    return costs
+
+
+def estimate_seconds(backend, shape, costs=None):
+    """
+    Predicted run time of a backend on a frame of the given shape.
+
+    Parameters:
+    - backend (str): Backend name.
+    - shape (tuple): Frame shape.
+    - costs (dict): Optional backend name -> ns per pixel and channel, e.g. measured by
+      benchmarks/bench_denoise.py; backends it does not list use measured_costs().
+
+    Returns:
+    - float: Seconds.
+    """
+    if costs is None or backend not in costs:
+        costs = measured_costs()
+    return costs[backend] * math.prod(shape) * 1e-9
+
+
+def plan(shape, sigma, budget_s=DEFAULT_BUDGET_S, costs=None):
+    """
+    Pick a backend for a frame size, noise level and latency budget.
+
+    Parameters:
+    - shape (tuple): Frame shape.
+    - sigma (float): Estimated noise sigma in grey levels.
+    - budget_s (float): Time the denoise may take, in seconds. None means no limit.
+    - costs (dict): Optional costs measured beforehand, see estimate_seconds. Without
+      them the first plan times the backends on this machine (measured_costs).
+
+    Returns:
+    - str: Backend name. The best backend that fits the budget; the cheapest one when
+      nothing fits or when the noise is too low for the choice to matter.
+    """
+    by_cost = sorted(BACKENDS, key=lambda name: estimate_seconds(name, shape, costs))
+    if sigma < LOW_NOISE_SIGMA:
+        return by_cost[0]
+    candidates = sorted(BACKENDS, key=lambda name: -BACKENDS[name].quality)
+    if sigma > HIGH_NOISE_SIGMA:
+        candidates = [name for name in candidates if name not in _LOCAL_FILTERS] + list(_LOCAL_FILTERS)
+    for name in candidates:
+        if budget_s is None or estimate_seconds(name, shape, costs) <= budget_s:
+            return name
+    return by_cost[0]
+
+
+def denoise(frame, backend="auto", sigma=None, budget_s=DEFAULT_BUDGET_S, color_order="RGB", costs=None,
+            **params):
+    """
+    Denoise a frame with the given or an automatically planned backend.
+
+    Parameters:
+    - frame (numpy.ndarray): uint8 grayscale or 3-channel frame.
+    - backend (str): 'auto' or one of BACKENDS ('nlm', 'nlm_downscaled', 'wavelet', 'bilateral', 'guided').
+    - sigma (float): Noise level / filter strength in grey levels. Estimated from the frame
+      when backend is 'auto', otherwise DEFAULT_SIGMA.
+    - budget_s (float): Latency budget for the planner, in seconds.
+    - color_order (str): 'RGB' or 'BGR' channel order, used by the noise estimate.
+    - costs (dict): Optional measured costs for the planner, see estimate_seconds.
+    - **params: Backend-specific parameters, e.g. template_window and search_window for 'nlm',
+      and `dst`, an optional output buffer. With backend 'auto', parameters the planned
+      backend does not take are ignored.
+
+    Returns:
+    - numpy.ndarray: Denoised uint8 frame.
+    """
+    if sigma is None:
+        sigma = estimate_noise(frame, color_order) if backend == "auto" else DEFAULT_SIGMA
+    planned = backend == "auto"
+    if planned:
+        backend = plan(frame.shape, sigma, budget_s, costs)
+    try:
+        func = BACKENDS[backend].func
+    except KeyError:
+        raise ValueError(f"Unsupported denoise backend: {backend}. Choose 'auto' or one of {sorted(BACKENDS)}.")
+    if planned:
+        # Parameters are written for one backend (e.g. NLM windows) but the plan may pick another.
+        accepted = inspect.signature(func).parameters
+        params = {name: value for name, value in params.items() if name in accepted}
+    return func(frame, sigma, **params)
+
+
+def denoise_radius(backend="auto", **params):
+    """
+    Kernel radius of a backend, for tiled processing.
+
+    Tiles match a full-frame run only approximately for 'wavelet' (block alignment) and
+    'auto' (the noise estimate and the plan are made per tile); pin backend and sigma
+    for seamless tiling.
+
+    Parameters:
+    - backend (str): Backend name or 'auto' (the largest radius of any backend).
+    - **params: Backend parameters.
+
+    Returns:
+    - int: Radius in pixels.
+    """
+    if backend == "auto":
+        return max(b.radius() for b in BACKENDS.values())
+    return BACKENDS[backend].radius(**params)
@@ -1,13 +1,20 @@
-import cv2
 from PIL import Image
 import numpy as np
 
+from lazy_import import lazy_module
+from storage import is_raw, open_array
+from tiling import iter_tiles, process_tiled
+
+cv2 = lazy_module("cv2")
+
+EDGE_METHODS = ("Canny", "Sobel", "Laplacian")
+
 def apply_edge_detection(image_path, method="Canny", lower_thresh=100, upper_thresh=200, apply_blur=False, kernel_size=3):
     """
     Apply edge detection to an image with optional methods (Canny, Sobel, Laplacian).
 
     Parameters:
-    - image_path (str): Path to the image file.
+    - image_path (str): Path to the image file, or a raw .npy array (RGB or grayscale) that is memory-mapped.
     - method (str): The edge detection method ('Canny', 'Sobel', 'Laplacian').
     - lower_thresh (int): Lower threshold for edge detection (used in Canny).
     - upper_thresh (int): Upper threshold for edge detection (used in Canny).
@@ -18,28 +25,203 @@ def apply_edge_detection(image_path, method="Canny", lower_thresh=100, upper_thr
     - PIL.Image: The edge-detected image in PIL format.
     """
 
-    image = cv2.imread(image_path)
+    image = _read_image(image_path)
+    edges = detect_edges(image, method, lower_thresh, upper_thresh, apply_blur, kernel_size)
+
+    return Image.fromarray(edges)
+
+def apply_edge_detection_multi(image_path, methods=EDGE_METHODS, lower_thresh=100, upper_thresh=200, apply_blur=False, kernel_size=3):
+    """
+    Compute several edge maps from a single decode, grayscale conversion and blur pass.
+
+    Parameters:
+    - image_path (str): Path to the image file or raw .npy array.
+    - methods (iterable): Any of 'Canny', 'Sobel', 'Laplacian'. Defaults to all three.
+    - Remaining parameters as in apply_edge_detection.
+
+    Returns:
+    - dict: Method name -> PIL.Image edge map.
+    """
+
+    image = _read_image(image_path)
+    edges = detect_edges_multi(image, methods, lower_thresh, upper_thresh, apply_blur, kernel_size)
+
+    return {method: Image.fromarray(edge_map) for method, edge_map in edges.items()}
+
+def _read_image(image_path):
+    if is_raw(image_path):
+        image = open_array(image_path)
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    else:
+        image = cv2.imread(image_path)
     if image is None:
         raise ValueError("Error loading image")
-    
-    gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+def detect_edges(image, method="Canny", lower_thresh=100, upper_thresh=200, apply_blur=False, kernel_size=3):
+    """
+    Edge detection on an already decoded array. Same parameters as apply_edge_detection.
+
+    Parameters:
+    - image (numpy.ndarray): BGR or grayscale uint8 image.
+
+    Returns:
+    - numpy.ndarray: uint8 edge map.
+    """
+
+    return detect_edges_multi(image, (method,), lower_thresh, upper_thresh, apply_blur, kernel_size)[method]
+
+def _reflect_border(gray_image, sobelx, sobely):
+    # Only the outermost pixels of a 3x3 response depend on the border mode; redo them
+    # with OpenCV's default BORDER_REFLECT_101 so the shared Sobel map matches a
+    # standalone one. A two-pixel strip has the same reflected neighbours as the image.
+    if min(gray_image.shape[:2]) < 2:
+        return cv2.Sobel(gray_image, cv2.CV_32F, 1, 0, ksize=3), cv2.Sobel(gray_image, cv2.CV_32F, 0, 1, ksize=3)
+    for source, border in ((np.s_[:2], np.s_[0]), (np.s_[-2:], np.s_[-1]),
+                           (np.s_[:, :2], np.s_[:, 0]), (np.s_[:, -2:], np.s_[:, -1])):
+        strip = np.ascontiguousarray(gray_image[source])
+        sobelx[border] = cv2.Sobel(strip, cv2.CV_32F, 1, 0, ksize=3)[border]
+        sobely[border] = cv2.Sobel(strip, cv2.CV_32F, 0, 1, ksize=3)[border]
+    return sobelx, sobely
+
+def detect_edges_multi(image, methods=EDGE_METHODS, lower_thresh=100, upper_thresh=200, apply_blur=False, kernel_size=3):
+    """
+    Compute several edge maps on an already decoded array, sharing the intermediate work.
+
+    The grayscale conversion and blur run once. With kernel_size 3 the Sobel gradients
+    are computed once as int16 and feed both Canny and the Sobel magnitude. Sobel and
+    Laplacian responses are float32 and saturated to 0..255 rather than wrapped.
+
+    Parameters:
+    - image (numpy.ndarray): BGR or grayscale uint8 image.
+    - methods (iterable): Any of 'Canny', 'Sobel', 'Laplacian'.
+    - Remaining parameters as in apply_edge_detection.
+
+    Returns:
+    - dict: Method name -> uint8 edge map.
+    """
+
+    methods = list(methods)
+    for method in methods:
+        if method not in EDGE_METHODS:
+            raise ValueError(f"Unsupported method: {method}. Choose 'Canny', 'Sobel', or 'Laplacian'.")
+
+    gray_image = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     
     if apply_blur:
         gray_image = cv2.GaussianBlur(gray_image, (kernel_size, kernel_size), 0)
     
-    
+    edges = {}
+    sobelx = sobely = None
+    if "Canny" in methods:
+        if kernel_size == 3 and "Sobel" in methods:
+            # Canny's own gradient is a 3x3 Sobel with replicated borders; computing it
+            # here lets the Sobel map reuse it. int16 holds 3x3 responses exactly.
+            dx = cv2.Sobel(gray_image, cv2.CV_16S, 1, 0, ksize=3, borderType=cv2.BORDER_REPLICATE)
+            dy = cv2.Sobel(gray_image, cv2.CV_16S, 0, 1, ksize=3, borderType=cv2.BORDER_REPLICATE)
+            edges["Canny"] = cv2.Canny(dx, dy, lower_thresh, upper_thresh)
+            sobelx, sobely = _reflect_border(gray_image, dx.astype(np.float32), dy.astype(np.float32))
+        else:
+            edges["Canny"] = cv2.Canny(gray_image, lower_thresh, upper_thresh)
+    if "Sobel" in methods:
+        if sobelx is None:
+            sobelx = cv2.Sobel(gray_image, cv2.CV_32F, 1, 0, ksize=kernel_size)
+            sobely = cv2.Sobel(gray_image, cv2.CV_32F, 0, 1, ksize=kernel_size)
+        edges["Sobel"] = cv2.convertScaleAbs(cv2.magnitude(sobelx, sobely))
+    if "Laplacian" in methods:
+        edges["Laplacian"] = cv2.convertScaleAbs(cv2.Laplacian(gray_image, cv2.CV_32F, ksize=kernel_size))
+
+    return edges
+
+def edge_halo(method="Canny", apply_blur=False, kernel_size=3):
+    """
+    Tile overlap needed so tiled edge detection matches a full-frame run.
+
+    Canny has no finite halo: hysteresis follows a chain of weak edge pixels from a
+    strong one across any distance. apply_edge_detection_tiled handles it in two passes;
+    inside a pipeline it cannot be tiled.
+
+    Parameters:
+    - method (str): The edge detection method ('Canny', 'Sobel', 'Laplacian').
+    - apply_blur (bool): Whether the Gaussian pre-blur is applied.
+    - kernel_size (int): Kernel size for Gaussian blur or Sobel operator.
+
+    Returns:
+    - int or None: Halo in pixels, or None for Canny.
+    """
+
     if method == "Canny":
-        edges = cv2.Canny(gray_image, lower_thresh, upper_thresh)
-    elif method == "Sobel":
-        sobelx = cv2.Sobel(gray_image, cv2.CV_64F, 1, 0, ksize=kernel_size) 
-        sobely = cv2.Sobel(gray_image, cv2.CV_64F, 0, 1, ksize=kernel_size) 
-        edges = cv2.magnitude(sobelx, sobely)
-        edges = np.uint8(edges)
-    elif method == "Laplacian":
-        edges = cv2.Laplacian(gray_image, cv2.CV_64F, ksize=kernel_size)
-        edges = np.uint8(np.absolute(edges))
-    else:
-        raise ValueError(f"Unsupported method: {method}. Choose 'Canny', 'Sobel', or 'Laplacian'.")
+        return None
+    halo = kernel_size // 2 if apply_blur else 0
+    return halo + max(kernel_size // 2, 1)
 
-    return Image.fromarray(edges)
+def _canny_classes(gray_image, lower_thresh, upper_thresh):
+    # cv2.Canny with equal thresholds skips hysteresis: Canny(t, t) is every non-maximum-
+    # suppressed pixel above t. Returns 0 (no edge), 1 (weak) or 2 (strong) per pixel.
+    low, high = sorted((lower_thresh, upper_thresh))
+    weak = cv2.Canny(gray_image, low, low)
+    strong = cv2.Canny(gray_image, high, high)
+    return (weak >> 7) + (strong >> 7)
+
+def _hysteresis_tiled(classes, tile_size):
+    # Promotes weak pixels 8-connected to strong ones within each tile plus a one-pixel
+    # border, which covers every link between neighbouring tiles. A chain can cross tile
+    # borders any number of times, so sweeps repeat until nothing changes.
+    height, width = classes.shape
+    changed = True
+    while changed:
+        changed = False
+        for y0, y1, x0, x1 in iter_tiles(height, width, tile_size):
+            window = classes[max(y0 - 1, 0):y1 + 1, max(x0 - 1, 0):x1 + 1]
+            weak, strong = window == 1, window == 2
+            if not weak.any() or not strong.any():
+                continue
+            count, labels = cv2.connectedComponents((window > 0).view(np.uint8), connectivity=8)
+            linked = np.zeros(count, dtype=bool)
+            linked[labels[strong]] = True
+            promote = weak & linked[labels]
+            if promote.any():
+                window[promote] = 2
+                changed = True
+
+def apply_edge_detection_tiled(image, method="Canny", lower_thresh=100, upper_thresh=200, apply_blur=False, kernel_size=3, tile_size=1024, out=None):
+    """
+    Tiled edge detection for images too large to process in one piece.
+
+    The result equals a full-frame run for every method. Canny takes two passes: the
+    local steps tile by tile into `out`, then hysteresis sweeps over `out` until edge
+    chains crossing tile borders are complete.
+
+    Parameters:
+    - image (numpy.ndarray): BGR or grayscale uint8 image, typically a np.memmap.
+    - tile_size (int): Tile edge length in pixels; sets the peak memory use.
+    - out (numpy.ndarray): Optional H x W uint8 output array, e.g. a writable memmap.
+    - Remaining parameters as in apply_edge_detection.
+
+    Returns:
+    - numpy.ndarray: uint8 edge map.
+    """
+
+    def detect(window):
+        return detect_edges(window, method, lower_thresh, upper_thresh, apply_blur, kernel_size)
+
+    if method != "Canny":
+        return process_tiled(image, detect, edge_halo(method, apply_blur, kernel_size), tile_size=tile_size, out=out)
+
+    # Canny: gradients, non-maximum suppression and thresholds are local (3x3 gradient,
+    # 3x3 suppression), so they run per tile into a weak/strong map; hysteresis is then
+    # run over that map, and it is turned into the 0/255 edge map in place.
+    def classify(window):
+        gray_image = window if window.ndim == 2 else cv2.cvtColor(window, cv2.COLOR_BGR2GRAY)
+        if apply_blur:
+            gray_image = cv2.GaussianBlur(gray_image, (kernel_size, kernel_size), 0)
+        return _canny_classes(gray_image, lower_thresh, upper_thresh)
 
+    halo = (kernel_size // 2 if apply_blur else 0) + 2
+    out = process_tiled(image, classify, halo, tile_size=tile_size, out=out)
+    _hysteresis_tiled(out, tile_size)
+    for y0, y1, x0, x1 in iter_tiles(*out.shape[:2], tile_size):
+        tile = out[y0:y1, x0:x1]
+        np.multiply(tile == 2, 255, out=tile, casting="unsafe")
+    return out
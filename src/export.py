@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+
+from storage import is_raw, save_array
+
+# Encoder settings per preset and PIL format. PIL's defaults (PNG level 6, JPEG
+# quality 75) are neither the fastest nor the smallest: PNG level 1 encodes several
+# times faster than 6 for roughly a tenth more bytes on photographic frames, while
+# level 9 and JPEG `optimize` buy a few percent of size for a lot of time.
+# benchmarks/bench_encode.py measures the trade-off on the current machine.
+# They are opt-in: without a preset, images are saved with PIL's defaults.
+PRESETS = {
+    "fast": {
+        "PNG": {"compress_level": 1},
+        "JPEG": {"quality": 90, "optimize": False},
+        "WEBP": {"quality": 85, "method": 0},
+        "TIFF": {"compression": "raw"},
+    },
+    "balanced": {
+        "PNG": {"compress_level": 3},
+        "JPEG": {"quality": 92, "optimize": False},
+        "WEBP": {"quality": 90, "method": 4},
+        "TIFF": {"compression": "tiff_lzw"},
+    },
+    "small": {
+        "PNG": {"compress_level": 9},
+        "JPEG": {"quality": 85, "optimize": True, "progressive": True},
+        "WEBP": {"quality": 80, "method": 6},
+        "TIFF": {"compression": "tiff_adobe_deflate"},
+    },
+}
+DEFAULT_PRESET = None
+
+# Modes each format can store; anything else is converted before encoding.
+_MODES = {"JPEG": ("L", "RGB", "CMYK"), "WEBP": ("L", "RGB", "RGBA"), "BMP": ("1", "L", "P", "RGB")}
+
+
+def format_for(path):
+    """
+    PIL format name for a file path, e.g. 'PNG' for 'out.png'.
+
+    Raises:
+    - ValueError: If PIL has no writer for the extension.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    image_format = Image.registered_extensions().get(extension)
+    if image_format is None:
+        raise ValueError(f"Unsupported output format: {extension or path}")
+    return image_format
+
+
+def encode_options(path, preset=DEFAULT_PRESET, **overrides):
+    """
+    Encoder keyword arguments for saving to a path.
+
+    Parameters:
+    - path (str): Destination path; its extension selects the format.
+    - preset (str or dict): A PRESETS name, a dict of format name or extension (any
+      case) -> options, or None for PIL's defaults.
+    - **overrides: Options that win over the preset, e.g. compress_level=6.
+
+    Returns:
+    - tuple: (format, options) for PIL.Image.save.
+    """
+    image_format = format_for(path)
+    if preset is None:
+        options = {}
+    elif isinstance(preset, str):
+        try:
+            options = dict(PRESETS[preset].get(image_format, {}))
+        except KeyError:
+            raise ValueError(f"Unknown export preset: {preset}. Choose one of {sorted(PRESETS)}.")
+    else:
+        # Keys may be written like extensions: {"png": ...} and {"jpg": ...} mean PNG and JPEG.
+        preset = {Image.registered_extensions().get("." + name.lower(), name.upper()): value
+                  for name, value in preset.items()}
+        options = dict(preset.get(image_format, {}))
+    options.update(overrides)
+    return image_format, options
+
+
+def save_image(image, path, preset=DEFAULT_PRESET, **options):
+    """
+    Encode and write an image with per-format settings.
+
+    The file is written under a temporary name and renamed, like storage.save_array, so
+    readers (a watch loop, the HTTP service) never see a partial file. '.npy' paths are
+    written raw.
+
+    Parameters:
+    - image (PIL.Image or numpy.ndarray): Image to write; arrays are RGB or grayscale.
+    - path (str): Destination path; its extension selects the format.
+    - preset (str or dict): Encoder preset, see encode_options.
+    - **options: Encoder options overriding the preset.
+
+    Returns:
+    - str: The destination path.
+    """
+    if is_raw(path):
+        return save_array(path, image)
+    image_format, options = encode_options(path, preset, **options)
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    modes = _MODES.get(image_format)
+    if modes is not None and image.mode not in modes:
+        image = image.convert("L" if image.mode in ("1", "LA", "I", "I;16", "F") and "L" in modes else "RGB")
+    tmp_path = path + ".tmp"
+    try:
+        image.save(tmp_path, image_format, **options)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+def poll_future(widget, future, on_done, interval_ms=50):
+    """
+    Call on_done(future) from the Tk loop once a future is done, e.g. an Exporter write.
+
+    A done-callback would run on the encoder thread, where Tk must not be used, so the
+    future is polled with widget.after instead.
+
+    Parameters:
+    - widget (tkinter.Misc): Any widget of the running application.
+    - future (concurrent.futures.Future): Future to wait for.
+    - on_done (function): Called with the future on the Tk thread.
+    - interval_ms (int): Polling interval in milliseconds.
+    """
+    if future.done():
+        on_done(future)
+    else:
+        widget.after(interval_ms, poll_future, widget, future, on_done, interval_ms)
+
+
+def _timed_save(image, path, preset, options):
+    start = time.perf_counter()
+    save_image(image, path, preset, **options)
+    return time.perf_counter() - start, os.path.getsize(path)
+
+
+class Exporter:
+    def __init__(self, threads=None, max_pending=None, preset=DEFAULT_PRESET):
+        """
+        Encodes and writes images on a thread pool so the caller can go on computing.
+
+        PIL's zlib, libjpeg and libwebp encoders release the GIL, so encodes overlap
+        with NumPy/OpenCV work and with each other. Submitting blocks while
+        `max_pending` encodes are outstanding, which bounds the frames held in memory.
+
+        Parameters:
+        - threads (int): Encoder threads. Defaults to min(4, os.cpu_count()).
+        - max_pending (int): Encodes queued or running before submit blocks. Defaults to 2 * threads.
+        - preset (str or dict): Default encoder preset, see encode_options; None for PIL's defaults.
+        """
+        threads = threads or min(4, os.cpu_count() or 1)
+        self.preset = preset
+        self._executor = ThreadPoolExecutor(threads, thread_name_prefix="export")
+        self._slots = threading.BoundedSemaphore(max_pending or 2 * threads)
+
+    def submit(self, image, path, preset=None, **options):
+        """
+        Queue an image for writing. The image must not be modified until the write is done.
+
+        Parameters:
+        - image (PIL.Image or numpy.ndarray): Image to write.
+        - path (str): Destination path.
+        - preset (str or dict): Overrides the exporter's preset.
+        - **options: Encoder options overriding the preset.
+
+        Returns:
+        - concurrent.futures.Future: Resolves to (seconds, file_bytes) or raises the encode error.
+        """
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(_timed_save, image, path, preset or self.preset, options)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def close(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -1,9 +1,31 @@
+import functools
 import tkinter as tk
 from tkinter import filedialog, messagebox, simpledialog
-from PIL import Image, ImageTk, ImageEnhance, ImageFilter
+from PIL import Image, ImageTk, ImageEnhance, ImageFilter, ImageStat
 import threading
 import subprocess 
 
+from cnn_service import enhance_image
+from export import Exporter, poll_future, save_image
+from history import History
+from lut import get_lut
+from pipeline import Pipeline
+from scheduler import Scheduler
+
+
+_IDENTITY = list(range(256))
+
+
+def apply_point_lut(image, table):
+    # PIL wants one table per band; the table itself comes from the shared LRU cache.
+    # Like ImageEnhance, only the colour bands change: palette images are expanded
+    # first and alpha gets the identity table.
+    if image.mode == "P":
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+    table = table.tolist()
+    return image.point([value for band in image.getbands() for value in (_IDENTITY if band == "A" else table)])
+
+
 class ImageProcessor:
     def __init__(self):
         self.original_image = None
@@ -14,44 +36,62 @@ class ImageProcessor:
         self.output_image = self.original_image.copy()
         return self.output_image
 
-    def denoise(self):
-        if self.original_image:
-            return self.original_image.filter(ImageFilter.MedianFilter(size=3))
+    # Each operation works on the original image by default; passing `image`
+    # runs it on something else, e.g. a downscaled preview.
+    def denoise(self, image=None):
+        image = image or self.original_image
+        if image:
+            return image.filter(ImageFilter.MedianFilter(size=3))
         return None
 
-    def histogram_equalization(self):
-        if self.original_image:
-            return self.original_image.convert("L").point(lambda p: p * 1.5)
+    def histogram_equalization(self, image=None):
+        image = image or self.original_image
+        if image:
+            return image.convert("L").point(lambda p: p * 1.5)
         return None
 
-    def gamma_correction(self, gamma):
-        if self.original_image:
-            lut = [pow(x / 255., gamma) * 255 for x in range(256)]
-            return self.original_image.point(lut)
+    def gamma_correction(self, gamma, image=None):
+        image = image or self.original_image
+        if image:
+            return apply_point_lut(image, get_lut("gamma", gamma=gamma))
         return None
 
-    def unsharp_mask(self):
-        if self.original_image:
-            return self.original_image.filter(ImageFilter.UnsharpMask(radius=2, percent=150, threshold=3))
+    def unsharp_mask(self, image=None):
+        image = image or self.original_image
+        if image:
+            return image.filter(ImageFilter.UnsharpMask(radius=2, percent=150, threshold=3))
         return None
 
-    def edge_detection(self):
-        if self.original_image:
-            return self.original_image.filter(ImageFilter.FIND_EDGES)
+    def edge_detection(self, image=None):
+        image = image or self.original_image
+        if image:
+            return image.filter(ImageFilter.FIND_EDGES)
+        return None
+
+    def apply_pipeline(self, steps, image=None):
+        image = image or self.original_image
+        if image:
+            return Image.fromarray(Pipeline(steps).run(image))
         return None
 
     def save_output_image(self, file_path):
         if self.output_image:
-            self.output_image.save(file_path)
+            save_image(self.output_image, file_path)
 
 
 class ImageApp:
     def __init__(self, root):
         self.root = root
         self.processor = ImageProcessor()
+        self.scheduler = Scheduler(root)
+        self.exporter = Exporter(threads=1)
 
-        self.undo_stack = []
-        self.redo_stack = []
+        self.output_image = None
+        # Set while an undo/redo is being replayed: a function returning the state that
+        # output_image is about to become.
+        self.pending_state = None
+        self.history = None
+        self.history_budget = 512 * 1024 * 1024
 
         self.bg_color = "#f8f9fa"
         self.primary_color = "#007bff"
@@ -184,108 +224,176 @@ class ImageApp:
         self.cnn_button = tk.Button(self.filter_frame, text="Run CNN Enhancer", command=self.run_cnn_enhancer, **button_style)
         self.cnn_button.pack(side=tk.TOP, pady=20) 
 
-    def run_cnn_enhancer(self):
-        subprocess.Popen(["python", "cnn.py"])
-
         self.status_label = tk.Label(self.main_frame, text="Select an image to start", bg=self.bg_color, fg=self.text_color, font=self.label_font)
         self.status_label.grid(row=1, column=0, columnspan=3, pady=20)
 
+    def run_cnn_enhancer(self):
+        # Submits the current image to the shared inference worker (started on
+        # first use) instead of launching a fresh TensorFlow process per click.
+        # Too slow to replay on undo, so the result is always kept as a keyframe.
+        self.apply_operation(enhance_image, keyframe=True, preview=False)
+
     # Image Enhancement Methods:
     def select_image(self):
         file_path = filedialog.askopenfilename(filetypes=[("Image files", "*.jpg *.jpeg *.png *.bmp *.tiff *.gif")])
         if file_path:
-            self.undo_stack.clear()
-            self.redo_stack.clear()
+            self.scheduler.cancel()
+            self.pending_state = None
             self.output_image = self.processor.select_image(file_path)
-            self.undo_stack.append(self.output_image.copy())
+            self.history = History(self.output_image, budget_bytes=self.history_budget)
             self.show_image(self.output_image, self.input_canvas)
             self.show_image(self.output_image, self.output_canvas)
 
+    # The processor operations start from the original image; the adjustments
+    # below chain on the current output.
     def denoise_image(self):
-        denoised_image = self.processor.denoise()
-        if denoised_image:
-            self.update_image(denoised_image)
+        self.apply_operation(self.processor.denoise, from_original=True)
 
     def histogram_equalization(self):
-        enhanced_image = self.processor.histogram_equalization()
-        if enhanced_image:
-            self.update_image(enhanced_image)
+        self.apply_operation(self.processor.histogram_equalization, from_original=True)
 
     def gamma_correction(self):
         gamma = simpledialog.askfloat("Gamma Correction", "Enter Gamma Value (0.1-100):", minvalue=0.1, maxvalue=5.0)
         if gamma:
-            gamma_corrected_image = self.processor.gamma_correction(gamma)
-            if gamma_corrected_image:
-                self.update_image(gamma_corrected_image)
+            self.apply_operation(lambda image: self.processor.gamma_correction(gamma, image), from_original=True)
 
     def unsharp_mask(self):
-        sharpened_image = self.processor.unsharp_mask()
-        if sharpened_image:
-            self.update_image(sharpened_image)
+        self.apply_operation(self.processor.unsharp_mask, from_original=True)
 
     def edge_detection(self):
-        edges_image = self.processor.edge_detection()
-        if edges_image:
-            self.update_image(edges_image)
+        self.apply_operation(self.processor.edge_detection, from_original=True)
 
     # Adjustment Filters:
     def adjust_brightness(self):
         brightness_value = simpledialog.askfloat("Brightness Adjustment", "Enter Brightness Factor (0.1-10):", minvalue=0.1, maxvalue=2.0)
         if brightness_value:
-            enhancer = ImageEnhance.Brightness(self.output_image)
-            enhanced_image = enhancer.enhance(brightness_value)
-            self.update_image(enhanced_image)
+            self.apply_operation(lambda image: apply_point_lut(image, get_lut("brightness", factor=brightness_value)))
 
     def adjust_contrast(self):
         contrast_value = simpledialog.askfloat("Contrast Adjustment", "Enter Contrast Factor (0.1-10):", minvalue=0.1, maxvalue=2.0)
         if contrast_value:
-            enhancer = ImageEnhance.Contrast(self.output_image)
-            enhanced_image = enhancer.enhance(contrast_value)
-            self.update_image(enhanced_image)
+            def contrast(image):
+                mean = int(ImageStat.Stat(image.convert("L")).mean[0] + 0.5)
+                return apply_point_lut(image, get_lut("contrast", factor=contrast_value, mean=mean))
+            self.apply_operation(contrast)
 
     def adjust_sharpness(self):
         sharpness_value = simpledialog.askfloat("Sharpness Adjustment", "Enter Sharpness Factor (0.1-10):", minvalue=0.1, maxvalue=2.0)
         if sharpness_value:
-            enhancer = ImageEnhance.Sharpness(self.output_image)
-            enhanced_image = enhancer.enhance(sharpness_value)
-            self.update_image(enhanced_image)
+            self.apply_operation(lambda image: ImageEnhance.Sharpness(image).enhance(sharpness_value))
 
     def adjust_saturation(self):
         saturation_value = simpledialog.askfloat("Saturation Adjustment", "Enter Saturation Factor (0.1-10):", minvalue=0.1, maxvalue=2.0)
         if saturation_value:
-            enhancer = ImageEnhance.Color(self.output_image)
-            enhanced_image = enhancer.enhance(saturation_value)
-            self.update_image(enhanced_image)
+            self.apply_operation(lambda image: ImageEnhance.Color(image).enhance(saturation_value))
 
     # Helper Methods :
-    def update_image(self, new_image):
+    def apply_operation(self, func, from_original=False, keyframe=False, preview=True):
+        # Runs `func` off the Tk thread: first on a canvas-sized copy so the user sees
+        # the effect at once, then at full resolution. A newer click cancels this one.
+        if not self.output_image:
+            return
+        if from_original:
+            original = self.processor.original_image
+            source = lambda: original
+            op = lambda image: func(self.processor.original_image)
+        elif self.pending_state is not None:
+            # An undo/redo is still replaying; start from the state it is producing.
+            source = self.pending_state
+            op = func
+        else:
+            image = self.output_image
+            source = lambda: image
+            op = func
+
+        def finish(new_image):
+            if new_image:
+                self.pending_state = None
+                self.update_image(new_image, op, keyframe)
+            self.status_label.config(text="Done")
+
+        stages = []
+        if preview:
+            # Tk may only be touched from this thread, so the canvas size is read here.
+            size = self.canvas_size(self.output_canvas)
+            stages.append((lambda: func(self.fit_to_canvas(source(), size)), self.show_preview))
+        stages.append((lambda: func(source()), finish))
+        self.status_label.config(text="Processing...")
+        self.scheduler.submit(stages, on_error=self.show_error)
+
+    def show_preview(self, preview_image):
+        if preview_image:
+            self.show_image(preview_image, self.output_canvas)
+
+    def show_error(self, error):
+        self.status_label.config(text="Failed")
+        messagebox.showerror("Error", str(error))
+
+    def update_image(self, new_image, op, keyframe=False):
         self.output_image = new_image
         self.show_image(self.output_image, self.output_canvas)
-        self.undo_stack.append(self.output_image.copy())
-        self.redo_stack.clear()
+        self.history.push(op, new_image, keyframe)
 
     def undo(self):
-        if len(self.undo_stack) > 1:
-            self.redo_stack.append(self.undo_stack.pop())
-            self.output_image = self.undo_stack[-1]
-            self.show_image(self.output_image, self.output_canvas)
+        if self.history and self.history.can_undo():
+            self.restore(self.history.undo(lazy=True))
 
     def redo(self):
-        if self.redo_stack:
-            self.output_image = self.redo_stack.pop()
-            self.show_image(self.output_image, self.output_canvas)
-            self.undo_stack.append(self.output_image.copy())
+        if self.history and self.history.can_redo():
+            self.restore(self.history.redo(lazy=True))
+
+    def restore(self, replay):
+        # Replaying up to keyframe_interval - 1 operations (a denoise among them) can take
+        # seconds, so it runs on the scheduler like an operation. The replay runs at most
+        # once even when an operation submitted meanwhile starts from its result.
+        state = functools.lru_cache(maxsize=1)(replay)
+        self.pending_state = state
+
+        def finish(image):
+            if self.pending_state is state:
+                self.pending_state = None
+            self.output_image = image
+            self.show_image(image, self.output_canvas)
+            self.status_label.config(text="Done")
+
+        self.status_label.config(text="Processing...")
+        self.scheduler.submit([(state, finish)], on_error=self.show_error)
+
+    @staticmethod
+    def canvas_size(canvas):
+        return int(canvas["width"]), int(canvas["height"])
+
+    @staticmethod
+    def fit_to_canvas(image, size):
+        width, height = size
+        scale = min(width / image.width, height / image.height)
+        if scale >= 1:
+            return image
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        return image.resize(size, Image.BILINEAR, reducing_gap=2.0)
 
     def show_image(self, image, canvas):
-        canvas_image = ImageTk.PhotoImage(image)
+        # The canvas is 300x300, so a downscaled PhotoImage is all that is ever shown.
+        canvas_image = ImageTk.PhotoImage(self.fit_to_canvas(image, self.canvas_size(canvas)))
         canvas.create_image(0, 0, anchor=tk.NW, image=canvas_image)
         canvas.image = canvas_image
         canvas.config(scrollregion=canvas.bbox(tk.ALL))
 
     def download_image(self):
-        file_path = filedialog.asksaveasfilename(defaultextension=".jpg", filetypes=[("JPEG files", "*.jpg"), ("PNG files", "*.png"), ("BMP files", "*.bmp")])
+        if not self.output_image:
+            messagebox.showerror("Error", "No image to save.")
+            return
+        file_path = filedialog.asksaveasfilename(defaultextension=".jpg", filetypes=[("JPEG files", "*.jpg"), ("PNG files", "*.png"), ("WebP files", "*.webp"), ("TIFF files", "*.tif"), ("BMP files", "*.bmp")])
         if file_path:
-            self.processor.save_output_image(file_path)
+            # Encoding a large image takes a while; it runs on the exporter's thread
+            # and the result is picked up from the Tk loop.
+            poll_future(self.root, self.exporter.submit(self.output_image, file_path),
+                        lambda future: self.export_done(future, file_path))
+
+    def export_done(self, future, file_path):
+        if future.exception() is not None:
+            messagebox.showerror("Error", f"Could not save {file_path}: {future.exception()}")
+        else:
             messagebox.showinfo("Success", "Image saved successfully!")
 
     #CNN Image Enhancer (cnn.py):
@@ -294,6 +402,7 @@ class ImageApp:
         threading.Thread(target=lambda: subprocess.run(["python", cnn_script_path])).start()
 
 
-root = tk.Tk()
-app = ImageApp(root)
-root.mainloop()
+if __name__ == "__main__":
+    root = tk.Tk()
+    app = ImageApp(root)
+    root.mainloop()
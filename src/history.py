@@ -0,0 +1,138 @@
+def image_nbytes(image):
+    """
+    Approximate in-memory size of a PIL image.
+
+    Parameters:
+    - image (PIL.Image): The image.
+
+    Returns:
+    - int: Size in bytes.
+    """
+    return image.width * image.height * len(image.getbands())
+
+
+class _Entry:
+    __slots__ = ("op", "keyframe")
+
+    def __init__(self, op, keyframe=None):
+        self.op = op
+        self.keyframe = keyframe
+
+
+class History:
+    def __init__(self, initial_image, budget_bytes=512 * 1024 * 1024, keyframe_interval=5):
+        """
+        Undo/redo history that stores an operation log plus periodic keyframes.
+
+        Only every `keyframe_interval`-th state is kept as a full image; the states in
+        between are recomputed by replaying the logged operations from the nearest
+        earlier keyframe. When the keyframes exceed `budget_bytes`, the oldest ones
+        are evicted together with the steps that depended on them.
+
+        Parameters:
+        - initial_image (PIL.Image): State before any edit.
+        - budget_bytes (int): Memory budget for stored keyframes.
+        - keyframe_interval (int): Number of steps between keyframes.
+        """
+        self.budget_bytes = budget_bytes
+        self.keyframe_interval = keyframe_interval
+        self.entries = [_Entry(None, initial_image)]
+        self.position = 0
+
+    def push(self, op, image, keyframe=False):
+        """
+        Record an edit. Discards any redo steps.
+
+        Parameters:
+        - op (function): Maps the previous state to `image`; must be deterministic as it is replayed.
+        - image (PIL.Image): The resulting state.
+        - keyframe (bool): Force storing `image`, e.g. for operations too slow to replay.
+        """
+        del self.entries[self.position + 1:]
+        steps_since_keyframe = self.position + 1 - self._last_keyframe(self.position)
+        if keyframe or steps_since_keyframe >= self.keyframe_interval:
+            self.entries.append(_Entry(op, image))
+        else:
+            self.entries.append(_Entry(op))
+        self.position += 1
+        self._evict()
+
+    def can_undo(self):
+        return self.position > 0
+
+    def can_redo(self):
+        return self.position < len(self.entries) - 1
+
+    def undo(self, lazy=False):
+        """
+        Step back one edit.
+
+        Parameters:
+        - lazy (bool): Return a function that rebuilds the state instead of the state, see materialize.
+
+        Returns:
+        - PIL.Image or None: The previous state, or None if there is nothing to undo.
+        """
+        if not self.can_undo():
+            return None
+        self.position -= 1
+        return self.materialize(self.position, lazy)
+
+    def redo(self, lazy=False):
+        """
+        Re-apply the last undone edit.
+
+        Parameters:
+        - lazy (bool): Return a function that rebuilds the state instead of the state, see materialize.
+
+        Returns:
+        - PIL.Image or None: The next state, or None if there is nothing to redo.
+        """
+        if not self.can_redo():
+            return None
+        self.position += 1
+        return self.materialize(self.position, lazy)
+
+    def materialize(self, index, lazy=False):
+        """
+        Rebuild the state at `index` by replaying operations from the nearest keyframe.
+
+        Parameters:
+        - index (int): Entry index.
+        - lazy (bool): Return a function that does the replay instead, e.g. to run it off the
+          UI thread. It works on a snapshot of the log, so later edits don't affect it.
+
+        Returns:
+        - PIL.Image or function: The state, or a function with no arguments returning it.
+        """
+        start = self._last_keyframe(index)
+        image = self.entries[start].keyframe
+        ops = [entry.op for entry in self.entries[start + 1:index + 1]]
+
+        def replay():
+            state = image
+            for op in ops:
+                state = op(state)
+            return state
+
+        return replay if lazy else replay()
+
+    def keyframe_bytes(self):
+        return sum(image_nbytes(entry.keyframe) for entry in self.entries if entry.keyframe is not None)
+
+    def _last_keyframe(self, index):
+        while self.entries[index].keyframe is None:
+            index -= 1
+        return index
+
+    def _evict(self):
+        # Drop the oldest keyframe and everything that replays from it, as long
+        # as the current state stays reachable. Entry 0 is always a keyframe.
+        while self.keyframe_bytes() > self.budget_bytes:
+            following = [i for i in range(1, self.position + 1) if self.entries[i].keyframe is not None]
+            if not following:
+                break
+            cut = following[0]
+            del self.entries[:cut]
+            self.entries[0].op = None
+            self.position -= cut
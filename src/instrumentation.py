@@ -0,0 +1,249 @@
+import cProfile
+import json
+import math
+import os
+import random
+import time
+import tracemalloc
+
+# Duration histograms use power-of-two microsecond buckets: bucket i counts
+# durations in [2**(i-1), 2**i) us, bucket 0 everything below 1 us.
+HISTOGRAM_BUCKETS = 40
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_bytes(self, nbytes):
+        pass
+
+
+NULL_STAGE = _NullStage()
+
+
+def add_stage(record, name, seconds, nbytes=0):
+    """
+    Add time measured elsewhere, e.g. on another thread, to an image record.
+
+    Parameters:
+    - record (dict): Record from an image() scope; None (profiling disabled) is ignored.
+    - name (str): Stage name.
+    - seconds (float): Duration to add.
+    - nbytes (int): Bytes to add.
+    """
+    if record is None:
+        return
+    stages = record["stages"]
+    total_seconds, total_bytes = stages.get(name, (0.0, 0))
+    stages[name] = (total_seconds + seconds, total_bytes + nbytes)
+
+
+class _Stage:
+    __slots__ = ("record", "name", "nbytes", "start")
+
+    def __init__(self, record, name):
+        self.record = record
+        self.name = name
+        self.nbytes = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        add_stage(self.record, self.name, time.perf_counter() - self.start, self.nbytes)
+        return False
+
+    def add_bytes(self, nbytes):
+        self.nbytes += nbytes
+
+
+class _StageStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.nbytes = 0
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+
+    def add(self, seconds, nbytes):
+        self.count += 1
+        self.seconds += seconds
+        self.nbytes += nbytes
+        micros = seconds * 1e6
+        bucket = 0 if micros < 1 else min(int(math.log2(micros)) + 1, HISTOGRAM_BUCKETS - 1)
+        self.histogram[bucket] += 1
+
+    def percentile(self, fraction):
+        # Upper edge of the bucket holding the requested rank, in milliseconds.
+        rank = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= rank:
+                return (2 ** bucket) / 1000.0
+        return 0.0
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_s": self.seconds,
+            "mean_ms": self.seconds / self.count * 1000.0 if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p99_ms": self.percentile(0.99),
+            "bytes": self.nbytes,
+            "histogram_us_pow2": self.histogram,
+        }
+
+
+class Profiler:
+    def __init__(self, enabled=True, log_path=None, sample_rate=0.0, profile_dir=None):
+        """
+        Per-stage timing for image processing.
+
+        Stages (decode, convert, each operation, encode, ...) are timed per image and
+        aggregated into duration histograms. When disabled every hook is a shared no-op
+        object, so instrumented code pays only a method call.
+
+        Parameters:
+        - enabled (bool): Record anything at all.
+        - log_path (str): Optional JSON-lines file; one record per image.
+        - sample_rate (float): Fraction of images also run under cProfile and tracemalloc.
+        - profile_dir (str): Where sampled cProfile dumps (.prof) are written. Defaults to
+          the directory of log_path, or the working directory.
+        """
+        self.enabled = enabled
+        self.log_path = log_path
+        self.sample_rate = sample_rate
+        self.profile_dir = profile_dir or (os.path.dirname(log_path) if log_path else ".")
+        self.stats = {}
+        self._record = None
+        self._log = None
+
+    def __getstate__(self):
+        # Worker processes get a copy without the parent's log file or statistics;
+        # their per-image records travel back and are merged with add_record.
+        state = self.__dict__.copy()
+        state.update(_log=None, _record=None, stats={})
+        return state
+
+    def stage(self, name):
+        """
+        Time a stage of the image currently being processed.
+
+        Parameters:
+        - name (str): Stage name, e.g. 'decode' or 'op:denoise'.
+
+        Returns:
+        - context manager: Use `add_bytes(n)` on it to count bytes produced or copied.
+        """
+        if self._record is None:
+            return NULL_STAGE
+        return _Stage(self._record, name)
+
+    def image(self, image_path):
+        """
+        Scope collecting the stages of one image; makes this profiler the active one.
+
+        Parameters:
+        - image_path (str): Image being processed.
+
+        Returns:
+        - context manager yielding the record dict, which is complete on exit.
+        """
+        return _ImageScope(self, image_path)
+
+    def add_record(self, record):
+        """
+        Merge one finished image record into the histograms and the log.
+
+        Parameters:
+        - record (dict): As produced by an image() scope, possibly in another process.
+        """
+        if not self.enabled or record is None:
+            return
+        for name, (seconds, nbytes) in record["stages"].items():
+            self.stats.setdefault(name, _StageStats()).add(seconds, nbytes)
+        if self.log_path:
+            if self._log is None:
+                self._log = open(self.log_path, "a")
+            stages = {name: {"seconds": seconds, "bytes": nbytes}
+                      for name, (seconds, nbytes) in record["stages"].items()}
+            self._log.write(json.dumps(dict(record, stages=stages)) + "\n")
+            self._log.flush()
+
+    def summary(self):
+        """
+        Aggregated statistics per stage.
+
+        Returns:
+        - dict: Stage name -> count, total_s, mean_ms, p50_ms, p99_ms, bytes and the raw histogram.
+        """
+        return {name: stats.summary() for name, stats in sorted(self.stats.items())}
+
+    def write_metrics(self, path):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+class _ImageScope:
+    def __init__(self, profiler, image_path):
+        self.profiler = profiler
+        self.image_path = image_path
+        self.record = None
+        self.sampler = None
+        self.previous = None
+
+    def __enter__(self):
+        global _active
+        if not self.profiler.enabled:
+            return None
+        self.record = {"image": self.image_path, "stages": {}}
+        self.previous, _active = _active, self.profiler
+        self.profiler._record = self.record
+        if self.profiler.sample_rate and random.random() < self.profiler.sample_rate:
+            tracemalloc.start()
+            self.sampler = cProfile.Profile()
+            self.sampler.enable()
+        self.start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, *exc):
+        global _active
+        if self.record is None:
+            return False
+        self.record["total_s"] = time.perf_counter() - self.start
+        if self.sampler is not None:
+            self.sampler.disable()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            name = os.path.splitext(os.path.basename(self.image_path))[0]
+            profile_path = os.path.join(self.profiler.profile_dir, f"{name}.{os.getpid()}.prof")
+            self.sampler.dump_stats(profile_path)
+            self.record["tracemalloc_peak_bytes"] = peak
+            self.record["cprofile"] = profile_path
+        self.profiler._record = None
+        _active = self.previous
+        return False
+
+
+DISABLED = Profiler(enabled=False)
+_active = DISABLED
+
+
+def active_profiler():
+    """
+    The profiler of the image currently being processed, or a disabled one.
+
+    Returns:
+    - Profiler: Call `.stage(name)` on it to time a stage.
+    """
+    return _active
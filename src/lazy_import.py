@@ -0,0 +1,37 @@
+import importlib
+
+
+class LazyModule:
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = importlib.import_module(self.__dict__["_name"])
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module '{self.__dict__['_name']}' ({state})>"
+
+
+def lazy_module(name):
+    """
+    Return a stand-in for a heavy module that is only imported on first attribute access.
+
+    Parameters:
+    - name (str): Module name, e.g. 'cv2'.
+
+    Returns:
+    - LazyModule: Proxy forwarding attribute access to the real module.
+    """
+    return LazyModule(name)
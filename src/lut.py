@@ -0,0 +1,132 @@
+import functools
+import numpy as np
+
+from lazy_import import lazy_module
+
+cv2 = lazy_module("cv2")
+
+# Every builder maps the float64 ramp 0..255 to output levels. Tables are built
+# once per (op, params) and shared, so they are returned read-only.
+LUT_BUILDERS = {}
+
+_RAMP = np.arange(256, dtype=np.float64)
+
+
+def register_lut(name):
+    def decorator(func):
+        LUT_BUILDERS[name] = func
+        return func
+    return decorator
+
+
+@register_lut("gamma")
+def _gamma(ramp, gamma=1.0):
+    # Truncates like the original np.uint8(np.power(img / 255.0, gamma) * 255).
+    return np.floor(np.power(ramp / 255.0, gamma) * 255)
+
+
+def _blend(ramp, base, factor):
+    # PIL's Image.blend, which ImageEnhance uses: base + factor * (level - base) in
+    # single precision, truncated. Bit-exact with ImageEnhance at every level.
+    base, factor = np.float32(base), np.float32(factor)
+    return np.floor(base + factor * (ramp.astype(np.float32) - base))
+
+
+@register_lut("brightness")
+def _brightness(ramp, factor=1.0):
+    # ImageEnhance.Brightness: blend with black.
+    return _blend(ramp, 0, factor)
+
+
+@register_lut("contrast")
+def _contrast(ramp, factor=1.0, mean=128):
+    # ImageEnhance.Contrast: blend with the mean grey level, int(mean + 0.5) of the L image.
+    return _blend(ramp, mean, factor)
+
+
+@register_lut("levels")
+def _levels(ramp, black=0, white=255, gamma=1.0, out_black=0, out_white=255):
+    normalized = np.clip((ramp - black) / max(white - black, 1), 0.0, 1.0)
+    return np.rint(out_black + np.power(normalized, 1.0 / gamma) * (out_white - out_black))
+
+
+@register_lut("scale_abs")
+def _scale_abs(ramp, alpha=1.0, beta=0.0):
+    # Matches cv2.convertScaleAbs.
+    return np.rint(np.abs(ramp * alpha + beta))
+
+
+def _freeze(params):
+    return tuple(sorted(params.items()))
+
+
+@functools.lru_cache(maxsize=256)
+def _build_lut(name, frozen_params):
+    try:
+        builder = LUT_BUILDERS[name]
+    except KeyError:
+        raise ValueError(f"Unsupported pointwise operation: {name}. Choose one of {sorted(LUT_BUILDERS)}.")
+    table = np.clip(builder(_RAMP, **dict(frozen_params)), 0, 255).astype(np.uint8)
+    table.flags.writeable = False
+    return table
+
+
+@functools.lru_cache(maxsize=256)
+def _build_chain(frozen_steps):
+    table = _build_lut(*frozen_steps[0])
+    for name, frozen_params in frozen_steps[1:]:
+        table = _build_lut(name, frozen_params)[table]
+    table.flags.writeable = False
+    return table
+
+
+def get_lut(name, **params):
+    """
+    Return the cached 256-entry uint8 table for one pointwise operation.
+
+    Parameters:
+    - name (str): 'gamma', 'brightness', 'contrast', 'levels' or 'scale_abs'.
+    - **params: Parameters of the operation.
+
+    Returns:
+    - numpy.ndarray: Read-only table of shape (256,).
+    """
+    return _build_lut(name, _freeze(params))
+
+
+def chain_lut(steps):
+    """
+    Compose a chain of pointwise operations into a single cached table.
+
+    Parameters:
+    - steps (list): Ordered (name, params) pairs.
+
+    Returns:
+    - numpy.ndarray: Read-only table of shape (256,) equivalent to applying every step in turn.
+    """
+    return _build_chain(tuple((name, _freeze(params)) for name, params in steps))
+
+
+def apply_lut(frame, table, dst=None):
+    """
+    Apply a table to every sample of a uint8 frame in a single pass.
+
+    Parameters:
+    - frame (numpy.ndarray): uint8 grayscale or multi-channel frame.
+    - table (numpy.ndarray): 256-entry uint8 table.
+    - dst (numpy.ndarray): Optional output buffer; may be the frame itself.
+
+    Returns:
+    - numpy.ndarray: The mapped frame.
+    """
+    return cv2.LUT(frame, table, dst=dst)
+
+
+def lut_cache_info():
+    """
+    Return LRU statistics for the single-op and chained table caches.
+
+    Returns:
+    - dict: {'tables': CacheInfo, 'chains': CacheInfo}.
+    """
+    return {"tables": _build_lut.cache_info(), "chains": _build_chain.cache_info()}
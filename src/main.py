@@ -1,16 +1,21 @@
-import cv2
-import numpy as np
-from PIL import Image, ImageOps, ImageFilter
-from tkinter.simpledialog import askfloat
-import tkinter as tk
-from tkinter import filedialog
+from PIL import Image
+
+from export import DEFAULT_PRESET, save_image
+from pipeline import Pipeline, load_frame
+from result_cache import hash_array, make_key
 
 class ImageProcessor:
-    def __init__(self):
+    def __init__(self, cache=None):
         self.image = None
+        self.cache = cache
+        self._frame = None
+        self._frame_source = None
 
     def select_image(self, path=None):
         if path is None:
+            # Tk is only needed for the interactive dialog; headless use never imports it.
+            import tkinter as tk
+            from tkinter import filedialog
             root = tk.Tk()
             root.withdraw()  
             path = filedialog.askopenfilename(filetypes=[("Image files", "*.jpg;*.jpeg;*.png")])
@@ -19,82 +24,54 @@ class ImageProcessor:
             return self.image
         return None
 
-    def denoise(self):
+    def apply_pipeline(self, steps):
         if self.image:
-            img_cv = np.array(self.image.convert("RGB"))
-            denoised = cv2.fastNlMeansDenoisingColored(img_cv, None, 10, 10, 7, 21)
-            denoised_img = Image.fromarray(denoised)
-            self.image = denoised_img 
-            return denoised_img
+            frame = self._frame if self._frame_source is self.image else load_frame(self.image)
+            pipeline = Pipeline(steps)
+            if self.cache is not None:
+                key = make_key(hash_array(frame), "pipeline", pipeline.cache_token())
+                frame = self.cache.get_or_compute(key, lambda: pipeline.run(frame))
+            else:
+                frame = pipeline.run(frame)
+            self.image = Image.fromarray(frame)
+            # Keep the frame so the next call skips the PIL -> NumPy conversion.
+            self._frame, self._frame_source = frame, self.image
+            return self.image
         return None
 
+    def denoise(self):
+        return self.apply_pipeline([("denoise", {})])
+
     def histogram_equalization(self):
-        if self.image:
-            img_cv = np.array(self.image.convert("RGB"))
-            img_gray = cv2.cvtColor(img_cv, cv2.COLOR_RGB2GRAY)
-            hist_eq = cv2.equalizeHist(img_gray)
-            hist_eq_img = Image.fromarray(hist_eq)
-            self.image = hist_eq_img  
-            return hist_eq_img
-        return None
+        return self.apply_pipeline([("histogram_equalization", {})])
 
     def gamma_correction(self, gamma=None):
         if self.image:
             if gamma is None:
+                from tkinter.simpledialog import askfloat
                 gamma = askfloat("Gamma Correction", "Enter gamma value:", minvalue=0.1, maxvalue=5.0)
             if gamma:
-                img_cv = np.array(self.image.convert("RGB"))
-                img_gamma_corrected = np.power(img_cv / 255.0, gamma) * 255
-                img_gamma_corrected = np.uint8(img_gamma_corrected)
-                gamma_corrected_img = Image.fromarray(img_gamma_corrected)
-                self.image = gamma_corrected_img  
-                return gamma_corrected_img
+                return self.apply_pipeline([("gamma", {"gamma": gamma})])
         return None
 
     def unsharp_mask(self):
-        if self.image:
-            img_cv = np.array(self.image.convert("RGB"))
-            blurred = cv2.GaussianBlur(img_cv, (5, 5), 1.0)
-            sharpened = cv2.addWeighted(img_cv, 1.5, blurred, -0.5, 0)
-            sharpened_img = Image.fromarray(sharpened)
-            self.image = sharpened_img  
-            return sharpened_img
-        return None
+        return self.apply_pipeline([("unsharp_mask", {})])
 
     def edge_detection(self):
-        if self.image:
-            img_cv = np.array(self.image.convert("RGB"))
-            img_gray = cv2.cvtColor(img_cv, cv2.COLOR_RGB2GRAY)
-            edges = cv2.Canny(img_gray, 100, 200)
-            edges_img = Image.fromarray(edges)
-            self.image = edges_img  
-            return edges_img
-        return None
+        return self.apply_pipeline([("edge_detection", {})])
 
     def gaussian_blur(self):
-        if self.image:
-            img_cv = np.array(self.image.convert("RGB"))
-            blurred = cv2.GaussianBlur(img_cv, (15, 15), 0)
-            blurred_img = Image.fromarray(blurred)
-            self.image = blurred_img  
-            return blurred_img
-        return None
+        return self.apply_pipeline([("gaussian_blur", {})])
 
     def median_filter(self):
-        if self.image:
-            img_cv = np.array(self.image.convert("RGB"))
-            median_filtered = cv2.medianBlur(img_cv, 15)
-            median_filtered_img = Image.fromarray(median_filtered)
-            self.image = median_filtered_img 
-            return median_filtered_img
-        return None
+        return self.apply_pipeline([("median_filter", {})])
 
     def adjust_white_balance(self):
         return self.image
 
-    def save_image(self, path):
+    def save_image(self, path, preset=DEFAULT_PRESET):
         if self.image:
-            self.image.save(path)
+            save_image(self.image, path, preset)
 
 if __name__ == "__main__":
     processor = ImageProcessor()
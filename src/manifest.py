@@ -0,0 +1,219 @@
+import os
+import sqlite3
+import time
+from collections import namedtuple
+
+from result_cache import hash_file
+
+ManifestEntry = namedtuple("ManifestEntry", ["path", "size", "mtime_ns", "digest"])
+
+DEFAULT_EXTENSIONS = ("jpg", "jpeg", "png")
+
+
+def iter_image_files(directory, extensions=DEFAULT_EXTENSIONS, dir_cache=None):
+    """
+    Recursively list image files with os.scandir.
+
+    Parameters:
+    - directory (str): Root directory.
+    - extensions (tuple): Allowed file extensions.
+    - dir_cache (dict): Optional directory path -> (mtime_ns, subdirectories), updated in place.
+      Directories whose mtime is unchanged since the cached listing are not listed again:
+      adding, removing or renaming a file changes its directory's mtime, so only
+      directories that gained or lost entries are read.
+
+    Yields:
+    - str: Image file paths.
+    """
+    extensions = tuple(extensions)
+    stack = [directory]
+    while stack:
+        path = stack.pop()
+        if dir_cache is not None:
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                dir_cache.pop(path, None)
+                continue
+            cached = dir_cache.get(path)
+            if cached is not None and cached[0] == mtime_ns:
+                stack.extend(cached[1])
+                continue
+        subdirs = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.name.lower().endswith(extensions) and entry.is_file():
+                        yield entry.path
+        except FileNotFoundError:
+            continue
+        if dir_cache is not None:
+            # mtime was read before listing, so entries added meanwhile show up next time.
+            dir_cache[path] = (mtime_ns, subdirs)
+        stack.extend(subdirs)
+
+
+class Manifest:
+    def __init__(self, path, commit_every=1000):
+        """
+        Persistent record of processed files (path, size, mtime and content hash) in SQLite.
+
+        Rescans compare each file's size and mtime with the record and hash only files
+        whose stat changed, so unchanged trees cost one stat per file and touched but
+        identical files are not reported.
+
+        Parameters:
+        - path (str): SQLite database file.
+        - commit_every (int): Records written per transaction; close() commits the rest.
+        """
+        self.path = path
+        self.commit_every = commit_every
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+                         "mtime_ns INTEGER NOT NULL, digest TEXT NOT NULL)")
+        self._known = None
+        self._uncommitted = 0
+
+    def _index(self):
+        if self._known is None:
+            self._known = {path: (size, mtime_ns, digest) for path, size, mtime_ns, digest
+                           in self._db.execute("SELECT path, size, mtime_ns, digest FROM files")}
+        return self._known
+
+    def __len__(self):
+        return len(self._index())
+
+    def __contains__(self, path):
+        return path in self._index()
+
+    def check(self, path, stat=None):
+        """
+        Compare a file with its record.
+
+        Parameters:
+        - path (str): File path.
+        - stat (os.stat_result): The file's stat, if already known.
+
+        Returns:
+        - ManifestEntry or None: The file's current entry if it is new or its content changed,
+          otherwise None.
+        """
+        if stat is None:
+            stat = os.stat(path)
+        known = self._index().get(path)
+        if known is not None and known[:2] == (stat.st_size, stat.st_mtime_ns):
+            return None
+        entry = ManifestEntry(path, stat.st_size, stat.st_mtime_ns, hash_file(path))
+        if known is not None and known[2] == entry.digest:
+            # Touched or copied over with identical bytes: refresh the stat, report nothing.
+            self.record(entry)
+            return None
+        return entry
+
+    def record(self, entry):
+        """
+        Store a file's entry, e.g. once it has been processed.
+
+        Parameters:
+        - entry (ManifestEntry): As returned by check, scan or watch.
+        """
+        self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", entry)
+        self._index()[entry.path] = entry[1:]
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        self._db.commit()
+        self._uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+    def scan(self, directory, extensions=DEFAULT_EXTENSIONS, record=True):
+        """
+        Find new and changed image files.
+
+        Parameters:
+        - directory (str): Root directory.
+        - extensions (tuple): Allowed file extensions.
+        - record (bool): Store each entry as soon as it is reported. Pass False to record
+          only after successful processing, so failures are retried on the next scan.
+
+        Yields:
+        - ManifestEntry: One per new or changed file.
+        """
+        for path in iter_image_files(directory, extensions):
+            try:
+                entry = self.check(path)
+            except FileNotFoundError:
+                continue
+            if entry is not None:
+                if record:
+                    self.record(entry)
+                yield entry
+        self.commit()
+
+    def watch(self, directory, extensions=DEFAULT_EXTENSIONS, interval=0.5, settle=1.0, record=True):
+        """
+        Report new and changed image files continuously, starting with everything not yet recorded.
+
+        Polls the tree every `interval` seconds. Only directories whose mtime changed are
+        listed again, so new uploads are found quickly even in very large trees; content
+        rewritten in place (without a rename) is only picked up by a fresh scan.
+
+        Parameters:
+        - directory (str): Root directory.
+        - extensions (tuple): Allowed file extensions.
+        - interval (float): Seconds between polls.
+        - settle (float): A file is reported once its mtime is this many seconds old, so
+          uploads still being written are not picked up half-finished.
+        - record (bool): As in scan. With False, an entry is reported once and then held
+          back until it is recorded or the file changes again, so a failed image is retried
+          only when it is replaced.
+
+        Yields:
+        - ManifestEntry: One per new or changed file. The generator never ends by itself.
+          It sleeps between polls without returning to the caller, so a consumer that only
+          collects finished work between items (iter_process_batch with workers > 1) does
+          not record or checkpoint the last uploads until another file arrives. Use
+          workers=1 where that matters.
+        """
+        dir_cache = {}
+        unsettled = set()
+        # Path -> (size, mtime_ns) of entries reported but not recorded yet (record=False).
+        reported = {}
+        while True:
+            index = self._index()
+            for path, stat_key in list(reported.items()):
+                if index.get(path, ())[:2] == stat_key:
+                    del reported[path]
+            candidates = set(iter_image_files(directory, extensions, dir_cache)) | unsettled
+            now = time.time_ns()
+            for path in sorted(candidates):
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    unsettled.discard(path)
+                    reported.pop(path, None)
+                    continue
+                if now - stat.st_mtime_ns < settle * 1e9:
+                    unsettled.add(path)
+                    continue
+                unsettled.discard(path)
+                if reported.get(path) == (stat.st_size, stat.st_mtime_ns):
+                    continue
+                entry = self.check(path, stat)
+                if entry is not None:
+                    if record:
+                        self.record(entry)
+                    else:
+                        reported[path] = (entry.size, entry.mtime_ns)
+                    yield entry
+            if self._uncommitted:
+                self.commit()
+            time.sleep(interval)
@@ -0,0 +1,136 @@
+from collections import namedtuple
+
+from buffer_pool import borrow
+from denoise import DEFAULT_BUDGET_S, denoise as denoise_frame, denoise_radius, nlm
+from edge_detection import detect_edges, edge_halo
+from lazy_import import lazy_module
+from lut import apply_lut, get_lut
+
+cv2 = lazy_module("cv2")
+
+# An operation takes a uint8 frame (H x W grayscale or H x W x 3 RGB) plus its
+# parameters and returns a uint8 frame. `dst` is an optional buffer for the result
+# (pipelines pass one from buffer_pool); an operation may ignore it and return a new
+# array. Pointwise operations are backed by a table in lut.py of the same name, so a
+# run of them can be fused into one table.
+# `radius` is how far (in pixels) an output sample can see into its input; it
+# sizes the halo for tiled processing. None marks operations that need the
+# whole frame (e.g. histogram equalization) and cannot be tiled.
+Operation = namedtuple("Operation", ["func", "pointwise", "radius"])
+
+OPERATIONS = {}
+
+
+def register(name, pointwise=False, radius=0):
+    def decorator(func):
+        OPERATIONS[name] = Operation(func, pointwise, radius)
+        return func
+    return decorator
+
+
+def get_operation(name):
+    """
+    Look up a registered operation by name.
+
+    Parameters:
+    - name (str): Operation name, e.g. 'denoise' or 'gamma'.
+
+    Returns:
+    - Operation: (func, pointwise, radius) tuple.
+    """
+    try:
+        return OPERATIONS[name]
+    except KeyError:
+        raise ValueError(f"Unsupported operation: {name}. Choose one of {sorted(OPERATIONS)}.")
+
+
+def operation_radius(name, params):
+    """
+    Kernel radius of an operation for the given parameters.
+
+    Parameters:
+    - name (str): Operation name.
+    - params (dict): Operation parameters.
+
+    Returns:
+    - int or None: Radius in pixels, or None if the operation needs the whole frame.
+    """
+    radius = get_operation(name).radius
+    if callable(radius):
+        return radius(**params)
+    return radius
+
+
+def _to_gray(frame, dst=None):
+    if frame.ndim == 2:
+        return frame
+    return cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY, dst=dst)
+
+
+@register("denoise", radius=lambda template_window=7, search_window=21, **_:
+          template_window // 2 + search_window // 2)
+def denoise(frame, h=10, h_color=10, template_window=7, search_window=21, dst=None):
+    return nlm(frame, h, h_color, template_window, search_window, dst=dst)
+
+
+# The backend is planned per frame from its size, estimated noise and the latency
+# budget (see denoise.plan), so the choice depends on the machine's measured speed.
+# Pin `backend` (and `sigma`) for reproducible output.
+@register("auto_denoise", radius=denoise_radius)
+def auto_denoise(frame, backend="auto", sigma=None, budget_s=DEFAULT_BUDGET_S, dst=None, **params):
+    return denoise_frame(frame, backend, sigma=sigma, budget_s=budget_s, dst=dst, **params)
+
+
+@register("histogram_equalization", radius=None)
+def histogram_equalization(frame, dst=None):
+    with borrow(frame.shape[:2]) as gray:
+        return cv2.equalizeHist(_to_gray(frame, gray), dst=dst)
+
+
+@register("gamma", pointwise=True)
+def gamma(frame, gamma=1.0, dst=None):
+    return apply_lut(frame, get_lut("gamma", gamma=gamma), dst)
+
+
+@register("brightness", pointwise=True)
+def brightness(frame, factor=1.0, dst=None):
+    return apply_lut(frame, get_lut("brightness", factor=factor), dst)
+
+
+@register("contrast", pointwise=True)
+def contrast(frame, factor=1.0, mean=128, dst=None):
+    return apply_lut(frame, get_lut("contrast", factor=factor, mean=mean), dst)
+
+
+@register("levels", pointwise=True)
+def levels(frame, black=0, white=255, gamma=1.0, out_black=0, out_white=255, dst=None):
+    return apply_lut(frame, get_lut("levels", black=black, white=white, gamma=gamma,
+                                    out_black=out_black, out_white=out_white), dst)
+
+
+@register("unsharp_mask", radius=lambda ksize=5, **_: ksize // 2)
+def unsharp_mask(frame, ksize=5, sigma=1.0, amount=0.5, dst=None):
+    with borrow(frame.shape, frame.dtype) as blurred:
+        cv2.GaussianBlur(frame, (ksize, ksize), sigma, dst=blurred)
+        return cv2.addWeighted(frame, 1.0 + amount, blurred, -amount, 0, dst=dst)
+
+
+# Same methods and parameters as edge_detection.apply_edge_detection; the halo
+# covers the gradient kernels. Canny's hysteresis reaches across the whole frame,
+# so a Canny step has no radius and a pipeline containing it cannot be tiled.
+@register("edge_detection", radius=lambda method="Canny", apply_blur=False, kernel_size=3, **_:
+          edge_halo(method, apply_blur, kernel_size))
+def edge_detection(frame, method="Canny", lower_thresh=100, upper_thresh=200, apply_blur=False, kernel_size=3,
+                   dst=None):
+    with borrow(frame.shape[:2]) as gray:
+        return detect_edges(_to_gray(frame, gray), method, lower_thresh, upper_thresh, apply_blur, kernel_size)
+
+
+@register("gaussian_blur", radius=lambda ksize=15, **_: ksize // 2)
+def gaussian_blur(frame, ksize=15, dst=None):
+    return cv2.GaussianBlur(frame, (ksize, ksize), 0, dst=dst)
+
+
+@register("median_filter", radius=lambda ksize=15, **_: ksize // 2)
+def median_filter(frame, ksize=15, dst=None):
+    return cv2.medianBlur(frame, ksize, dst=dst)
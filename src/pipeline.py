@@ -0,0 +1,168 @@
+import numpy as np
+from PIL import Image
+
+from buffer_pool import default_pool
+from instrumentation import active_profiler
+from lut import apply_lut, chain_lut
+from operations import get_operation, operation_radius
+from storage import read_image_array
+from tiling import process_tiled
+
+
+def load_frame(source):
+    """
+    Convert an image source into a uint8 NumPy frame, once.
+
+    Parameters:
+    - source (str, PIL.Image or numpy.ndarray): Image path (.npy files are memory-mapped),
+      PIL image or an existing frame.
+
+    Returns:
+    - numpy.ndarray: H x W grayscale or H x W x 3 RGB frame.
+    """
+    if isinstance(source, np.ndarray):
+        return source
+    if isinstance(source, str):
+        with active_profiler().stage("decode") as stage:
+            frame = read_image_array(source)
+            stage.add_bytes(frame.nbytes)
+        return frame
+    with active_profiler().stage("convert") as stage:
+        if source.mode not in ("L", "RGB"):
+            source = source.convert("RGB")
+        frame = np.array(source)
+        stage.add_bytes(frame.nbytes)
+    return frame
+
+
+def _normalize_step(step):
+    if isinstance(step, str):
+        return step, {}
+    name, params = step
+    return name, dict(params or {})
+
+
+class Pipeline:
+    def __init__(self, steps):
+        """
+        Build a pipeline from an ordered list of operations.
+
+        Parameters:
+        - steps (list): Each step is an operation name or a (name, params) pair,
+          e.g. [('denoise', {}), ('gamma', {'gamma': 0.8}), 'unsharp_mask'].
+        """
+        self.steps = [_normalize_step(step) for step in steps]
+        self.stages = self._fuse(self.steps)
+        # Input (shape, dtype) -> output (shape, dtype) of every stage, learned on the
+        # first frame of that size so later frames get their buffers from the pool.
+        self._layouts = {}
+
+    @staticmethod
+    def _fuse(steps):
+        # Adjacent pointwise steps collapse into one cached 256-entry table that
+        # is applied with a single cv2.LUT pass instead of one pass per step.
+        # Each stage is (kind, stage, label); the label names it for profiling.
+        stages = []
+        for name, params in steps:
+            operation = get_operation(name)
+            if operation.pointwise:
+                if stages and stages[-1][0] == "lut":
+                    stages[-1][1].append((name, params))
+                else:
+                    stages.append(("lut", [(name, params)]))
+            else:
+                stages.append(("op", (operation.func, params), f"op:{name}"))
+        return [("lut", chain_lut(stage[1]), "lut:" + "+".join(name for name, _ in stage[1]))
+                if stage[0] == "lut" else stage for stage in stages]
+
+    def run(self, source, pool=default_pool):
+        """
+        Run every step on one frame without converting back to PIL in between.
+
+        From the second frame of a given size on, every stage writes into a buffer from
+        `pool` and each intermediate goes back to the pool once the next stage has
+        consumed it, so a batch of same-sized frames reuses the same memory.
+
+        Parameters:
+        - source (str, PIL.Image or numpy.ndarray): Input image.
+        - pool (BufferPool): Buffer pool, or None to allocate normally.
+
+        Returns:
+        - numpy.ndarray: The processed uint8 frame, owned by the caller (it may hand it
+          back with pool.put once done with it).
+        """
+        profiler = active_profiler()
+        frame = load_frame(source)
+        key = (frame.shape, frame.dtype.str)
+        layout = self._layouts.get(key) if pool is not None else None
+        learned = []
+        pooled = None
+        for index, (kind, stage, label) in enumerate(self.stages):
+            dst = pool.get(*layout[index]) if layout is not None else None
+            with profiler.stage(label) as timer:
+                if kind == "lut":
+                    result = apply_lut(frame, stage, dst)
+                else:
+                    func, params = stage
+                    result = func(frame, dst=dst, **params)
+                timer.add_bytes(result.nbytes)
+            if dst is not None and result is not dst:
+                pool.put(dst)
+            # Only buffers that came from the pool go back to it: anything else may be
+            # the caller's input or share memory with it.
+            if pooled is not None and pooled is not result:
+                pool.put(pooled)
+                pooled = None
+            if dst is not None and result is dst:
+                pooled = result
+            learned.append((result.shape, result.dtype))
+            frame = result
+        if layout is None and pool is not None:
+            if len(self._layouts) >= 32:
+                self._layouts.clear()
+            self._layouts[key] = learned
+        return frame
+
+    def cache_token(self):
+        # Identifies the pipeline's work for the result cache.
+        return self.steps
+
+    def halo(self):
+        """
+        Total input margin the pipeline needs; radii add up as steps are chained.
+
+        Returns:
+        - int or None: Halo in pixels, or None if any step needs the whole frame.
+        """
+        total = 0
+        for name, params in self.steps:
+            radius = operation_radius(name, params)
+            if radius is None:
+                return None
+            total += radius
+        return total
+
+    def run_tiled(self, source, tile_size=1024, out=None):
+        """
+        Run the pipeline over overlapping tiles with peak memory bounded by tile_size.
+
+        Parameters:
+        - source (numpy.ndarray): uint8 frame, typically a np.memmap of a very large image.
+        - tile_size (int): Tile edge length in pixels, excluding the halo.
+        - out (numpy.ndarray): Optional output array, e.g. a writable memmap.
+
+        Returns:
+        - numpy.ndarray: The stitched output frame.
+        """
+        return process_tiled(source, self.run, self.halo(), tile_size=tile_size, out=out)
+
+    def __call__(self, image_path):
+        # Lets a pipeline be passed straight to process_batch as process_function.
+        # Pass `pipeline.run` instead to keep the result as an array for raw .npy stages.
+        frame = self.run(image_path)
+        with active_profiler().stage("convert"):
+            image = Image.fromarray(frame)
+        if frame.ndim == 3 and frame is not image_path:
+            # PIL copies RGB data but may share grayscale buffers, so only RGB goes back.
+            default_pool.put(frame)
+        return image
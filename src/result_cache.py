@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+
+# Part of every key: bump it whenever an operation changes its output so stale
+# results from older code are never served.
+CODE_VERSION = "4"
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "lunarz")
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """
+    SHA-256 of a file's bytes.
+
+    Parameters:
+    - path (str): File to hash.
+    - chunk_size (int): Read size in bytes.
+
+    Returns:
+    - str: Hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_array(array):
+    """
+    SHA-256 of an array's shape, dtype and contents.
+
+    Parameters:
+    - array (numpy.ndarray): Array to hash.
+
+    Returns:
+    - str: Hex digest.
+    """
+    digest = hashlib.sha256(f"{array.shape}{array.dtype}".encode())
+    digest.update(memoryview(np.ascontiguousarray(array)).cast("B"))
+    return digest.hexdigest()
+
+
+def make_key(input_digest, operation, params=None):
+    """
+    Build a cache key from the input content, the operation and its parameters.
+
+    Parameters:
+    - input_digest (str): Hash of the input (see hash_file and hash_array).
+    - operation (str): Operation name.
+    - params: JSON-serialisable parameters; anything else is keyed by its repr.
+
+    Returns:
+    - str: Hex digest used as the cache key.
+    """
+    payload = json.dumps([input_digest, operation, params, CODE_VERSION], sort_keys=True, default=repr)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=2 * 1024 ** 3):
+        """
+        Size-bounded on-disk cache of processed arrays, shared between processes and runs.
+
+        Entries are .npy files named by their key. Writes go to a unique temporary
+        file and are renamed into place, so concurrent workers never see partial
+        entries. Reads refresh an entry's mtime, and eviction removes the least
+        recently used entries once the total size exceeds `max_bytes`.
+
+        Parameters:
+        - directory (str): Cache directory.
+        - max_bytes (int): Size limit in bytes.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._bytes = None
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".npy")
+
+    def get(self, key):
+        """
+        Look up a cached result.
+
+        Parameters:
+        - key (str): Cache key from make_key.
+
+        Returns:
+        - numpy.ndarray or None: The cached array, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            array = np.load(path)
+            os.utime(path)
+        except (FileNotFoundError, ValueError, OSError):
+            # Missing, evicted by another worker in the meantime, or unreadable.
+            self.misses += 1
+            return None
+        self.hits += 1
+        return array
+
+    def put(self, key, array):
+        """
+        Store a result atomically.
+
+        Parameters:
+        - key (str): Cache key from make_key.
+        - array (numpy.ndarray or PIL.Image): Result to store.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.asarray(array))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if self._bytes is None:
+            self._bytes = self._total_bytes()
+        else:
+            self._bytes += os.path.getsize(path)
+        if self._bytes > self.max_bytes:
+            self.evict()
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached result for `key`, computing and storing it on a miss.
+
+        Parameters:
+        - key (str): Cache key from make_key.
+        - compute (function): Called with no arguments to produce the result.
+
+        Returns:
+        - numpy.ndarray or the value returned by compute.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        result = compute()
+        self.put(key, result)
+        return result
+
+    def _entries(self):
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".npy"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, entry.path
+
+    def _total_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, target_ratio=0.9):
+        """
+        Remove least recently used entries until the cache is below target_ratio * max_bytes.
+
+        Parameters:
+        - target_ratio (float): Fraction of max_bytes to shrink to.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes * target_ratio:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._bytes = total
+
+    def stats(self):
+        """
+        Hit/miss counters of this instance and the current size of the cache.
+
+        Returns:
+        - dict: hits, misses, hit_rate, entries and bytes.
+        """
+        entries = list(self._entries())
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+        }
@@ -0,0 +1,67 @@
+import queue
+import threading
+
+
+class Scheduler:
+    def __init__(self, root, poll_ms=30):
+        """
+        Runs image operations on a background thread and hands results back to Tk.
+
+        Each submitted job is a list of stages (e.g. a quick preview followed by the
+        full-resolution result). Submitting a new job makes every older job stale:
+        its remaining stages are skipped and results that still arrive are dropped.
+        Callbacks always run on the Tk main thread.
+
+        Parameters:
+        - root (tk.Tk): Root window, used to poll for results with `after`.
+        - poll_ms (int): Result polling interval in milliseconds.
+        """
+        self.root = root
+        self.poll_ms = poll_ms
+        self.generation = 0
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        threading.Thread(target=self._work, daemon=True).start()
+        self.root.after(self.poll_ms, self._poll)
+
+    def submit(self, stages, on_error=None):
+        """
+        Queue a job and cancel everything submitted before it.
+
+        Parameters:
+        - stages (list): (func, callback) pairs run in order; callback(func()) runs on the Tk thread.
+        - on_error (function): Called with the exception on the Tk thread if a stage fails.
+
+        Returns:
+        - int: The job's generation number.
+        """
+        self.generation += 1
+        self._jobs.put((self.generation, stages, on_error))
+        return self.generation
+
+    def cancel(self):
+        self.generation += 1
+
+    def _work(self):
+        while True:
+            generation, stages, on_error = self._jobs.get()
+            for func, callback in stages:
+                if generation != self.generation:
+                    break
+                try:
+                    result = func()
+                except Exception as e:
+                    if on_error is not None:
+                        self._results.put((generation, on_error, e))
+                    break
+                self._results.put((generation, callback, result))
+
+    def _poll(self):
+        try:
+            while True:
+                generation, callback, result = self._results.get_nowait()
+                if generation == self.generation:
+                    callback(result)
+        except queue.Empty:
+            pass
+        self.root.after(self.poll_ms, self._poll)
@@ -0,0 +1,250 @@
+"""
+Process a video or an image sequence frame by frame with overlapping decode, compute and encode.
+
+Usage:
+    python src/sequence.py capture.mp4 enhanced.mp4 --recipe recipe.json --temporal-window 5
+    python src/sequence.py frames/ out_frames/ --recipe recipe.json --output-format png
+"""
+import os
+import queue
+import threading
+from collections import deque
+
+from lazy_import import lazy_module
+from manifest import iter_image_files
+from pipeline import Pipeline
+from storage import is_raw, read_image_array, save_array
+
+cv2 = lazy_module("cv2")
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+DEFAULT_FPS = 25.0
+
+_END = object()
+
+
+def _is_video(path):
+    return isinstance(path, str) and os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS
+
+
+class SequenceProcessor:
+    def __init__(self, steps=(), temporal_window=0, h=10, h_color=10, template_window=7, search_window=21,
+                 queue_size=4):
+        """
+        Run a pipeline over every frame of a video or image sequence.
+
+        A reader thread decodes frames and a writer thread encodes results while the
+        calling thread computes, so the three overlap (OpenCV releases the GIL).
+        State is built once and reused across frames: the fused pipeline and its
+        lookup tables, the decode and colour-conversion buffers, and the window of
+        neighbouring frames for temporal denoising.
+
+        Parameters:
+        - steps (list): Pipeline steps, as for pipeline.Pipeline.
+        - temporal_window (int): Odd number of frames for fastNlMeansDenoising(Colored)Multi
+          before the pipeline; 0 disables temporal denoising. Frames near the start and end
+          use the largest centred window available.
+        - h, h_color, template_window, search_window: Temporal NLM parameters.
+        - queue_size (int): Frames buffered between the threads; bounds memory.
+        """
+        if temporal_window and temporal_window % 2 == 0:
+            raise ValueError(f"temporal_window must be odd, got {temporal_window}")
+        self.pipeline = Pipeline(steps)
+        self.temporal_window = temporal_window
+        self.h = h
+        self.h_color = h_color
+        self.template_window = template_window
+        self.search_window = search_window
+        self.queue_size = queue_size
+
+    def run(self, source, output, fps=None, fourcc="mp4v", output_format="png"):
+        """
+        Process a whole sequence.
+
+        Parameters:
+        - source (str or list): Video file, directory of frames (sorted by name) or list of frame paths.
+        - output (str): Video file (.mp4, .avi, .mov, .mkv) or directory for numbered frames.
+        - fps (float): Output frame rate. Defaults to the source video's, or 25.
+        - fourcc (str): Video codec code.
+        - output_format (str): Frame file extension when output is a directory; 'npy' writes raw arrays.
+
+        Returns:
+        - int: Number of frames written.
+        """
+        capture = None
+        if _is_video(source):
+            capture = cv2.VideoCapture(source)
+            if not capture.isOpened():
+                raise ValueError(f"Error opening video: {source}")
+            fps = fps or capture.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+        else:
+            if isinstance(source, str):
+                source = sorted(iter_image_files(source, ("jpg", "jpeg", "png", "tif", "tiff", "npy")))
+            fps = fps or DEFAULT_FPS
+        if not _is_video(output):
+            os.makedirs(output, exist_ok=True)
+
+        frames = queue.Queue(self.queue_size)
+        results = queue.Queue(self.queue_size)
+        free = queue.Queue()
+        errors = []
+        stop = threading.Event()
+        reader = threading.Thread(target=self._read, args=(capture, source, frames, free, errors, stop),
+                                  daemon=True)
+        writer = threading.Thread(target=self._write, args=(output, results, fps, fourcc, output_format, errors),
+                                  daemon=True)
+        reader.start()
+        writer.start()
+        count = 0
+        try:
+            for index, frame in self._compute(frames, free if capture is not None else None):
+                results.put((index, frame))
+                count += 1
+                if errors:
+                    break
+        except BaseException:
+            stop.set()
+            raise
+        finally:
+            stop.set()
+            # Unblock the reader if it is waiting on a full queue.
+            while reader.is_alive():
+                try:
+                    frames.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            results.put(_END)
+            writer.join()
+            if capture is not None:
+                capture.release()
+        if errors:
+            raise errors[0]
+        return count
+
+    def _read(self, capture, paths, frames, free, errors, stop):
+        try:
+            if capture is not None:
+                bgr = None
+                while not stop.is_set():
+                    ok, bgr = capture.read(bgr)
+                    if not ok:
+                        break
+                    try:
+                        rgb = free.get_nowait()
+                    except queue.Empty:
+                        rgb = None
+                    frames.put(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=rgb))
+            else:
+                for path in paths:
+                    if stop.is_set():
+                        break
+                    frames.put(read_image_array(path))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            frames.put(_END)
+
+    def _compute(self, frames, free):
+        # window holds the decoded frames [base, base + len(window)); frame `index` is
+        # emitted once `radius` frames after it have arrived (or the input ended).
+        half = self.temporal_window // 2
+        window = deque()
+        base = index = 0
+        ended = False
+        while not ended or index < base + len(window):
+            if not ended:
+                frame = frames.get()
+                if frame is _END:
+                    ended = True
+                else:
+                    window.append(frame)
+            while index < base + len(window):
+                last = base + len(window) - 1
+                radius = min(half, index) if not ended else min(half, index, last - index)
+                if index + radius > last:
+                    break
+                frame = window[index - base]
+                denoised = self._denoise([window[i - base] for i in range(index - radius, index + radius + 1)],
+                                         radius) if half else frame
+                result = self.pipeline.run(denoised)
+                if result is frame:
+                    # Decode buffers are recycled; never hand one to the writer.
+                    result = result.copy()
+                yield index, result
+                index += 1
+                while base < index - half:
+                    recycled = window.popleft()
+                    base += 1
+                    if free is not None:
+                        free.put(recycled)
+
+    def _denoise(self, frames, radius):
+        size = 2 * radius + 1
+        if frames[0].ndim == 2:
+            return cv2.fastNlMeansDenoisingMulti(frames, radius, size, h=self.h,
+                                                 templateWindowSize=self.template_window,
+                                                 searchWindowSize=self.search_window)
+        return cv2.fastNlMeansDenoisingColoredMulti(frames, radius, size, h=self.h, hColor=self.h_color,
+                                                    templateWindowSize=self.template_window,
+                                                    searchWindowSize=self.search_window)
+
+    def _write(self, output, results, fps, fourcc, output_format, errors):
+        writer = None
+        bgr = None
+        try:
+            while True:
+                item = results.get()
+                if item is _END:
+                    break
+                if errors:
+                    continue
+                index, frame = item
+                if frame.ndim == 3:
+                    bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR, dst=bgr if bgr is not None and
+                                       bgr.shape == frame.shape else None)
+                encoded = bgr if frame.ndim == 3 else frame
+                if _is_video(output):
+                    if writer is None:
+                        height, width = frame.shape[:2]
+                        writer = cv2.VideoWriter(output, cv2.VideoWriter_fourcc(*fourcc), fps, (width, height),
+                                                 frame.ndim == 3)
+                    writer.write(encoded)
+                else:
+                    path = os.path.join(output, f"frame_{index:06d}.{output_format.lstrip('.')}")
+                    if is_raw(path):
+                        save_array(path, frame)
+                    elif not cv2.imwrite(path, encoded):
+                        raise ValueError(f"Error writing frame: {path}")
+        except Exception as e:
+            errors.append(e)
+            # Keep draining so the compute thread never blocks on a full queue.
+            while results.get() is not _END:
+                pass
+        finally:
+            if writer is not None:
+                writer.release()
+
+
+def main():
+    import argparse
+    from cli import load_recipe
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("source", help="Video file, or directory of frames.")
+    parser.add_argument("output", help="Video file, or directory for numbered frames.")
+    parser.add_argument("--recipe", help="Recipe file with the pipeline steps (see cli.py).")
+    parser.add_argument("--temporal-window", type=int, default=0, help="Odd frame count for temporal NLM; 0 = off.")
+    parser.add_argument("--h", type=float, default=10, help="Temporal NLM strength.")
+    parser.add_argument("--fps", type=float)
+    parser.add_argument("--fourcc", default="mp4v")
+    parser.add_argument("--output-format", default="png")
+    args = parser.parse_args()
+
+    steps = load_recipe(args.recipe)["steps"] if args.recipe else []
+    processor = SequenceProcessor(steps, args.temporal_window, h=args.h, h_color=args.h)
+    count = processor.run(args.source, args.output, args.fps, args.fourcc, args.output_format)
+    print(f"Processed {count} frames -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Local HTTP service: upload an image, have it enhanced by a worker pool, fetch the result.
+
+    POST /jobs?steps=<JSON list>&filename=moon.png   body: image bytes -> 202 {"id": ..., "status": "queued"}
+    GET  /jobs/<id>                                  -> job status
+    GET  /jobs/<id>/result[?wait=<seconds>]          -> processed image, streamed
+    GET  /health                                     -> queue and worker counters
+
+Steps use the operation names of the pipeline (default: denoise). When the job
+queue is full, or too many requests are in progress, requests are refused with
+503 and a Retry-After header instead of piling up.
+
+Usage:
+    python src/service.py --port 8080 --workers 4 --max-queue 64
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+CHUNK_SIZE = 256 * 1024
+MAX_HEADER_BYTES = 64 * 1024
+DEFAULT_STEPS = [("denoise", {})]
+UPLOAD_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp")
+
+_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            409: "Conflict", 411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error",
+            503: "Service Unavailable", 504: "Gateway Timeout"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def run_job(input_path, output_path, steps):
+    # Runs in a worker process with the same operations as the desktop tools.
+    from main import ImageProcessor
+    processor = ImageProcessor()
+    processor.select_image(input_path)
+    processor.apply_pipeline(steps)
+    processor.save_image(output_path)
+    return output_path
+
+
+class Job:
+    def __init__(self, job_id, input_path, output_path, steps):
+        self.id = job_id
+        self.input_path = input_path
+        self.output_path = output_path
+        self.steps = steps
+        self.status = "queued"
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.done = asyncio.Event()
+
+    def to_dict(self):
+        return {"id": self.id, "status": self.status, "error": self.error, "steps": self.steps,
+                "created": self.created, "started": self.started, "finished": self.finished}
+
+
+class EnhanceService:
+    def __init__(self, upload_dir="uploads", output_dir="processed", workers=None, max_queue=64,
+                 max_requests=256, max_upload_bytes=200 * 1024 ** 2, keep_jobs=10000):
+        """
+        Job queue and HTTP handlers; start it with serve().
+
+        Parameters:
+        - upload_dir (str): Where uploads are streamed to.
+        - output_dir (str): Where results are written.
+        - workers (int): Worker processes; None uses os.cpu_count().
+        - max_queue (int): Jobs waiting for a worker before uploads are refused.
+        - max_requests (int): Requests handled concurrently before new ones are refused.
+        - max_upload_bytes (int): Largest accepted upload.
+        - keep_jobs (int): Finished jobs remembered for status queries.
+        """
+        self.upload_dir = upload_dir
+        self.output_dir = output_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.max_requests = max_requests
+        self.max_upload_bytes = max_upload_bytes
+        self.keep_jobs = keep_jobs
+        self.jobs = {}
+        self.active_requests = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._queue = None
+        self._executor = None
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        os.makedirs(self.upload_dir, exist_ok=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._queue = asyncio.Queue(self.max_queue)
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+        server = await asyncio.start_server(self._handle, host, port, limit=MAX_HEADER_BYTES)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in dispatchers:
+                task.cancel()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            job.status, job.started = "running", time.time()
+            self.running += 1
+            try:
+                await loop.run_in_executor(self._executor, run_job, job.input_path, job.output_path, job.steps)
+                job.status = "done"
+                self.completed += 1
+            except Exception as e:
+                job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+                self.failed += 1
+            finally:
+                self.running -= 1
+                job.finished = time.time()
+                job.done.set()
+                self._forget_old_jobs()
+
+    def _forget_old_jobs(self):
+        if len(self.jobs) <= self.keep_jobs:
+            return
+        for job_id in [job.id for job in self.jobs.values() if job.done.is_set()][:len(self.jobs) - self.keep_jobs]:
+            del self.jobs[job_id]
+
+    async def _handle(self, reader, writer):
+        try:
+            if self.active_requests >= self.max_requests:
+                self.rejected += 1
+                raise HTTPError(503, "Too many concurrent requests", {"Retry-After": "1"})
+            self.active_requests += 1
+            try:
+                method, target, headers = await self._read_head(reader)
+                await self._route(method, target, headers, reader, writer)
+            finally:
+                self.active_requests -= 1
+        except HTTPError as e:
+            await self._send_json(writer, e.status, {"error": str(e)}, e.headers)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as e:
+            await self._send_json(writer, 400, {"error": f"Malformed request: {e}"})
+        except ConnectionError:
+            pass
+        except Exception as e:
+            await self._send_json(writer, 500, {"error": f"{type(e).__name__}: {e}"})
+        finally:
+            writer.close()
+
+    async def _read_head(self, reader):
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        method, target, _ = lines[0].split(" ", 2)
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        return method, target, headers
+
+    async def _route(self, method, target, headers, reader, writer):
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        parts = [part for part in url.path.split("/") if part]
+        if parts == ["health"]:
+            return await self._send_json(writer, 200, self.health())
+        if parts == ["jobs"]:
+            if method != "POST":
+                raise HTTPError(405, "Use POST to upload")
+            job = await self._create_job(query, headers, reader)
+            return await self._send_json(writer, 202, job.to_dict())
+        if len(parts) in (2, 3) and parts[0] == "jobs" and method == "GET":
+            job = self.jobs.get(parts[1])
+            if job is None:
+                raise HTTPError(404, f"Unknown job: {parts[1]}")
+            if len(parts) == 2:
+                return await self._send_json(writer, 200, job.to_dict())
+            if parts[2] == "result":
+                return await self._send_result(job, float(query.get("wait", 0)), writer)
+        raise HTTPError(404, f"Not found: {url.path}")
+
+    async def _create_job(self, query, headers, reader):
+        # Refuse before reading the body so a full queue costs the client nothing to upload.
+        if self._queue.full():
+            self.rejected += 1
+            raise HTTPError(503, "Job queue is full", {"Retry-After": "2"})
+        if "content-length" not in headers:
+            raise HTTPError(411, "Content-Length is required")
+        try:
+            length = int(headers["content-length"])
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length > self.max_upload_bytes:
+            raise HTTPError(413, f"Upload larger than {self.max_upload_bytes} bytes")
+        try:
+            steps = [tuple(step) if isinstance(step, list) else step
+                     for step in json.loads(query.get("steps", "null")) or DEFAULT_STEPS]
+            from pipeline import Pipeline
+            Pipeline(steps)
+        except (ValueError, TypeError) as e:
+            raise HTTPError(400, f"Invalid steps: {e}")
+        extension = os.path.splitext(query.get("filename", ""))[1].lower() or ".png"
+        if extension not in UPLOAD_EXTENSIONS:
+            raise HTTPError(400, f"Unsupported file type: {extension}")
+
+        job_id = uuid.uuid4().hex
+        input_path = os.path.join(self.upload_dir, job_id + extension)
+        output_path = os.path.join(self.output_dir, job_id + extension)
+        await self._stream_to_file(reader, input_path, length)
+        job = Job(job_id, input_path, output_path, steps)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            os.remove(input_path)
+            self.rejected += 1
+            raise HTTPError(503, "Job queue is full", {"Retry-After": "2"})
+        self.jobs[job_id] = job
+        return job
+
+    async def _stream_to_file(self, reader, path, length):
+        loop = asyncio.get_running_loop()
+        remaining = length
+        try:
+            with open(path, "wb") as f:
+                while remaining:
+                    chunk = await reader.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise HTTPError(400, "Upload ended early")
+                    await loop.run_in_executor(None, f.write, chunk)
+                    remaining -= len(chunk)
+        except BaseException:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+
+    async def _send_result(self, job, wait, writer):
+        if not job.done.is_set() and wait > 0:
+            try:
+                await asyncio.wait_for(job.done.wait(), wait)
+            except asyncio.TimeoutError:
+                raise HTTPError(504, f"Job {job.id} still {job.status}")
+        if job.status == "failed":
+            raise HTTPError(500, job.error)
+        if job.status != "done":
+            raise HTTPError(409, f"Job {job.id} is {job.status}", {"Retry-After": "1"})
+        loop = asyncio.get_running_loop()
+        content_type = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".tif": "image/tiff", ".tiff": "image/tiff",
+                        ".bmp": "image/bmp"}.get(os.path.splitext(job.output_path)[1], "image/png")
+        with open(job.output_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._write_head(writer, 200, {"Content-Type": content_type, "Content-Length": str(size)})
+            while True:
+                chunk = await loop.run_in_executor(None, f.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+
+    def health(self):
+        return {"queued": self._queue.qsize(), "running": self.running, "completed": self.completed,
+                "failed": self.failed, "rejected": self.rejected, "active_requests": self.active_requests,
+                "workers": self.workers, "max_queue": self.max_queue}
+
+    @staticmethod
+    def _write_head(writer, status, headers):
+        lines = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}"]
+        lines += [f"{name}: {value}" for name, value in dict(headers, Connection="close").items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+    async def _send_json(self, writer, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self._write_head(writer, status, dict(headers or {}, **{"Content-Type": "application/json",
+                                                                 "Content-Length": str(len(body))}))
+        writer.write(body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--max-requests", type=int, default=256)
+    parser.add_argument("--upload-dir", default="uploads")
+    parser.add_argument("--output-dir", default="processed")
+    args = parser.parse_args()
+
+    service = EnhanceService(args.upload_dir, args.output_dir, args.workers, args.max_queue, args.max_requests)
+    print(f"Serving on http://{args.host}:{args.port}", flush=True)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
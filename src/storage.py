@@ -0,0 +1,112 @@
+import os
+import numpy as np
+from PIL import Image
+
+# Raw arrays are stored as .npy: a small header followed by the raw buffer, which
+# np.load can memory-map so intermediate stages skip PNG/JPEG decode and encode.
+RAW_EXTENSION = ".npy"
+
+
+def is_raw(path):
+    return path.lower().endswith(RAW_EXTENSION)
+
+
+def open_array(path, mode="r"):
+    """
+    Memory-map a stored .npy array without reading it into memory.
+
+    Parameters:
+    - path (str): Path to the .npy file.
+    - mode (str): 'r' for read-only, 'r+' to modify in place, 'c' for copy-on-write.
+
+    Returns:
+    - numpy.memmap: The mapped array.
+    """
+    return np.load(path, mmap_mode=mode)
+
+
+def create_array(path, shape, dtype=np.uint8):
+    """
+    Create a writable memory-mapped .npy file, e.g. as the output of a tiled run.
+
+    Parameters:
+    - path (str): Destination .npy path.
+    - shape (tuple): Array shape.
+    - dtype (numpy.dtype): Element type. Defaults to uint8.
+
+    Returns:
+    - numpy.memmap: The mapped array, flushed to disk when it is released.
+    """
+    return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=tuple(shape))
+
+
+def save_array(path, array):
+    """
+    Write an array (or PIL image) as raw .npy. The file is written under a temporary
+    name and renamed, so readers never see a partial array.
+
+    Parameters:
+    - path (str): Destination .npy path.
+    - array (numpy.ndarray or PIL.Image): Data to store.
+
+    Returns:
+    - str: The destination path.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, np.asarray(array))
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_image_array(path):
+    """
+    Read an image as a uint8 array, memory-mapping raw .npy files and decoding anything else.
+
+    Parameters:
+    - path (str): Path to a .npy array or an image file.
+
+    Returns:
+    - numpy.ndarray: H x W grayscale or H x W x 3 RGB array.
+    """
+    if is_raw(path):
+        return open_array(path)
+    image = Image.open(path)
+    if image.mode not in ("L", "RGB"):
+        image = image.convert("RGB")
+    return np.array(image)
+
+
+def load_image(path):
+    """
+    Load an image or raw array as a PIL image, e.g. as the process function of a final export batch.
+
+    Parameters:
+    - path (str): Path to a .npy array or an image file.
+
+    Returns:
+    - PIL.Image: The image.
+    """
+    if is_raw(path):
+        return Image.fromarray(open_array(path))
+    return Image.open(path)
+
+
+def export_image(source, path, preset=None, **save_kwargs):
+    """
+    Encode a raw array or image to a compressed format as the final export step.
+
+    Parameters:
+    - source (str, numpy.ndarray or PIL.Image): .npy path, array or image to encode.
+    - path (str): Destination path; the extension selects the format.
+    - preset (str or dict): Encoder preset, see export.encode_options. None keeps PIL's defaults.
+    - **save_kwargs: Encoder options overriding the preset (e.g. compress_level, quality).
+
+    Returns:
+    - str: The destination path.
+    """
+    from export import save_image
+
+    if isinstance(source, str):
+        source = load_image(source)
+    return save_image(source, path, preset, **save_kwargs)
@@ -0,0 +1,56 @@
+import numpy as np
+
+
+def iter_tiles(height, width, tile_size):
+    """
+    Split an image into a grid of non-overlapping tiles.
+
+    Parameters:
+    - height (int): Image height in pixels.
+    - width (int): Image width in pixels.
+    - tile_size (int): Tile edge length in pixels.
+
+    Yields:
+    - tuple: (y0, y1, x0, x1) bounds of each tile.
+    """
+    for y0 in range(0, height, tile_size):
+        for x0 in range(0, width, tile_size):
+            yield y0, min(y0 + tile_size, height), x0, min(x0 + tile_size, width)
+
+
+def process_tiled(source, func, halo, tile_size=1024, out=None):
+    """
+    Apply a neighbourhood filter tile by tile so peak memory depends on the tile size only.
+
+    Each tile is read together with a halo of `halo` pixels on every side, filtered,
+    and only its interior is written back. For a filter whose output depends only on
+    inputs within a finite kernel radius, a halo covering that radius makes the stitched
+    result match a full-frame run with no seams; at the image border the window is
+    clamped so the filter applies its own border handling. Filters with unbounded
+    reach (histogram equalization, Canny's hysteresis) have no such halo and are refused.
+
+    Parameters:
+    - source (numpy.ndarray): H x W or H x W x C array. np.memmap works and is only paged in tile by tile.
+    - func (function): Maps a window array to an output array of the same height and width.
+    - halo (int): Overlap in pixels; at least the filter's kernel radius. None for a filter
+      that needs the whole image, which raises ValueError.
+    - tile_size (int): Tile edge length in pixels, excluding the halo.
+    - out (numpy.ndarray): Optional output array (e.g. a writable memmap). Allocated from the
+      first tile's dtype and channel count when omitted.
+
+    Returns:
+    - numpy.ndarray: The stitched output.
+    """
+    if halo is None:
+        raise ValueError("This operation depends on the whole image and cannot be tiled.")
+
+    height, width = source.shape[:2]
+    for y0, y1, x0, x1 in iter_tiles(height, width, tile_size):
+        wy0, wy1 = max(y0 - halo, 0), min(y1 + halo, height)
+        wx0, wx1 = max(x0 - halo, 0), min(x1 + halo, width)
+        window = np.ascontiguousarray(source[wy0:wy1, wx0:wx1])
+        result = func(window)
+        if out is None:
+            out = np.empty((height, width) + result.shape[2:], dtype=result.dtype)
+        out[y0:y1, x0:x1] = result[y0 - wy0:y1 - wy0, x0 - wx0:x1 - wx0]
+    return out
@@ -0,0 +1,41 @@
+import os
+import sys
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from buffer_pool import BufferPool
+from pipeline import Pipeline
+
+STEPS = [("gamma", {"gamma": 0.8}), ("brightness", {"factor": 1.1}), ("unsharp_mask", {}),
+         ("gaussian_blur", {"ksize": 5}), ("median_filter", {"ksize": 5})]
+
+
+def test_repeated_runs_reuse_buffers():
+    frame = np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+    pipeline = Pipeline(STEPS)
+    pool = BufferPool()
+
+    def run():
+        pool.put(pipeline.run(frame, pool=pool))
+
+    # Warm-up: the first runs fill the pool.
+    for _ in range(2):
+        run()
+    allocations = pool.allocations
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for _ in range(5):
+            run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert pool.reuses > 0
+    assert pool.allocations == allocations
+    # No frame-sized buffer is allocated once the pool is warm.
+    assert peak - baseline < 0.05 * frame.nbytes
@@ -0,0 +1,47 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from dedup import MultiIndexHash, hamming
+
+
+def neighbours(rng, key, distance, bits=64):
+    return key ^ sum(1 << int(bit) for bit in rng.choice(bits, distance, replace=False))
+
+
+def brute_force(entries, key, max_distance):
+    return sorted((hamming(key, candidate), value) for candidate, value in entries
+                  if hamming(key, candidate) <= max_distance)
+
+
+def test_search_matches_a_linear_scan():
+    rng = np.random.default_rng(0)
+    # Doubled so the top bit of the 64 is used as well.
+    queries = [int(key) for key in rng.integers(0, 2 ** 63, 10, dtype=np.uint64) * 2 + 1]
+    entries = [(int(key), f"random{i}") for i, key in enumerate(rng.integers(0, 2 ** 63, 2000, dtype=np.uint64))]
+    # Plant keys at every distance up to and just past the largest searched radius,
+    # with the differing bits spread over any of the substrings.
+    for q, query in enumerate(queries):
+        entries += [(neighbours(rng, query, distance), f"near{q}.{distance}.{n}")
+                    for distance in range(11) for n in range(3)]
+    for chunks in (2, 4, 8):
+        index = MultiIndexHash(chunks=chunks)
+        for key, value in entries:
+            index.add(key, value)
+        for query in queries:
+            for max_distance in (0, 3, 6, 7, 9):
+                found = index.search(query, max_distance)
+                assert sorted(found) == brute_force(entries, query, max_distance)
+                assert [distance for distance, _ in found] == sorted(distance for distance, _ in found)
+
+
+def test_values_sharing_a_key_are_all_returned():
+    index = MultiIndexHash()
+    index.add(2 ** 64 - 1, "a")
+    index.add(2 ** 64 - 1, "b")
+    index.add(2 ** 64 - 2, "c")
+    assert sorted(index.search(2 ** 64 - 1, 1)) == [(0, "a"), (0, "b"), (1, "c")]
+    assert index.search(0, 6) == []
@@ -0,0 +1,33 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from denoise import BACKENDS, measured_costs, plan
+from operations import get_operation
+
+COSTS = {"nlm": 2000, "nlm_downscaled": 600, "wavelet": 130, "bilateral": 70, "guided": 30}
+
+
+def test_denoise_operation_is_the_classic_nlm():
+    frame = np.random.default_rng(0).integers(0, 256, (48, 64, 3), dtype=np.uint8)
+    expected = cv2.fastNlMeansDenoisingColored(frame, None, 10, 10, 7, 21)
+    np.testing.assert_array_equal(get_operation("denoise").func(frame), expected)
+
+
+def test_plan_picks_the_best_backend_within_the_budget():
+    shape = (1000, 1000, 3)
+    assert plan(shape, 10, budget_s=None, costs=COSTS) == "nlm"
+    assert plan(shape, 10, budget_s=2.0, costs=COSTS) == "nlm_downscaled"
+    assert plan(shape, 10, budget_s=0.5, costs=COSTS) == "wavelet"
+    assert plan(shape, 10, budget_s=0.01, costs=COSTS) == "guided"
+    assert plan(shape, 1, budget_s=None, costs=COSTS) == "guided"
+
+
+def test_costs_are_measured_for_every_backend():
+    costs = measured_costs()
+    assert sorted(costs) == sorted(BACKENDS)
+    assert all(cost > 0 for cost in costs.values())
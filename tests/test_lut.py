@@ -0,0 +1,37 @@
+import os
+import sys
+
+import numpy as np
+from PIL import Image, ImageEnhance, ImageStat
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from lut import apply_lut, get_lut
+
+FACTORS = (0.0, 0.1, 0.3, 0.5, 0.7, 0.9, 1.0, 1.1, 1.3, 1.7, 2.0, 3.5)
+
+
+def ramp(mode):
+    levels = np.arange(256, dtype=np.uint8).reshape(16, 16)
+    if mode == "RGB":
+        levels = np.stack([levels, levels[::-1], levels.T], axis=-1)
+    return Image.fromarray(levels)
+
+
+def test_brightness_matches_image_enhance():
+    for mode in ("L", "RGB"):
+        image = ramp(mode)
+        for factor in FACTORS:
+            expected = np.asarray(ImageEnhance.Brightness(image).enhance(factor))
+            np.testing.assert_array_equal(apply_lut(np.asarray(image), get_lut("brightness", factor=factor)),
+                                          expected, err_msg=f"{mode} x{factor}")
+
+
+def test_contrast_matches_image_enhance():
+    for mode in ("L", "RGB"):
+        image = ramp(mode)
+        mean = int(ImageStat.Stat(image.convert("L")).mean[0] + 0.5)
+        for factor in FACTORS:
+            expected = np.asarray(ImageEnhance.Contrast(image).enhance(factor))
+            np.testing.assert_array_equal(apply_lut(np.asarray(image), get_lut("contrast", factor=factor, mean=mean)),
+                                          expected, err_msg=f"{mode} x{factor}")
@@ -0,0 +1,41 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from operations import get_operation
+from pipeline import Pipeline
+
+POINTWISE = [("gamma", {"gamma": 0.8}), ("brightness", {"factor": 1.3}), ("contrast", {"factor": 1.5, "mean": 100}),
+             ("levels", {"black": 10, "white": 240, "gamma": 1.2})]
+
+
+def run_steps(frame, steps):
+    for name, params in steps:
+        frame = get_operation(name).func(frame, **params)
+    return frame
+
+
+def test_adjacent_pointwise_steps_fuse_into_one_table():
+    pipeline = Pipeline(POINTWISE[:2] + [("median_filter", {"ksize": 3})] + POINTWISE[2:])
+    assert [label for _, _, label in pipeline.stages] == ["lut:gamma+brightness", "op:median_filter",
+                                                          "lut:contrast+levels"]
+
+
+def test_fused_pipeline_matches_steps_run_one_by_one():
+    rng = np.random.default_rng(0)
+    steps = POINTWISE[:2] + [("gaussian_blur", {"ksize": 5})] + POINTWISE[2:]
+    for shape in ((64, 48), (64, 48, 3)):
+        frame = rng.integers(0, 256, shape, dtype=np.uint8)
+        expected = run_steps(frame, steps)
+        pipeline = Pipeline(steps)
+        # The second run draws its buffers from the pool.
+        for _ in range(2):
+            np.testing.assert_array_equal(pipeline.run(frame), expected)
+
+
+def test_every_level_of_a_fused_table_matches_the_chain():
+    ramp = np.arange(256, dtype=np.uint8).reshape(16, 16)
+    np.testing.assert_array_equal(Pipeline(POINTWISE).run(ramp), run_steps(ramp, POINTWISE))
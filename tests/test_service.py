@@ -0,0 +1,72 @@
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from service import EnhanceService
+
+
+async def request(port, head, body=b""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    if head is not None:
+        writer.write(head.encode("latin-1") + b"\r\n\r\n" + body)
+    writer.write_eof()
+    response = await reader.read()
+    writer.close()
+    status_line, _, rest = response.partition(b"\r\n")
+    headers, _, payload = rest.partition(b"\r\n\r\n")
+    return int(status_line.split()[1]), headers.decode("latin-1"), json.loads(payload)
+
+
+def run_service(tmp_path, scenario, **options):
+    # Handlers only: no workers are started, so accepted jobs stay queued.
+    async def main():
+        service = EnhanceService(str(tmp_path / "uploads"), str(tmp_path / "processed"), workers=1, **options)
+        os.makedirs(service.upload_dir)
+        service._queue = asyncio.Queue(service.max_queue)
+        server = await asyncio.start_server(service._handle, "127.0.0.1", 0)
+        async with server:
+            return await scenario(service, server.sockets[0].getsockname()[1])
+    return asyncio.run(main())
+
+
+def test_content_length_is_checked_before_the_body_is_read(tmp_path):
+    async def scenario(service, port):
+        return [(await request(port, f"POST /jobs HTTP/1.1{header}"))[0]
+                for header in ("", "\r\nContent-Length: -5", "\r\nContent-Length: ten", "\r\nContent-Length: 101")]
+
+    assert run_service(tmp_path, scenario, max_upload_bytes=100) == [411, 400, 400, 413]
+    assert os.listdir(tmp_path / "uploads") == []
+
+
+def test_full_queue_refuses_uploads_with_retry_after(tmp_path):
+    async def scenario(service, port):
+        head = "POST /jobs?filename=a.png HTTP/1.1\r\nContent-Length: 4"
+        accepted = await request(port, head, b"data")
+        refused = await request(port, head, b"data")
+        return accepted, refused, service.health()
+
+    accepted, refused, health = run_service(tmp_path, scenario, max_queue=1)
+    assert accepted[0] == 202 and accepted[2]["status"] == "queued"
+    assert refused[0] == 503 and "Retry-After: 2" in refused[1]
+    assert health["queued"] == 1 and health["rejected"] == 1
+    assert os.listdir(tmp_path / "uploads") == [accepted[2]["id"] + ".png"]
+
+
+def test_upload_ending_early_is_discarded(tmp_path):
+    async def scenario(service, port):
+        return await request(port, "POST /jobs HTTP/1.1\r\nContent-Length: 10", b"short")
+
+    assert run_service(tmp_path, scenario)[0] == 400
+    assert os.listdir(tmp_path / "uploads") == []
+
+
+def test_requests_over_the_limit_are_refused(tmp_path):
+    # Refused as soon as the connection is accepted, before the request is read.
+    async def scenario(service, port):
+        return await request(port, None)
+
+    status, headers, _ = run_service(tmp_path, scenario, max_requests=0)
+    assert status == 503 and "Retry-After: 1" in headers
@@ -0,0 +1,51 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from edge_detection import EDGE_METHODS, apply_edge_detection_tiled, detect_edges
+from pipeline import Pipeline
+
+
+def textured(shape, seed=0):
+    noise = np.random.default_rng(seed).integers(0, 256, shape, dtype=np.uint8)
+    return cv2.GaussianBlur(noise, (7, 7), 0)
+
+
+def test_tiled_pipeline_matches_full_frame():
+    frame = textured((300, 410, 3))
+    pipeline = Pipeline([("gamma", {"gamma": 0.8}), ("unsharp_mask", {}), ("gaussian_blur", {"ksize": 5}),
+                         ("median_filter", {"ksize": 5}), ("edge_detection", {"method": "Sobel"})])
+    np.testing.assert_array_equal(pipeline.run_tiled(frame, tile_size=64), pipeline.run(frame, pool=None))
+
+
+def test_pipeline_with_canny_is_not_tiled():
+    pipeline = Pipeline([("edge_detection", {"method": "Canny"})])
+    assert pipeline.halo() is None
+    with pytest.raises(ValueError):
+        pipeline.run_tiled(textured((64, 64)), tile_size=32)
+
+
+@pytest.mark.parametrize("method", EDGE_METHODS)
+@pytest.mark.parametrize("apply_blur", (False, True))
+def test_tiled_edges_match_full_frame(method, apply_blur):
+    image = textured((300, 410, 3), seed=1)
+    expected = detect_edges(image, method, 20, 60, apply_blur, 5)
+    np.testing.assert_array_equal(apply_edge_detection_tiled(image, method, 20, 60, apply_blur, 5, tile_size=64),
+                                  expected)
+
+
+def test_tiled_canny_follows_hysteresis_across_tiles():
+    # A weak step edge whose only strong pixel is in one tile: hysteresis must carry the
+    # edge along the whole column, through tiles that hold no strong pixel.
+    image = np.zeros((256, 512), np.uint8)
+    image[:, 256:] = 40
+    image[128, 256:] = 200
+    expected = detect_edges(image, "Canny", 100, 200)
+    tiled = apply_edge_detection_tiled(image, "Canny", 100, 200, tile_size=64)
+    assert (expected > 0).sum() > 256
+    np.testing.assert_array_equal(tiled, expected)